@@ -0,0 +1,239 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: End-to-end crawl benchmarks against a local site, run with: python -m benchmarks.crawl
+    Changelog: all notable changes to this file will be documented
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import sys
+import time
+
+from datetime import datetime
+
+from benchmarks.server import BenchSite, serve
+from ruia import AttrField, Item, Spider, __version__
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, peak RSS is not reported there
+    resource = None
+
+
+class LinkItem(Item):
+    target_item = AttrField(css_select="a.link", attr="href", many=True)
+    href = AttrField(xpath_select=".", attr="href")
+
+
+class BenchSpider(Spider):
+    """
+    Follow every link of the site, each page is parsed with an Item like a real spider would
+    """
+
+    name = "BenchSpider"
+    start_urls = ["http://127.0.0.1/page/0"]
+    request_config = {"RETRIES": 0, "TIMEOUT": 30}
+    dupefilter = "set"
+    metrics_enabled = False
+    loop_monitor_enabled = False
+    latencies = None
+
+    async def parse(self, response):
+        if not response.ok:
+            return
+        html = await response.text()
+        if response.timings is not None and response.timings.total is not None:
+            self.latencies.append(response.timings.total)
+        async for item in LinkItem.get_items(html=html):
+            yield self.request(f"{self.base_url}{item.href}", callback=self.parse)
+
+
+def _percentile(values: list, q: float):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))], 6)
+
+
+def _cpu_seconds() -> float:
+    times = os.times()
+    return times.user + times.system
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return round(peak / 2**20 if sys.platform == "darwin" else peak / 2**10, 2)
+
+
+def run_scenario(base_url: str, concurrency: int, worker_numbers: int) -> dict:
+    """
+    Crawl the site once, run in a new process so that its peak RSS and CPU time are its own
+    """
+    spider_cls = type(
+        "BenchSpider",
+        (BenchSpider,),
+        {
+            "base_url": base_url,
+            "start_urls": [f"{base_url}/page/0"],
+            "concurrency": concurrency,
+            "worker_numbers": worker_numbers,
+            "latencies": [],
+        },
+    )
+    loop = asyncio.new_event_loop()
+    cpu_start = _cpu_seconds()
+    start = time.perf_counter()
+    try:
+        spider_ins = loop.run_until_complete(
+            spider_cls.async_start(loop=loop, cancel_tasks=False)
+        )
+    finally:
+        loop.close()
+    seconds = time.perf_counter() - start
+    cpu = _cpu_seconds() - cpu_start
+    requests = spider_ins.success_counts + spider_ins.failed_counts
+    return {
+        "concurrency": concurrency,
+        "worker_numbers": worker_numbers,
+        "requests": requests,
+        "failed": spider_ins.failed_counts,
+        "seconds": round(seconds, 4),
+        "requests_per_second": round(requests / seconds, 2) if seconds else None,
+        "latency_p50": _percentile(spider_cls.latencies, 0.5),
+        "latency_p99": _percentile(spider_cls.latencies, 0.99),
+        "peak_rss_mb": _peak_rss_mb(),
+        "cpu_per_request_ms": round(cpu * 1000 / requests, 4) if requests else None,
+    }
+
+
+def _scenario_process(results, *args):
+    # Writing a log line for each request would be measured too
+    logging.disable(logging.INFO)
+    results.put(run_scenario(*args))
+
+
+def run_benchmarks(site: BenchSite, scenarios: list, host: str = "127.0.0.1") -> list:
+    """
+    Serve the site from its own process and run each (concurrency, worker_numbers) scenario in a new process
+    """
+    mp_context = multiprocessing.get_context("spawn")
+    ready, stop = mp_context.Queue(), mp_context.Event()
+    server = mp_context.Process(target=serve, args=(site, host, ready, stop))
+    server.start()
+    results = []
+    try:
+        base_url = f"http://{host}:{ready.get(timeout=30)}"
+        for concurrency, worker_numbers in scenarios:
+            queue = mp_context.Queue()
+            worker = mp_context.Process(
+                target=_scenario_process,
+                args=(queue, base_url, concurrency, worker_numbers),
+            )
+            worker.start()
+            result = queue.get()
+            worker.join()
+            results.append(result)
+            print(
+                f"concurrency {concurrency:>4} workers {worker_numbers:>3}: "
+                f"{result['requests_per_second']} req/s, p50 {result['latency_p50']}, "
+                f"p99 {result['latency_p99']}, {result['cpu_per_request_ms']} ms CPU/req, "
+                f"peak RSS {result['peak_rss_mb']} MB"
+            )
+    finally:
+        stop.set()
+        server.join()
+    return results
+
+
+def compare(old: dict, new: dict) -> list:
+    """
+    Return a line for each scenario of both runs, with the change of requests per second
+    """
+    old_results = {
+        (r["concurrency"], r["worker_numbers"]): r for r in old.get("results", [])
+    }
+    lines = []
+    for result in new["results"]:
+        key = (result["concurrency"], result["worker_numbers"])
+        before = old_results.get(key)
+        if before and before["requests_per_second"]:
+            change = result["requests_per_second"] / before["requests_per_second"] - 1
+            lines.append(
+                f"concurrency {key[0]:>4} workers {key[1]:>3}: "
+                f"{before['requests_per_second']} -> {result['requests_per_second']} req/s ({change:+.1%})"
+            )
+    return lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ruia crawl benchmarks")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--fanout", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=20000)
+    parser.add_argument(
+        "--latency",
+        default="fixed:0.01",
+        help="fixed:S, uniform:LOW:HIGH, exponential:MEAN or lognormal:MEDIAN:SIGMA",
+    )
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[10, 50, 100], metavar="N"
+    )
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 10], metavar="N")
+    parser.add_argument("--output", help="JSON file of the results")
+    parser.add_argument("--compare", help="JSON file of a previous run")
+    args = parser.parse_args(argv)
+
+    site = BenchSite(
+        pages=args.pages,
+        fanout=args.fanout,
+        page_size=args.page_size,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    scenarios = [(c, w) for c in args.concurrency for w in args.workers]
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "ruia": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "site": {
+            "pages": args.pages,
+            "expected_pages": site.expected_pages(),
+            "fanout": args.fanout,
+            "page_size": args.page_size,
+            "latency": args.latency,
+            "error_rate": args.error_rate,
+            "seed": args.seed,
+        },
+        "results": run_benchmarks(site, scenarios),
+    }
+    output = args.output or os.path.join(
+        "benchmarks",
+        "results",
+        f"crawl-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json",
+    )
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved to {output}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            for line in compare(json.load(f), report):
+                print(line)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Microbenchmarks of fields, items, responses and middleware, checked against a stored baseline
+    Changelog: all notable changes to this file will be documented
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+from lxml import etree
+
+from ruia import (
+    AttrField,
+    HtmlField,
+    Item,
+    Middleware,
+    RegexField,
+    Request,
+    Response,
+    Spider,
+    TextField,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def make_page(items: int) -> str:
+    rows = "".join(
+        f'<li class="item"><a class="title" href="/item/{i}">Item {i}</a>'
+        f'<span class="price">{i}.99</span></li>'
+        for i in range(items)
+    )
+    return f"<html><head><title>Items</title></head><body><ul>{rows}</ul></body></html>"
+
+
+class ListItem(Item):
+    target_item = TextField(css_select="li.item")
+    title = TextField(css_select="a.title")
+    url = AttrField(css_select="a.title", attr="href")
+    price = TextField(css_select="span.price")
+
+    async def clean_price(self, value):
+        return float(value)
+
+
+class MicroSpider(Spider):
+    start_urls = ["http://127.0.0.1/"]
+    metrics_enabled = False
+    loop_monitor_enabled = False
+
+
+def field_benchmarks() -> dict:
+    html_etree = etree.HTML(make_page(100))
+    html = make_page(100)
+    fields = {
+        "field.text.css": TextField(css_select="a.title", many=True),
+        "field.text.xpath": TextField(xpath_select="//a[@class='title']", many=True),
+        "field.attr.css": AttrField(css_select="a.title", attr="href", many=True),
+        "field.attr.xpath": AttrField(
+            xpath_select="//a[@class='title']", attr="href", many=True
+        ),
+        "field.html.css": HtmlField(css_select="li.item", many=True),
+        "field.html.xpath": HtmlField(xpath_select="//li[@class='item']", many=True),
+    }
+    benchmarks = {
+        name: (lambda field=field: field.extract(html_etree))
+        for name, field in fields.items()
+    }
+    regex_field = RegexField(re_select=r'href="(/item/\d+)"', many=True)
+    benchmarks["field.regex.str"] = lambda: regex_field.extract(html)
+    benchmarks["field.regex.etree"] = lambda: regex_field.extract(html_etree)
+    return benchmarks
+
+
+def item_benchmarks() -> dict:
+    benchmarks = {}
+    for items in (10, 100, 1000, 10000):
+        html = make_page(items)
+
+        async def get_items(html=html):
+            async for _ in ListItem.get_items(html=html):
+                pass
+
+        benchmarks[f"item.get_items.{items}"] = get_items
+    return benchmarks
+
+
+def response_benchmarks() -> dict:
+    headers = {"Content-Type": "text/html; charset=utf-8", "Content-Length": "1024"}
+
+    def new_response():
+        return Response(
+            url="https://example.com/page",
+            method="GET",
+            encoding="utf-8",
+            metadata={},
+            cookies={},
+            history=(),
+            headers=headers,
+            status=200,
+        )
+
+    return {"response.init": new_response}
+
+
+def middleware_benchmarks(spider_ins: Spider) -> dict:
+    benchmarks = {}
+    request = Request("https://example.com/page")
+    for counts in (0, 10):
+        middleware = Middleware()
+        for _ in range(counts):
+
+            @middleware.request
+            async def add_header(spider_ins, request):
+                request.headers["User-Agent"] = "ruia"
+
+        async def run(middleware=middleware):
+            spider_ins.middleware = middleware
+            await spider_ins._run_request_middleware(request)
+
+        benchmarks[f"middleware.request.{counts}"] = run
+    return benchmarks
+
+
+async def _new_spider(loop) -> Spider:
+    return MicroSpider(loop=loop)
+
+
+async def _measure_async(func, number: int) -> float:
+    start = time.perf_counter()
+    for _ in range(number):
+        await func()
+    return time.perf_counter() - start
+
+
+def measure(func, loop, min_time: float = 0.2, repeat: int = 7) -> float:
+    """
+    Return the best time of one call in microseconds,
+    calls are batched until a batch takes `min_time` seconds, like timeit's autorange
+    """
+    is_async = asyncio.iscoroutinefunction(func)
+
+    def run(number):
+        if is_async:
+            return loop.run_until_complete(_measure_async(func, number))
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+
+    number = 1
+    while True:
+        elapsed = run(number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    best = min([elapsed] + [run(number) for _ in range(repeat - 1)])
+    return best / number * 1e6
+
+
+def run_benchmarks(name_filter: str = "", min_time: float = 0.2) -> dict:
+    """
+    :return: microseconds of one call of each benchmark, by name
+    """
+    logging.disable(logging.INFO)
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        # Its session is created within the loop
+        spider_ins = loop.run_until_complete(_new_spider(loop))
+        benchmarks = {
+            **field_benchmarks(),
+            **item_benchmarks(),
+            **response_benchmarks(),
+            **middleware_benchmarks(spider_ins),
+        }
+        results = {}
+        for name, func in benchmarks.items():
+            if name_filter in name:
+                results[name] = round(measure(func, loop, min_time=min_time), 3)
+                print(f"{name:<28} {results[name]:>14.3f} us")
+        loop.run_until_complete(spider_ins.request_session.close())
+    finally:
+        loop.close()
+        logging.disable(logging.NOTSET)
+    return results
+
+
+def check_regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Return a line for each benchmark slower than its baseline by more than `threshold`
+    """
+    regressions = []
+    for name, value in results.items():
+        before = baseline.get(name)
+        if before and value > before * (1 + threshold):
+            regressions.append(
+                f"{name}: {before:.3f} -> {value:.3f} us ({value / before - 1:+.1%})"
+            )
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Ruia microbenchmarks")
+    parser.add_argument(
+        "--filter", default="", help="only run benchmarks with it in their name"
+    )
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="fail if a benchmark is this much slower than its baseline",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="store the results as the baseline"
+    )
+    parser.add_argument("--min-time", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.filter, min_time=args.min_time)
+    if args.save_baseline:
+        baseline = {"benchmarks": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, encoding="utf-8") as f:
+                baseline = json.load(f)
+        baseline["python"] = platform.python_version()
+        baseline["platform"] = platform.platform()
+        baseline["benchmarks"].update(results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"Saved the baseline to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline first")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = check_regressions(results, baseline["benchmarks"], args.threshold)
+    for line in regressions:
+        print(f"Regression {line}")
+    if not regressions:
+        print(
+            f"No benchmark is more than {args.threshold:.0%} slower than the baseline"
+        )
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: A local site for the crawl benchmarks, with configurable latency, page size, fan-out and errors
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import hashlib
+import math
+import random
+
+from aiohttp import web
+
+LATENCY_KINDS = ("fixed", "uniform", "exponential", "lognormal")
+
+
+def parse_latency(spec: str):
+    """
+    Return a function drawing a latency in seconds from a random.Random
+    :param spec: fixed:SECONDS, uniform:LOW:HIGH, exponential:MEAN or lognormal:MEDIAN:SIGMA
+    """
+    kind, *args = spec.split(":")
+    try:
+        args = [float(arg) for arg in args]
+    except ValueError:
+        raise ValueError(f"<BenchServer: invalid latency {spec}>")
+    if kind == "fixed" and len(args) == 1:
+        return lambda rnd: args[0]
+    if kind == "uniform" and len(args) == 2:
+        return lambda rnd: rnd.uniform(args[0], args[1])
+    if kind == "exponential" and len(args) == 1:
+        return lambda rnd: rnd.expovariate(1 / args[0]) if args[0] > 0 else 0.0
+    if kind == "lognormal" and len(args) == 2:
+        mu = math.log(args[0]) if args[0] > 0 else 0.0
+        return lambda rnd: rnd.lognormvariate(mu, args[1]) if args[0] > 0 else 0.0
+    raise ValueError(
+        f"<BenchServer: invalid latency {spec}, expected one of {', '.join(LATENCY_KINDS)}>"
+    )
+
+
+class BenchSite:
+    """
+    A tree of `pages` pages, /page/0 is the root and page n links to pages n * fanout + 1 ... n * fanout + fanout.
+    Whether a page fails only depends on its number and the seed, so every run crawls the same site
+    """
+
+    def __init__(
+        self,
+        pages: int = 1000,
+        fanout: int = 10,
+        page_size: int = 20000,
+        latency: str = "fixed:0.01",
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ):
+        """
+        :param pages: number of pages of the site
+        :param fanout: links of each page
+        :param page_size: bytes of each page
+        :param latency: latency distribution, see parse_latency
+        :param error_rate: share of the pages answering 500
+        :param seed: seed of the latencies and the errors
+        """
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.latency = latency
+        # Built by make_app, a function can not be sent to the server process
+        self._draw_latency = None
+        parse_latency(latency)
+        self.error_rate = error_rate
+        self.seed = seed
+        self.random = random.Random(seed)
+
+    def is_error(self, n: int) -> bool:
+        if not self.error_rate or n == 0:
+            return False
+        digest = hashlib.md5(f"{self.seed}-{n}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") / 2**32 < self.error_rate
+
+    def render(self, n: int) -> str:
+        first = n * self.fanout + 1
+        links = "".join(
+            f'<li><a class="link" href="/page/{child}">Page {child}</a></li>'
+            for child in range(first, min(first + self.fanout, self.pages))
+        )
+        html = (
+            f"<html><head><title>Page {n}</title></head><body>"
+            f"<h1>Page {n}</h1><ul>{links}</ul><p>"
+        )
+        padding = max(0, self.page_size - len(html) - len("</p></body></html>"))
+        return f"{html}{'x' * padding}</p></body></html>"
+
+    async def handle_page(self, request):
+        n = int(request.match_info["n"])
+        delay = self._draw_latency(self.random)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if n >= self.pages:
+            raise web.HTTPNotFound()
+        if self.is_error(n):
+            raise web.HTTPInternalServerError()
+        return web.Response(text=self.render(n), content_type="text/html")
+
+    def make_app(self) -> web.Application:
+        self._draw_latency = parse_latency(self.latency)
+        app = web.Application()
+        app.router.add_get("/page/{n:\\d+}", self.handle_page)
+        return app
+
+    def expected_pages(self) -> int:
+        """
+        Return the number of pages a crawl from /page/0 reaches, the children of failed pages are never seen
+        """
+        reached, stack = 0, [0]
+        while stack:
+            n = stack.pop()
+            reached += 1
+            if self.is_error(n):
+                continue
+            first = n * self.fanout + 1
+            stack.extend(range(first, min(first + self.fanout, self.pages)))
+        return reached
+
+
+def serve(site: BenchSite, host: str, ready, stop):
+    """
+    Serve the site until `stop` is set, run in its own process so it does not take the CPU of the spider
+    :param ready: a multiprocessing.Queue which gets the port once listening
+    :param stop: a multiprocessing.Event
+    """
+
+    async def main():
+        runner = web.AppRunner(site.make_app(), access_log=None)
+        await runner.setup()
+        tcp_site = web.TCPSite(runner, host, 0)
+        await tcp_site.start()
+        ready.put(runner.addresses[0][1])
+        try:
+            while not stop.is_set():
+                await asyncio.sleep(0.1)
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
@@ -0,0 +1,203 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Adaptive concurrency, the limits follow the latency and the error rate of responses
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+
+from collections import OrderedDict, deque
+
+from ruia.utils import get_logger
+
+
+class AdaptiveSemaphore:
+    """
+    A semaphore whose limit can be changed while it is in use,
+    lowering the limit lets the holders finish and blocks new acquires until they are below it
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.active = 0
+        self._waiters = deque()
+
+    def locked(self) -> bool:
+        return self.active >= self.limit
+
+    async def acquire(self):
+        while self.active >= self.limit:
+            waiter = asyncio.get_event_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Hand the wake-up to the next one
+                    self._wake()
+                raise
+        self.active += 1
+        return True
+
+    def release(self):
+        self.active -= 1
+        self._wake()
+
+    def set_limit(self, limit: int):
+        self.limit = limit
+        self._wake()
+
+    def _wake(self):
+        free = self.limit - self.active
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                free -= 1
+
+    async def __aenter__(self):
+        await self.acquire()
+        return None
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class AIMDController:
+    """
+    Additive increase, multiplicative decrease:
+    every `window` responses, the limit grows by `increase` if they went well,
+    or is multiplied by `decrease` if too many of them failed or the latency went up
+    """
+
+    def __init__(
+        self,
+        initial: int,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        increase: int = 1,
+        decrease: float = 0.5,
+        window: int = 20,
+        error_rate: float = 0.1,
+        latency_factor: float = 2.0,
+        error_statuses: tuple = (429, 503),
+    ):
+        """
+        :param initial: limit to start with
+        :param min_limit: the limit never goes below it
+        :param max_limit: the limit never goes above it
+        :param increase: added to the limit after a good window
+        :param decrease: the limit is multiplied by it after a bad window
+        :param window: number of responses between two adjustments
+        :param error_rate: a window is bad if more of its responses failed
+        :param latency_factor: a window is bad if its p95 latency is above the lowest median latency seen times this
+        :param error_statuses: statuses counted as failures, with timeouts and connection errors
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = max(min_limit, min(max_limit, initial))
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.error_rate = error_rate
+        self.latency_factor = latency_factor
+        self.error_statuses = error_statuses
+        self.base_latency = None
+        self._latencies = []
+        self._counts = 0
+        self._errors = 0
+
+    def observe(self, status, latency: float) -> bool:
+        """
+        Record a response
+        :param status: HTTP status, None for a timeout or a connection error
+        :param latency: seconds until the response headers arrived
+        :return: whether the limit changed
+        """
+        self._counts += 1
+        if status is None or status in self.error_statuses:
+            self._errors += 1
+        else:
+            self._latencies.append(latency)
+        if self._counts < self.window:
+            return False
+        return self._adjust()
+
+    def _adjust(self) -> bool:
+        latencies = sorted(self._latencies)
+        is_bad = self._errors > self.error_rate * self._counts
+        if latencies:
+            median = latencies[len(latencies) // 2]
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            if self.base_latency is not None and not is_bad:
+                is_bad = p95 > self.base_latency * self.latency_factor
+            if self.base_latency is None or median < self.base_latency:
+                self.base_latency = median
+        self._latencies, self._counts, self._errors = [], 0, 0
+
+        if is_bad:
+            limit = max(self.min_limit, int(self.limit * self.decrease))
+        else:
+            limit = min(self.max_limit, self.limit + self.increase)
+        changed = limit != self.limit
+        self.limit = limit
+        return changed
+
+
+class ConcurrencyController:
+    """
+    Resize the global limit and the limit of each host from the responses seen
+    """
+
+    def __init__(
+        self,
+        semaphores: list,
+        initial: int,
+        host_limiter=None,
+        max_hosts: int = 10000,
+        **aimd_kwargs,
+    ):
+        """
+        :param semaphores: AdaptiveSemaphore resized with the global limit
+        :param initial: the global limit to start with
+        :param host_limiter: HostLimiter whose per-host limits are adjusted too
+        :param max_hosts: max number of hosts whose limits are remembered
+        :param aimd_kwargs: passed to AIMDController
+        """
+        self.semaphores = semaphores
+        self.host_limiter = host_limiter
+        self.max_hosts = max_hosts
+        self.aimd_kwargs = aimd_kwargs
+        self.global_limit = AIMDController(initial, **aimd_kwargs)
+        self.host_limits = OrderedDict()
+        self.logger = get_logger(name="ConcurrencyController")
+        for sem in self.semaphores:
+            sem.set_limit(self.global_limit.limit)
+
+    def observe(self, request, status, latency: float):
+        """
+        Record the result of a fetch attempt of a request
+        """
+        if self.global_limit.observe(status, latency):
+            limit = self.global_limit.limit
+            self.logger.debug(f"<Concurrency: limit {limit}>")
+            for sem in self.semaphores:
+                sem.set_limit(limit)
+        if self.host_limiter is None:
+            return
+        key = self.host_limiter.cached_key(request.url)
+        controller = self.host_limits.get(key)
+        if controller is None:
+            controller = self.host_limits[key] = AIMDController(
+                self.host_limiter.concurrency, **self.aimd_kwargs
+            )
+            if len(self.host_limits) > self.max_hosts:
+                evicted, _ = self.host_limits.popitem(last=False)
+                self.host_limiter.set_limit(evicted, None)
+        else:
+            self.host_limits.move_to_end(key)
+        if controller.observe(status, latency):
+            self.logger.debug(f"<Concurrency: limit {controller.limit} of {key}>")
+            self.host_limiter.set_limit(key, controller.limit)
@@ -0,0 +1,115 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Caps of the body size and the content type of responses, enforced while the body streams in
+    Changelog: all notable changes to this file will be documented
+"""
+
+import json
+
+from typing import Optional, Sequence
+
+import aiohttp
+
+from ruia.exceptions import ContentTypeNotAllowedError, ResponseTooLargeError
+
+# Bytes read from the connection at once
+CHUNK_SIZE = 64 * 1024
+
+
+def content_type_allowed(content_type: str, allowed: Sequence[str]) -> bool:
+    """
+    :param content_type: the media type of a response, eg: text/html
+    :param allowed: media types, eg: ["text/html", "application/json"], or a whole family, eg: "text/*"
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    for media_type in allowed:
+        media_type = media_type.strip().lower()
+        if media_type == content_type or media_type == "*/*":
+            return True
+        if media_type.endswith("/*") and content_type.startswith(media_type[:-1]):
+            return True
+    return False
+
+
+def limit_response(
+    resp,
+    max_size: Optional[int] = None,
+    allowed_content_types: Optional[Sequence[str]] = None,
+):
+    """
+    Check the headers of an aiohttp response against the limits of its request, before its body is read
+    :param max_size: max bytes of the body, 0 or None means no limit
+    :param allowed_content_types: see content_type_allowed, None allows every content type
+    :return: the response, wrapped in a LimitedResponse if max_size is set
+    """
+    if allowed_content_types is not None and not content_type_allowed(
+        resp.content_type, allowed_content_types
+    ):
+        resp.close()
+        raise ContentTypeNotAllowedError(
+            f"<Content type {resp.content_type} of {resp.url} is not allowed>"
+        )
+    if not max_size:
+        return resp
+    if resp.content_length is not None and resp.content_length > max_size:
+        # Dropped before a single byte of the body is read
+        resp.close()
+        raise ResponseTooLargeError(
+            f"<Body of {resp.url} is {resp.content_length} bytes, over {max_size}>"
+        )
+    return LimitedResponse(resp, max_size)
+
+
+class LimitedResponse:
+    """
+    Wrap an aiohttp.ClientResponse so that its body is read in chunks,
+    the connection is closed as soon as the body goes over `max_size` bytes.
+    The size is the one of the decoded body, a compressed body can not grow past it
+    """
+
+    def __init__(self, resp, max_size: int, chunk_size: int = CHUNK_SIZE):
+        self._resp = resp
+        self.max_size = max_size
+        self.chunk_size = chunk_size
+        self._body = None
+
+    def __getattr__(self, name):
+        return getattr(self._resp, name)
+
+    async def read(self) -> bytes:
+        if self._body is None:
+            body = bytearray()
+            async for chunk in self._resp.content.iter_chunked(self.chunk_size):
+                body.extend(chunk)
+                if len(body) > self.max_size:
+                    self._resp.close()
+                    raise ResponseTooLargeError(
+                        f"<Body of {self._resp.url} is over {self.max_size} bytes>"
+                    )
+            self._resp.release()
+            self._body = bytes(body)
+        return self._body
+
+    async def text(self, encoding: Optional[str] = None, errors: str = "strict") -> str:
+        body = await self.read()
+        return body.decode(encoding or self._resp.get_encoding(), errors=errors)
+
+    async def json(
+        self,
+        *,
+        encoding: Optional[str] = None,
+        loads=json.loads,
+        content_type: Optional[str] = "application/json",
+    ):
+        body = await self.read()
+        if content_type and content_type not in self._resp.content_type:
+            raise aiohttp.ContentTypeError(
+                self._resp.request_info,
+                self._resp.history,
+                message=f"Attempt to decode JSON with unexpected mimetype: {self._resp.content_type}",
+                headers=self._resp.headers,
+            )
+        stripped = body.strip()
+        if not stripped:
+            return None
+        return loads(stripped.decode(encoding or self._resp.get_encoding()))
@@ -0,0 +1,328 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: A shared frontier and duplicate filter served over TCP, for crawling with several spiders
+    Changelog: all notable changes to this file will be documented
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+
+from heapq import heappop, heappush
+from typing import Any, Callable, Optional
+
+from ruia.dupefilter import get_dupefilter
+from ruia.frontier import PriorityFrontier, get_priority
+from ruia.utils import get_logger
+
+# Max size of one message, a batch of serialized requests
+MESSAGE_LIMIT = 2**26
+
+
+class _Connection:
+    __slots__ = ("outstanding",)
+
+    def __init__(self):
+        # items handed to or added by this client and not done yet
+        self.outstanding = 0
+
+
+class FrontierBroker:
+    """
+    Hold one frontier and one seen-set for many spiders.
+    Each client sends a batch of operations in one line of JSON:
+        {"put": [[priority, fingerprint, data], ...], "add": n, "done": n, "get": n}
+    and gets back:
+        {"items": [data, ...], "filtered": n, "unfinished": n}
+    `unfinished` counts the queued items and the items taken or added by clients but not done yet,
+    the crawl is finished when it drops to 0.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dupefilter: Optional[str] = "set",
+        dupefilter_kwargs: dict = None,
+    ):
+        """
+        :param host: host to listen on
+        :param port: port to listen on, 0 picks a free one
+        :param dupefilter: set, bloom or None, see ruia.dupefilter
+        :param dupefilter_kwargs: passed to the duplicate filter
+        """
+        self.host = host
+        self.port = port
+        self.dupefilter = (
+            get_dupefilter(dupefilter, **(dupefilter_kwargs or {}))
+            if dupefilter
+            else None
+        )
+        self.unfinished = 0
+        self.filtered_counts = 0
+        self.server = None
+        self.logger = get_logger(name="FrontierBroker")
+        self._queue = []
+        self._counter = itertools.count()
+
+    async def start(self) -> str:
+        """
+        Start listening
+        :return: the address as host:port
+        """
+        self.server = await asyncio.start_server(
+            self._handle_client, self.host, self.port, limit=MESSAGE_LIMIT
+        )
+        self.port = self.server.sockets[0].getsockname()[1]
+        return f"{self.host}:{self.port}"
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    @property
+    def queued_counts(self) -> int:
+        return len(self._queue)
+
+    def process(self, message: dict, connection: _Connection) -> dict:
+        """
+        Apply a batch of operations, the puts go first so that
+        the requests yielded by a callback are counted before the request is done
+        """
+        filtered = 0
+        for priority, fingerprint, data in message.get("put", ()):
+            if (
+                fingerprint
+                and self.dupefilter is not None
+                and self.dupefilter.fingerprint_seen(bytes.fromhex(fingerprint))
+            ):
+                filtered += 1
+                continue
+            heappush(self._queue, (-priority, next(self._counter), data))
+            self.unfinished += 1
+        self.filtered_counts += filtered
+
+        added = message.get("add", 0) - message.get("done", 0)
+        connection.outstanding += added
+        self.unfinished += added
+
+        items = []
+        for _ in range(min(message.get("get", 0), len(self._queue))):
+            items.append(heappop(self._queue)[-1])
+        connection.outstanding += len(items)
+        return {"items": items, "filtered": filtered, "unfinished": self.unfinished}
+
+    async def _handle_client(self, reader, writer):
+        connection = _Connection()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                reply = self.process(json.loads(line), connection)
+                writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+            self.logger.error(f"<FrontierBroker: {e}>")
+        finally:
+            if connection.outstanding:
+                # The client is gone, so is the work it took, let the others finish
+                self.logger.warning(
+                    f"<FrontierBroker: a client left with {connection.outstanding} unfinished items>"
+                )
+                self.unfinished -= connection.outstanding
+            writer.close()
+
+
+class RemoteFrontier:
+    """
+    A frontier client of FrontierBroker, it can replace `Spider.request_queue`.
+    New requests are buffered and sent in batches, requests are fetched `prefetch` at a time,
+    so most `put_request` and `get` calls never wait for the network.
+    Items which can not be serialized, eg: CallbackItem, and requeued requests stay in a local frontier.
+    """
+
+    def __init__(
+        self,
+        address: str,
+        serialize: Callable[[Any], Optional[bytes]],
+        deserialize: Callable[[bytes], Any],
+        batch_size: int = 100,
+        prefetch: int = 10,
+        flush_interval: float = 0.05,
+        poll_interval: float = 0.1,
+        on_filtered: Callable[[int], None] = None,
+    ):
+        """
+        :param address: host:port of the broker
+        :param serialize: return the bytes of a request, or None to keep it in the local frontier
+        :param deserialize: rebuild a request from its bytes
+        :param batch_size: send the buffered requests once there are this many
+        :param prefetch: max number of requests fetched at once
+        :param flush_interval: max seconds a request stays buffered
+        :param poll_interval: seconds between two fetches when the broker has nothing to crawl
+        :param on_filtered: called with the number of requests dropped by the shared duplicate filter
+        """
+        self.host, _, port = address.rpartition(":")
+        self.port = int(port)
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.batch_size = batch_size
+        self.prefetch = prefetch
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.on_filtered = on_filtered
+        self.unfinished = None
+        self._local = PriorityFrontier()
+        self._outbox = []
+        self._added = 0
+        self._done = 0
+        self._lock = None
+        self._reader = None
+        self._writer = None
+        self._flush_task = None
+        self._flush_event = None
+
+    def put_request(self, request):
+        """
+        Send a new request to the broker, it is dropped there if the shared duplicate filter has seen it
+        """
+        data = self.serialize(request)
+        if data is None:
+            self.put_nowait(request)
+            return
+        fingerprint = None if request.dont_filter else request.fingerprint
+        self._outbox.append((get_priority(request), fingerprint, data.decode("utf-8")))
+        if len(self._outbox) >= self.batch_size and self._flush_event is not None:
+            self._flush_event.set()
+
+    def put_nowait(self, item):
+        """
+        Put an item into the local frontier, the broker only counts it
+        """
+        self._local.put_nowait(item)
+        self._added += 1
+
+    async def get(self):
+        while self._local.empty():
+            await self._sync(fetch=True)
+            if self._local.empty():
+                await asyncio.sleep(self.poll_interval)
+        return self._local.get_nowait()
+
+    def task_done(self):
+        self._done += 1
+
+    async def join(self):
+        """
+        Wait until the broker has no unfinished item of any client
+        """
+        while True:
+            await self._sync()
+            if self.unfinished == 0 and not self._has_changes():
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def qsize(self) -> int:
+        return self._local.qsize() + len(self._outbox)
+
+    def empty(self) -> bool:
+        return self.qsize() == 0
+
+    def items(self) -> list:
+        """
+        Return the local items and the requests not sent yet, used by checkpoints
+        """
+        return self._local.items() + [
+            self.deserialize(data.encode("utf-8")) for _, _, data in self._outbox
+        ]
+
+    def close(self):
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def _has_changes(self) -> bool:
+        return bool(self._outbox or self._added or self._done)
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(
+            self.host, self.port, limit=MESSAGE_LIMIT
+        )
+        self._flush_event = asyncio.Event()
+        self._flush_task = asyncio.ensure_future(self._flush_loop())
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_event.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            if self._has_changes():
+                await self._sync()
+
+    async def _sync(self, fetch: bool = False):
+        """
+        Send the buffered changes in one round trip and fetch requests if asked
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._writer is None:
+                await self._connect()
+            want = max(0, self.prefetch - self._local.qsize()) if fetch else 0
+            message = {
+                "put": self._outbox,
+                "add": self._added,
+                "done": self._done,
+                "get": want,
+            }
+            self._outbox, self._added, self._done = [], 0, 0
+            self._writer.write(json.dumps(message).encode("utf-8") + b"\n")
+            await self._writer.drain()
+            line = await self._reader.readline()
+            if not line:
+                raise ConnectionError(
+                    "<RemoteFrontier: the broker closed the connection>"
+                )
+            reply = json.loads(line)
+            for data in reply["items"]:
+                self._local.put_nowait(self.deserialize(data.encode("utf-8")))
+            self.unfinished = reply["unfinished"]
+            if reply["filtered"] and self.on_filtered is not None:
+                self.on_filtered(reply["filtered"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ruia frontier broker")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6800)
+    parser.add_argument("--dupefilter", default="set", help="set, bloom or none")
+    args = parser.parse_args()
+
+    broker = FrontierBroker(
+        args.host,
+        args.port,
+        dupefilter=None if args.dupefilter == "none" else args.dupefilter,
+    )
+    loop = asyncio.new_event_loop()
+    address = loop.run_until_complete(broker.start())
+    broker.logger.info(f"Listening on {address}")
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.run_until_complete(broker.close())
+        loop.close()
+
+
+if __name__ == "__main__":
+    main()
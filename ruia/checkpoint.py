@@ -0,0 +1,51 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Save and load the crawl state of a job directory
+    Changelog: all notable changes to this file will be documented
+"""
+
+import os
+import pickle
+
+CHECKPOINT_FILE = "checkpoint.pickle"
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(job_dir: str) -> str:
+    return os.path.join(job_dir, CHECKPOINT_FILE)
+
+
+def save_checkpoint(job_dir: str, state: dict):
+    """
+    Write the crawl state to job_dir, a crash while writing keeps the previous checkpoint
+    :param job_dir: job directory, created if missing
+    :param state: a picklable dict
+    """
+    os.makedirs(job_dir, exist_ok=True)
+    path = checkpoint_path(job_dir)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(
+            {"version": CHECKPOINT_VERSION, **state}, f, pickle.HIGHEST_PROTOCOL
+        )
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(job_dir: str):
+    """
+    Read the crawl state saved in job_dir
+    :param job_dir: job directory
+    :return: the state dict, or None if there is no checkpoint
+    """
+    path = checkpoint_path(job_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        state = pickle.load(f)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(
+            f"<Checkpoint: unsupported version {state.get('version')} in {path}>"
+        )
+    return state
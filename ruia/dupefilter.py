@@ -0,0 +1,209 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Request fingerprint and duplicate filters
+    Changelog: all notable changes to this file will be documented
+"""
+
+import hashlib
+import json
+import math
+
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonicalize_url(url: str, params=None) -> str:
+    """
+    Return a canonical form of url: lowercase scheme and host, no default port,
+    no fragment and sorted query arguments
+    :param url: target url
+    :param params: query arguments which aiohttp appends to the url
+    :return: canonical url
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = (parts.hostname or "").lower()
+    if ":" in netloc:
+        # IPv6 address
+        netloc = f"[{netloc}]"
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{parts.port}"
+    if parts.username:
+        user_info = parts.username
+        if parts.password:
+            user_info = f"{user_info}:{parts.password}"
+        netloc = f"{user_info}@{netloc}"
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    if params:
+        items = params.items() if isinstance(params, dict) else params
+        query.extend((str(key), str(value)) for key, value in items)
+    return urlunsplit((scheme, netloc, parts.path or "/", urlencode(sorted(query)), ""))
+
+
+def _body_bytes(aiohttp_kwargs: dict) -> bytes:
+    if aiohttp_kwargs.get("json") is not None:
+        return json.dumps(aiohttp_kwargs["json"], sort_keys=True).encode("utf-8")
+    data = aiohttp_kwargs.get("data")
+    if data is None:
+        return b""
+    if isinstance(data, bytes):
+        return data
+    if isinstance(data, str):
+        return data.encode("utf-8")
+    if isinstance(data, dict):
+        return urlencode(sorted((str(k), str(v)) for k, v in data.items())).encode()
+    return repr(data).encode("utf-8")
+
+
+def request_fingerprint(request) -> str:
+    """
+    Return the fingerprint of a request, made of its method, canonical url and body
+    :param request: Request
+    :return: a hex string
+    """
+    url = canonicalize_url(request.url, request.aiohttp_kwargs.get("params"))
+    fp = hashlib.sha1()
+    fp.update(request.method.encode("utf-8"))
+    fp.update(b"\n")
+    fp.update(url.encode("utf-8"))
+    fp.update(b"\n")
+    fp.update(_body_bytes(request.aiohttp_kwargs))
+    return fp.hexdigest()
+
+
+class BaseDupeFilter:
+    """
+    A seen-set of request fingerprints
+    """
+
+    def request_seen(self, request) -> bool:
+        """
+        Return True if the request was seen before, otherwise remember it
+        :param request: Request
+        """
+        return self.fingerprint_seen(bytes.fromhex(request.fingerprint))
+
+    def fingerprint_seen(self, fingerprint: bytes) -> bool:
+        raise NotImplementedError("fingerprint_seen is not implemented.")
+
+    def __len__(self):
+        raise NotImplementedError("__len__ is not implemented.")
+
+
+class SetDupeFilter(BaseDupeFilter):
+    """
+    An exact in-memory seen-set
+    """
+
+    def __init__(self):
+        self.fingerprints = set()
+
+    def fingerprint_seen(self, fingerprint: bytes) -> bool:
+        if fingerprint in self.fingerprints:
+            return True
+        self.fingerprints.add(fingerprint)
+        return False
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+
+class BloomFilter:
+    """
+    A fixed size Bloom filter, the k bit positions are derived from a sha1 digest by double hashing
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(
+            8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        )
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fingerprint: bytes):
+        h1 = int.from_bytes(fingerprint[:8], "big")
+        h2 = int.from_bytes(fingerprint[8:16], "big") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        bits = self.bits
+        return all(
+            bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(fingerprint)
+        )
+
+    def add(self, fingerprint: bytes):
+        bits = self.bits
+        for pos in self._positions(fingerprint):
+            bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+
+class BloomDupeFilter(BaseDupeFilter):
+    """
+    A scalable Bloom filter, memory grows with the number of fingerprints
+    while the false positive rate stays below `error_rate`
+    """
+
+    def __init__(
+        self,
+        initial_capacity: int = 100000,
+        error_rate: float = 0.0001,
+        growth: int = 2,
+        tightening_ratio: float = 0.5,
+    ):
+        """
+        :param initial_capacity: capacity of the first filter
+        :param error_rate: the max false positive rate of the whole filter
+        :param growth: each new filter is `growth` times bigger than the last one
+        :param tightening_ratio: each new filter has a smaller error rate by this ratio
+        """
+        if not 0 < error_rate < 1:
+            raise ValueError("<BloomDupeFilter: error_rate must be between 0 and 1>")
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening_ratio = tightening_ratio
+        # The sum of error rates of all filters converges to error_rate
+        self.filters = [
+            BloomFilter(initial_capacity, error_rate * (1 - tightening_ratio))
+        ]
+
+    def fingerprint_seen(self, fingerprint: bytes) -> bool:
+        for bloom_filter in self.filters:
+            if fingerprint in bloom_filter:
+                return True
+        last_filter = self.filters[-1]
+        if last_filter.count >= last_filter.capacity:
+            last_filter = BloomFilter(
+                last_filter.capacity * self.growth,
+                last_filter.error_rate * self.tightening_ratio,
+            )
+            self.filters.append(last_filter)
+        last_filter.add(fingerprint)
+        return False
+
+    def __len__(self):
+        return sum(bloom_filter.count for bloom_filter in self.filters)
+
+
+DUPEFILTERS = {"set": SetDupeFilter, "bloom": BloomDupeFilter}
+
+
+def get_dupefilter(name: str = "set", **kwargs) -> BaseDupeFilter:
+    """
+    Init a duplicate filter by its name
+    :param name: set or bloom
+    :param kwargs: passed to the filter class
+    :return: An instance of the filter
+    """
+    try:
+        dupefilter_class = DUPEFILTERS[name]
+    except KeyError:
+        raise ValueError(
+            f"<DupeFilter: invalid name {name}, expected one of {list(DUPEFILTERS)}>"
+        )
+    return dupefilter_class(**kwargs)
@@ -31,3 +31,29 @@ class NothingMatchedError(Exception):
 
 class SpiderHookError(Exception):
     """Spider hook function execution error"""
+
+
+class DNSLookupError(OSError):
+    """A host name can not be resolved"""
+
+
+class RetryLater(Exception):
+    """A failed request is retried by the spider once `delay` seconds have passed"""
+
+    def __init__(self, request, delay: float, reason):
+        super().__init__(f"Retry {request.url} in {delay:.2f}s, {reason}")
+        self.request = request
+        self.delay = delay
+        self.reason = reason
+
+
+class ResponseLimitError(Exception):
+    """A response goes over a limit of its request, the failure is permanent and not retried"""
+
+
+class ResponseTooLargeError(ResponseLimitError):
+    """The body of a response is bigger than MAX_BODY_SIZE"""
+
+
+class ContentTypeNotAllowedError(ResponseLimitError):
+    """The content type of a response is not one of ALLOWED_CONTENT_TYPES"""
@@ -0,0 +1,242 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Request frontier for Ruia's spider
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import itertools
+import sqlite3
+
+from heapq import heappop, heappush
+from typing import Any, Callable, Optional
+
+
+class CallbackItem:
+    """
+    A coroutine yielded by a callback, with the response passed to it.
+    Only the yielded coroutine is kept, the handle_callback coroutine is built once a worker takes it
+    """
+
+    __slots__ = ("aws_callback", "response", "priority")
+
+    def __init__(self, aws_callback, response=None, priority: int = 0):
+        self.aws_callback = aws_callback
+        self.response = response
+        self.priority = priority
+
+    def __repr__(self):
+        return f"<CallbackItem {getattr(self.aws_callback, '__name__', self.aws_callback)}>"
+
+
+def get_priority(request_item) -> int:
+    """
+    Return the priority of a queued Request or CallbackItem
+    """
+    return getattr(request_item, "priority", 0)
+
+
+class FifoFrontier(asyncio.Queue):
+    """
+    First in, first out, breadth-first crawling
+    """
+
+    def items(self) -> list:
+        """
+        Return the queued items in the order to put them back, used by checkpoints
+        """
+        return list(self._queue)
+
+
+class LifoFrontier(asyncio.LifoQueue):
+    """
+    Last in, first out, depth-first crawling
+    """
+
+    def items(self) -> list:
+        """
+        Return the queued items in the order to put them back, used by checkpoints
+        """
+        return list(self._queue)
+
+
+class PriorityFrontier(asyncio.Queue):
+    """
+    A heap of requests, a higher priority is crawled first,
+    requests with the same priority keep the FIFO order
+    """
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._counter = itertools.count()
+
+    def _put(self, item):
+        heappush(self._queue, (-get_priority(item), next(self._counter), item))
+
+    def _get(self):
+        return heappop(self._queue)[-1]
+
+    def items(self) -> list:
+        """
+        Return the queued items in the order to put them back, used by checkpoints
+        """
+        return [entry[-1] for entry in sorted(self._queue)]
+
+
+class DiskFrontier(asyncio.Queue):
+    """
+    A frontier which keeps a small hot buffer in memory and spills the rest to SQLite,
+    memory use stays flat no matter how big the frontier gets.
+    Items which can not be serialized, eg: CallbackItem, always stay in memory.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        serialize: Callable[[Any], Optional[bytes]],
+        deserialize: Callable[[bytes], Any],
+        policy: str = "priority",
+        memory_size: int = 10000,
+        batch_size: int = 1000,
+        resume: bool = False,
+        maxsize: int = 0,
+    ):
+        """
+        :param path: SQLite database file
+        :param serialize: return the bytes of an item, or None to keep it in memory
+        :param deserialize: rebuild an item from its bytes
+        :param policy: fifo, lifo or priority
+        :param memory_size: max number of items in the hot buffer before spilling
+        :param batch_size: number of items loaded back from disk at once
+        :param resume: keep the items already saved in `path`
+        """
+        if policy not in FRONTIER_POLICIES:
+            raise ValueError(
+                f"<Frontier: invalid policy {policy}, expected one of {list(FRONTIER_POLICIES)}>"
+            )
+        self.path = path
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.policy = policy
+        self.memory_size = memory_size
+        self.batch_size = batch_size
+        self._conn = sqlite3.connect(path)
+        if not resume:
+            self._conn.execute("DROP TABLE IF EXISTS frontier")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS frontier "
+            "(k1 INTEGER, k2 INTEGER, data BLOB, PRIMARY KEY (k1, k2))"
+        )
+        self._conn.commit()
+        super(DiskFrontier, self).__init__(maxsize=maxsize)
+
+    def _init(self, maxsize):
+        self._queue = []
+        self._disk_size, last_seq = self._conn.execute(
+            "SELECT COUNT(*), MAX(ABS(k2)) FROM frontier"
+        ).fetchone()
+        self._counter = itertools.count((last_seq or 0) + 1)
+        self._disk_top = self._read_top() if self._disk_size else None
+
+    def _key(self, item):
+        seq = next(self._counter)
+        priority = get_priority(item) if self.policy == "priority" else 0
+        return -priority, -seq if self.policy == "lifo" else seq
+
+    def _read_top(self):
+        return self._conn.execute(
+            "SELECT k1, k2 FROM frontier ORDER BY k1, k2 LIMIT 1"
+        ).fetchone()
+
+    def _put(self, item):
+        key = self._key(item)
+        if len(self._queue) >= self.memory_size:
+            data = self.serialize(item)
+            if data is not None:
+                self._conn.execute(
+                    "INSERT INTO frontier VALUES (?, ?, ?)", (key[0], key[1], data)
+                )
+                self._disk_size += 1
+                if self._disk_top is None or key < self._disk_top:
+                    self._disk_top = key
+                return
+        heappush(self._queue, (key, item))
+
+    def _get(self):
+        if self._disk_size and (not self._queue or self._disk_top < self._queue[0][0]):
+            self._load()
+        return heappop(self._queue)[-1]
+
+    def _load(self):
+        """
+        Move a batch of the best items from disk into the hot buffer
+        """
+        rows = self._conn.execute(
+            "SELECT k1, k2, data FROM frontier ORDER BY k1, k2 LIMIT ?",
+            (self.batch_size,),
+        ).fetchall()
+        self._conn.execute(
+            "DELETE FROM frontier WHERE k1 < ? OR (k1 = ? AND k2 <= ?)",
+            (rows[-1][0], rows[-1][0], rows[-1][1]),
+        )
+        self._disk_size -= len(rows)
+        self._disk_top = self._read_top() if self._disk_size else None
+        for k1, k2, data in rows:
+            heappush(self._queue, ((k1, k2), self.deserialize(data)))
+
+    def qsize(self):
+        return len(self._queue) + self._disk_size
+
+    def empty(self):
+        return not self._queue and not self._disk_size
+
+    def items(self) -> list:
+        """
+        Return the queued items in the order to put them back, used by checkpoints,
+        the items on disk are loaded too
+        """
+        entries = list(self._queue)
+        rows = self._conn.execute("SELECT k1, k2, data FROM frontier").fetchall()
+        entries.extend(((k1, k2), self.deserialize(data)) for k1, k2, data in rows)
+        entries.sort(key=lambda entry: entry[0])
+        if self.policy == "lifo":
+            entries.reverse()
+        return [item for _, item in entries]
+
+    @property
+    def memory_qsize(self) -> int:
+        """Number of items in the hot buffer"""
+        return len(self._queue)
+
+    def close(self):
+        """
+        Commit and close the database
+        """
+        self._conn.commit()
+        self._conn.close()
+
+
+FRONTIER_POLICIES = {
+    "fifo": FifoFrontier,
+    "lifo": LifoFrontier,
+    "priority": PriorityFrontier,
+}
+
+
+def get_frontier(policy: str = "priority", path: str = None, **kwargs) -> asyncio.Queue:
+    """
+    Init a frontier by its policy name
+    :param policy: fifo, lifo or priority
+    :param path: spill the frontier to this SQLite file, see DiskFrontier
+    :param kwargs: passed to the frontier class
+    :return: An instance of the frontier
+    """
+    if path:
+        return DiskFrontier(path, policy=policy, **kwargs)
+    try:
+        frontier_class = FRONTIER_POLICIES[policy]
+    except KeyError:
+        raise ValueError(
+            f"<Frontier: invalid policy {policy}, expected one of {list(FRONTIER_POLICIES)}>"
+        )
+    return frontier_class(**kwargs)
@@ -0,0 +1,433 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Cache responses on disk and revalidate them with ETag and Last-Modified
+    Changelog: all notable changes to this file will be documented
+"""
+
+import json
+import sqlite3
+import time
+
+from email.utils import parsedate_to_datetime
+from http.cookies import SimpleCookie
+from typing import Optional
+
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+# always: replay cached responses until they expire, the server is never asked again
+# rfc: follow Cache-Control and Expires, stale responses are revalidated
+# ignore_cache_control: cache every response whatever its Cache-Control, and revalidate it each time
+CACHE_POLICIES = ("always", "rfc", "ignore_cache_control")
+CACHE_STATUSES = (200, 203, 300, 301, 308, 404, 410)
+# Seconds a response without an explicit lifetime is fresh at most, see RFC 9111 4.2.2
+MAX_HEURISTIC_LIFETIME = 86400
+# Headers of a 304 which do not update the cached response
+_NOT_UPDATED_HEADERS = {"content-length", "content-encoding", "transfer-encoding"}
+
+
+def parse_cache_control(value: str) -> dict:
+    """
+    :return: the directives of a Cache-Control header, eg: {"max-age": "60", "no-cache": None}
+    """
+    directives = {}
+    for directive in value.split(","):
+        name, _, argument = directive.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"') if argument else None
+    return directives
+
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    """
+    :return: the timestamp of an HTTP date, None if it is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class CacheEntry:
+    """
+    A response stored in the cache
+    """
+
+    __slots__ = (
+        "fingerprint",
+        "url",
+        "status",
+        "headers",
+        "body",
+        "encoding",
+        "stored_at",
+    )
+
+    def __init__(
+        self,
+        fingerprint: str,
+        url: str,
+        status: int,
+        headers: list,
+        body: bytes,
+        encoding: Optional[str],
+        stored_at: float,
+    ):
+        """
+        :param headers: a list of (name, value), a header can be repeated
+        :param stored_at: timestamp of the response, or of its last revalidation
+        """
+        self.fingerprint = fingerprint
+        self.url = url
+        self.status = status
+        self.headers = CIMultiDictProxy(CIMultiDict(headers))
+        self.body = body
+        self.encoding = encoding
+        self.stored_at = stored_at
+
+    def freshness_lifetime(self) -> float:
+        """
+        Seconds the response is fresh for, from max-age, Expires or Last-Modified
+        """
+        cache_control = parse_cache_control(self.headers.get("Cache-Control", ""))
+        max_age = cache_control.get("max-age")
+        if max_age is not None:
+            try:
+                return max(0, int(max_age))
+            except ValueError:
+                return 0
+        date = parse_http_date(self.headers.get("Date")) or self.stored_at
+        if "Expires" in self.headers:
+            # An invalid date, eg: 0, means already expired
+            expires = parse_http_date(self.headers["Expires"])
+            return max(0, expires - date) if expires is not None else 0
+        last_modified = parse_http_date(self.headers.get("Last-Modified"))
+        if last_modified is not None:
+            return min(max(0, date - last_modified) / 10, MAX_HEURISTIC_LIFETIME)
+        return 0
+
+    def age(self, now: float) -> float:
+        try:
+            initial_age = int(self.headers.get("Age", 0))
+        except ValueError:
+            initial_age = 0
+        return max(0, now - self.stored_at) + initial_age
+
+    def has_validators(self) -> bool:
+        return "ETag" in self.headers or "Last-Modified" in self.headers
+
+    def conditional_headers(self) -> dict:
+        """
+        :return: the If-None-Match and If-Modified-Since headers revalidating the response
+        """
+        headers = {}
+        if "ETag" in self.headers:
+            headers["If-None-Match"] = self.headers["ETag"]
+        if "Last-Modified" in self.headers:
+            headers["If-Modified-Since"] = self.headers["Last-Modified"]
+        return headers
+
+
+class CachedClientResponse:
+    """
+    Replay a CacheEntry with the interface of aiohttp.ClientResponse used by Request.fetch
+    """
+
+    from_cache = True
+
+    def __init__(self, entry: CacheEntry, method: str = "GET"):
+        self.entry = entry
+        self.method = method
+        self.url = URL(entry.url)
+        self.status = entry.status
+        self.headers = entry.headers
+        self.history = ()
+        self.cookies = SimpleCookie()
+        for value in entry.headers.getall("Set-Cookie", ()):
+            self.cookies.load(value)
+
+    def get_encoding(self) -> str:
+        if self.entry.encoding is None:
+            raise RuntimeError("<HttpCache: the encoding of the response is unknown>")
+        return self.entry.encoding
+
+    async def read(self) -> bytes:
+        return self.entry.body
+
+    async def text(self, encoding: Optional[str] = None, errors: str = "strict") -> str:
+        return self.entry.body.decode(
+            encoding or self.entry.encoding or "utf-8", errors=errors
+        )
+
+    async def json(self, *, encoding: str = None, loads=json.loads, content_type=None):
+        text = await self.text(encoding=encoding)
+        return loads(text) if text.strip() else None
+
+    def release(self):
+        pass
+
+
+class HttpCache:
+    """
+    Store responses in SQLite by request fingerprint and replay them without network I/O,
+    stale responses are revalidated with If-None-Match and If-Modified-Since, a 304 replays the cached one.
+    Only GET requests are cached and the Vary header is not supported
+    """
+
+    def __init__(
+        self,
+        path: str,
+        policy: str = "rfc",
+        expiration: float = 0,
+        max_size: int = 0,
+        statuses: tuple = CACHE_STATUSES,
+        metrics=None,
+    ):
+        """
+        :param path: SQLite database file, kept across runs
+        :param policy: always, rfc or ignore_cache_control
+        :param expiration: seconds a response is kept, 0 keeps it until it is evicted
+        :param max_size: max bytes of the cached bodies, the least recently used ones are evicted, 0 means no limit
+        :param statuses: status codes of the responses which are cached
+        :param metrics: CrawlMetrics, counts the hits, revalidations and misses
+        """
+        if policy not in CACHE_POLICIES:
+            raise ValueError(
+                f"<HttpCache: invalid policy {policy}, expected one of {list(CACHE_POLICIES)}>"
+            )
+        self.path = path
+        self.policy = policy
+        self.expiration = expiration
+        self.max_size = max_size
+        self.statuses = statuses
+        self.metrics = metrics
+        self.stats = {"hit": 0, "revalidated": 0, "miss": 0, "stored": 0, "evicted": 0}
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses (fingerprint TEXT PRIMARY KEY, "
+            "url TEXT, status INTEGER, headers TEXT, body BLOB, encoding TEXT, "
+            "stored_at REAL, accessed_at REAL, size INTEGER)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+        )
+        self._conn.commit()
+        self._size = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    @staticmethod
+    def _now() -> float:
+        # Wall clock, the entries are kept across runs
+        return time.time()
+
+    def _count(self, result: str):
+        self.stats[result] += 1
+        if self.metrics is not None:
+            self.metrics.http_cache.inc(result)
+
+    @property
+    def size(self) -> int:
+        """Bytes of the cached bodies"""
+        return self._size
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, request) -> Optional[CacheEntry]:
+        """
+        :return: the cached response of a request, None if there is none or it expired
+        """
+        if request.method != "GET":
+            return None
+        row = self._conn.execute(
+            "SELECT url, status, headers, body, encoding, stored_at FROM responses "
+            "WHERE fingerprint = ?",
+            (request.fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None
+        now = self._now()
+        url, status, headers, body, encoding, stored_at = row
+        if self.expiration and now - stored_at >= self.expiration:
+            self.delete(request.fingerprint)
+            return None
+        self._conn.execute(
+            "UPDATE responses SET accessed_at = ? WHERE fingerprint = ?",
+            (now, request.fingerprint),
+        )
+        self._conn.commit()
+        return CacheEntry(
+            request.fingerprint,
+            url,
+            status,
+            json.loads(headers),
+            body,
+            encoding,
+            stored_at,
+        )
+
+    def is_fresh(self, entry: CacheEntry, request) -> bool:
+        """
+        Whether the cached response can be replayed without asking the server
+        """
+        if self.policy == "always":
+            return True
+        if self.policy == "ignore_cache_control":
+            return False
+        request_directives = parse_cache_control(
+            request.headers.get("Cache-Control", "")
+        )
+        response_directives = parse_cache_control(
+            entry.headers.get("Cache-Control", "")
+        )
+        if "no-cache" in request_directives or "no-cache" in response_directives:
+            return False
+        return entry.age(self._now()) < entry.freshness_lifetime()
+
+    def replay(self, entry: CacheEntry, request) -> CachedClientResponse:
+        """
+        Return a fresh cached response in place of the aiohttp one
+        """
+        self._count("hit")
+        return CachedClientResponse(entry, method=request.method)
+
+    def is_storable(self, request, resp) -> bool:
+        """
+        Whether an aiohttp response of a request is cached
+        """
+        if request.method != "GET" or resp.status not in self.statuses:
+            return False
+        if self.policy != "rfc":
+            return True
+        for headers in (request.headers, resp.headers):
+            if "no-store" in parse_cache_control(headers.get("Cache-Control", "")):
+                return False
+        return True
+
+    async def process_response(self, request, resp, entry: Optional[CacheEntry]):
+        """
+        Store the aiohttp response of a request, or replay `entry` if the response is a 304 revalidating it
+        :param entry: the stale cached response the request was sent to revalidate
+        :return: the response Request.fetch goes on with
+        """
+        if entry is not None and resp.status == 304:
+            resp.release()
+            self.refresh(entry, resp.headers)
+            self._count("revalidated")
+            return CachedClientResponse(entry, method=request.method)
+        self._count("miss")
+        if self.is_storable(request, resp):
+            # Kept by aiohttp, the callback reads it again without network I/O
+            body = await resp.read()
+            try:
+                encoding = resp.get_encoding()
+            except Exception:
+                encoding = request.encoding
+            entry = CacheEntry(
+                request.fingerprint,
+                str(resp.url),
+                resp.status,
+                list(resp.headers.items()),
+                body,
+                encoding,
+                self._now(),
+            )
+            if self.policy == "rfc" and not (
+                entry.freshness_lifetime() or entry.has_validators()
+            ):
+                # It could neither be replayed nor revalidated
+                return resp
+            self.store(entry)
+        return resp
+
+    def store(self, entry: CacheEntry):
+        size = len(entry.body)
+        if self.max_size and size > self.max_size:
+            return
+        now = self._now()
+        old = self._conn.execute(
+            "SELECT size FROM responses WHERE fingerprint = ?", (entry.fingerprint,)
+        ).fetchone()
+        if old is not None:
+            self._size -= old[0]
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                entry.fingerprint,
+                entry.url,
+                entry.status,
+                json.dumps(list(entry.headers.items())),
+                entry.body,
+                entry.encoding,
+                entry.stored_at,
+                now,
+                size,
+            ),
+        )
+        self._size += size
+        self._count("stored")
+        self._evict()
+        self._conn.commit()
+
+    def refresh(self, entry: CacheEntry, headers):
+        """
+        Update a cached response with the headers of the 304 which revalidated it
+        """
+        updated = CIMultiDict(entry.headers)
+        for name in {name.lower() for name in headers.keys()} - _NOT_UPDATED_HEADERS:
+            updated.popall(name, None)
+            for value in headers.getall(name):
+                updated.add(name, value)
+        entry.headers = CIMultiDictProxy(updated)
+        entry.stored_at = self._now()
+        self._conn.execute(
+            "UPDATE responses SET headers = ?, stored_at = ? WHERE fingerprint = ?",
+            (
+                json.dumps(list(entry.headers.items())),
+                entry.stored_at,
+                entry.fingerprint,
+            ),
+        )
+        self._conn.commit()
+
+    def delete(self, fingerprint: str):
+        row = self._conn.execute(
+            "SELECT size FROM responses WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if row is not None:
+            self._conn.execute(
+                "DELETE FROM responses WHERE fingerprint = ?", (fingerprint,)
+            )
+            self._conn.commit()
+            self._size -= row[0]
+
+    def _evict(self):
+        """
+        Delete the least recently used responses until the bodies fit in `max_size`
+        """
+        while self.max_size and self._size > self.max_size:
+            rows = self._conn.execute(
+                "SELECT fingerprint, size FROM responses ORDER BY accessed_at LIMIT 100"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                break
+            for fingerprint, size in rows:
+                if self._size <= self.max_size:
+                    break
+                self._conn.execute(
+                    "DELETE FROM responses WHERE fingerprint = ?", (fingerprint,)
+                )
+                self._size -= size
+                self._count("evicted")
+
+    def close(self):
+        """
+        Commit and close the database
+        """
+        self._conn.commit()
+        self._conn.close()
@@ -5,6 +5,7 @@
 """
 
 from inspect import isawaitable
+from time import perf_counter
 from typing import Any
 
 import aiohttp
@@ -13,6 +14,7 @@ from lxml import etree
 
 from ruia.exceptions import IgnoreThisItem, InvalidFuncType
 from ruia.field import BaseField
+from ruia.profiling import field_selector, instrument, is_instrumented, record_call
 from ruia.request import Request
 
 
@@ -72,14 +74,30 @@ class Item(metaclass=ItemMeta):
             raise ValueError("<Item: html_etree is expected>")
         item_ins = cls()
         fields_dict = getattr(item_ins, "__fields", {})
+        instrumented = is_instrumented()
         for field_name, field_value in fields_dict.items():
             if field_name != "target_item":
                 clean_method = getattr(item_ins, f"clean_{field_name}", None)
-                value = field_value.extract(html_etree)
+                if not instrumented:
+                    value = field_value.extract(html_etree)
+                else:
+                    start = perf_counter()
+                    value = field_value.extract(html_etree)
+                    record_call(
+                        "field",
+                        f"{cls.__name__}.{field_name} {field_selector(field_value)}",
+                        perf_counter() - start,
+                    )
                 if clean_method is not None and callable(clean_method):
                     try:
                         aws_clean_func = clean_method(value)
                         if isawaitable(aws_clean_func):
+                            if instrumented:
+                                aws_clean_func = instrument(
+                                    aws_clean_func,
+                                    "clean",
+                                    f"{cls.__name__}.clean_{field_name}",
+                                )
                             value = await aws_clean_func
                         else:
                             raise InvalidFuncType(
@@ -137,9 +155,16 @@ class Item(metaclass=ItemMeta):
         items_field = getattr(cls, "__fields", {}).get("target_item", None)
         if items_field:
             items_field.many = True
+            start = perf_counter()
             items_html_etree = items_field.extract(
                 html_etree=html_etree, is_source=True
             )
+            if is_instrumented():
+                record_call(
+                    "field",
+                    f"{cls.__name__}.target_item {field_selector(items_field)}",
+                    perf_counter() - start,
+                )
             if items_html_etree:
                 for each_html_etree in items_html_etree:
                     item = await cls._parse_html(html_etree=each_html_etree)
@@ -0,0 +1,131 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Measure the scheduling lag of the event loop and report the steps which block it
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import contextvars
+
+from collections import deque
+
+from ruia.utils import get_logger
+
+# Upper bounds in seconds of the lag buckets, the last bucket is +Inf
+LAG_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+LAG_QUANTILES = (0.5, 0.95, 0.99)
+
+# The LoopMonitor of the running spider and the url the current task is working on
+_current_monitor = contextvars.ContextVar("loop_monitor", default=None)
+_current_url = contextvars.ContextVar("current_url", default=None)
+
+
+def get_loop_monitor():
+    """
+    Return the LoopMonitor of the running spider, or None
+    """
+    return _current_monitor.get()
+
+
+def set_loop_monitor(monitor) -> contextvars.Token:
+    """
+    Set the LoopMonitor of the current context, the tasks created afterwards inherit it
+    :return: the token to pass to `reset_loop_monitor`
+    """
+    return _current_monitor.set(monitor)
+
+
+def reset_loop_monitor(token: contextvars.Token):
+    _current_monitor.reset(token)
+
+
+def set_current_url(url: str):
+    """
+    Set the url the current task works on, it names the slow steps of the task
+    """
+    _current_url.set(url)
+
+
+class LoopMonitor:
+    """
+    Sleep `interval` seconds again and again, the extra time the loop took to wake up is its lag.
+    Callbacks, middleware and clean methods report each of their steps to `check`,
+    the ones holding the loop for `threshold` seconds or more are logged with their url
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.1,
+        metrics=None,
+        history_size: int = 600,
+        max_slow_steps: int = 100,
+    ):
+        """
+        :param interval: seconds between two lag samples
+        :param threshold: seconds a step can hold the loop before it is reported
+        :param metrics: CrawlMetrics, gets the lag histogram, the lag quantiles and the slow steps
+        :param history_size: number of lag samples the quantiles are computed from
+        :param max_slow_steps: number of slow steps kept in `slow_steps`
+        """
+        self.interval = interval
+        self.threshold = threshold
+        self.metrics = metrics
+        self.lags = deque(maxlen=history_size)
+        self.slow_steps = deque(maxlen=max_slow_steps)
+        self.logger = get_logger(name="LoopMonitor")
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record_lag(max(0.0, loop.time() - start - self.interval))
+
+    def record_lag(self, lag: float):
+        self.lags.append(lag)
+        if self.metrics is not None:
+            self.metrics.loop_lag.observe(lag)
+            if len(self.lags) % 10 == 0:
+                for q, value in self.quantiles().items():
+                    self.metrics.loop_lag_quantiles.set(value, q)
+
+    def quantiles(self) -> dict:
+        """
+        Return the lag quantiles of the recent samples, keyed by "0.5", "0.95", "0.99" and "max"
+        """
+        lags = sorted(self.lags)
+        if not lags:
+            return {}
+        result = {
+            str(q): lags[min(len(lags) - 1, int(len(lags) * q))] for q in LAG_QUANTILES
+        }
+        result["max"] = lags[-1]
+        return result
+
+    def check(self, kind: str, name: str, seconds: float):
+        """
+        Report a step of a callback, a middleware, a field or a clean method which ran for `seconds`
+        """
+        if seconds < self.threshold:
+            return
+        url = _current_url.get()
+        self.slow_steps.append(
+            {"kind": kind, "name": name, "url": url, "seconds": seconds}
+        )
+        if self.metrics is not None:
+            self.metrics.slow_steps.inc(kind, name)
+        self.logger.warning(
+            f"<LoopMonitor: {kind} {name} blocked the loop for {seconds:.3f}s, url: {url}>"
+        )
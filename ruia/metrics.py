@@ -0,0 +1,364 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Low-overhead crawl metrics: counters, gauges and fixed-bucket histograms
+    Changelog: all notable changes to this file will be documented
+"""
+
+import bisect
+import time
+
+from collections import deque
+from urllib.parse import urlparse
+
+import aiohttp
+
+from ruia.loopmonitor import LAG_BUCKETS
+from ruia.timings import PHASES
+
+# Upper bounds in seconds of the latency buckets, the last bucket is +Inf
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+OPENMETRICS_CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+class Counter:
+    """
+    A value which only goes up, one for each combination of label values
+    """
+
+    kind = "counter"
+
+    __slots__ = ("name", "help", "label_names", "values")
+
+    def __init__(self, name: str, help: str = "", label_names: tuple = ()):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.values = {}
+
+    def inc(self, *label_values, amount: float = 1):
+        self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def get(self, *label_values) -> float:
+        return self.values.get(label_values, 0)
+
+    def total(self) -> float:
+        return sum(self.values.values())
+
+
+class Gauge(Counter):
+    """
+    A value which goes up and down
+    """
+
+    kind = "gauge"
+
+    __slots__ = ()
+
+    def set(self, value: float, *label_values):
+        self.values[label_values] = value
+
+
+class Histogram:
+    """
+    Count observations into fixed buckets, recording is a binary search and two additions
+    """
+
+    kind = "histogram"
+
+    __slots__ = ("name", "help", "label_names", "buckets", "values")
+
+    def __init__(
+        self,
+        name: str,
+        help: str = "",
+        label_names: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.label_names = label_names
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [counts of each bucket and +Inf, sum]
+        self.values = {}
+
+    def observe(self, value: float, *label_values):
+        data = self.values.get(label_values)
+        if data is None:
+            data = self.values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+
+    def count(self, *label_values) -> int:
+        data = self.values.get(label_values)
+        return sum(data[0]) if data else 0
+
+    def quantile(self, q: float, *label_values) -> float:
+        """
+        Estimate a quantile as the upper bound of the bucket it falls in
+        """
+        data = self.values.get(label_values)
+        if not data:
+            return 0.0
+        rank = q * sum(data[0])
+        seen = 0
+        for index, counts in enumerate(data[0]):
+            seen += counts
+            if seen >= rank and counts:
+                return (
+                    self.buckets[index] if index < len(self.buckets) else float("inf")
+                )
+        return float("inf")
+
+
+class MetricsRegistry:
+    """
+    Hold the metrics of a spider by name
+    """
+
+    def __init__(self, max_hosts: int = 1000, history_size: int = 3600):
+        """
+        :param max_hosts: hosts after this many are recorded as "other", so memory stays flat
+        :param history_size: number of frontier size samples kept
+        """
+        self.metrics = {}
+        self.max_hosts = max_hosts
+        self.hosts = set()
+        # (timestamp, frontier size) samples
+        self.queue_history = deque(maxlen=history_size)
+
+    def _get(self, metric_class, name: str, help: str, label_names: tuple, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = metric_class(
+                name, help, label_names, **kwargs
+            )
+        elif not isinstance(metric, metric_class):
+            raise ValueError(f"<Metrics: {name} is a {metric.kind}>")
+        return metric
+
+    def counter(self, name: str, help: str = "", label_names: tuple = ()) -> Counter:
+        return self._get(Counter, name, help, label_names)
+
+    def gauge(self, name: str, help: str = "", label_names: tuple = ()) -> Gauge:
+        return self._get(Gauge, name, help, label_names)
+
+    def histogram(
+        self,
+        name: str,
+        help: str = "",
+        label_names: tuple = (),
+        buckets: tuple = LATENCY_BUCKETS,
+    ) -> Histogram:
+        return self._get(Histogram, name, help, label_names, buckets=buckets)
+
+    def host_label(self, host: str) -> str:
+        """
+        Return the label of a host, "other" once `max_hosts` hosts are known
+        """
+        if host in self.hosts:
+            return host
+        if len(self.hosts) < self.max_hosts:
+            self.hosts.add(host)
+            return host
+        return "other"
+
+    def sample_queue(self, size: int):
+        self.queue_history.append((time.time(), size))
+
+    def to_dict(self) -> dict:
+        """
+        Return all metrics as plain data
+        """
+        result = {}
+        for name, metric in self.metrics.items():
+            values = []
+            for label_values, value in metric.values.items():
+                labels = dict(zip(metric.label_names, label_values))
+                if metric.kind == "histogram":
+                    value = {
+                        "buckets": dict(
+                            zip([*map(str, metric.buckets), "+Inf"], value[0])
+                        ),
+                        "sum": value[1],
+                        "count": sum(value[0]),
+                    }
+                values.append({"labels": labels, "value": value})
+            result[name] = {"type": metric.kind, "help": metric.help, "values": values}
+        result["queue_history"] = list(self.queue_history)
+        return result
+
+    def to_openmetrics(self) -> str:
+        """
+        Return all metrics in the OpenMetrics text format
+        """
+        lines = []
+        for name, metric in self.metrics.items():
+            family = name[: -len("_total")] if metric.kind == "counter" else name
+            suffix = "_total" if metric.kind == "counter" else ""
+            lines.append(f"# TYPE {family} {metric.kind}")
+            if metric.help:
+                lines.append(f"# HELP {family} {_escape(metric.help)}")
+            for label_values, value in metric.values.items():
+                labels = list(zip(metric.label_names, label_values))
+                if metric.kind != "histogram":
+                    lines.append(f"{family}{suffix}{_labels(labels)} {value}")
+                    continue
+                cumulative = 0
+                bounds = [*map(str, metric.buckets), "+Inf"]
+                for bound, counts in zip(bounds, value[0]):
+                    cumulative += counts
+                    lines.append(
+                        f"{family}_bucket{_labels(labels + [('le', bound)])} {cumulative}"
+                    )
+                lines.append(f"{family}_count{_labels(labels)} {cumulative}")
+                lines.append(f"{family}_sum{_labels(labels)} {value[1]}")
+        lines.append("# EOF\n")
+        return "\n".join(lines)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(labels: list) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels) + "}"
+
+
+class CrawlMetrics:
+    """
+    The metrics recorded by a spider
+    """
+
+    def __init__(self, registry: MetricsRegistry = None):
+        self.registry = registry or MetricsRegistry()
+        registry = self.registry
+        self.requests = registry.counter(
+            "ruia_requests_total", "Requests sent, retries included", ("host",)
+        )
+        self.retries = registry.counter(
+            "ruia_retries_total", "Requests sent again", ("host",)
+        )
+        self.responses = registry.counter(
+            "ruia_responses_total",
+            "Responses by status, error for timeouts and failed connections",
+            ("status",),
+        )
+        self.latency = registry.histogram(
+            "ruia_request_latency_seconds",
+            "Seconds until the response headers arrived",
+            ("host",),
+        )
+        self.errors = registry.counter(
+            "ruia_request_errors_total", "Timeouts and failed connections", ("host",)
+        )
+        self.bytes = registry.counter(
+            "ruia_response_bytes_total", "Bytes of response bodies received", ("host",)
+        )
+        self.finished = registry.counter(
+            "ruia_requests_finished_total",
+            "Requests done after their retries",
+            ("outcome",),
+        )
+        self.items = registry.counter(
+            "ruia_items_total", "Items yielded by callbacks", ("item",)
+        )
+        self.queue_size = registry.gauge(
+            "ruia_frontier_size", "Items waiting in the frontier"
+        )
+        self.phases = registry.histogram(
+            "ruia_request_phase_seconds",
+            "Seconds spent in each phase of the last attempt of a request, see RequestTimings",
+            ("host", "phase"),
+        )
+        self.connections = registry.counter(
+            "ruia_connections_total",
+            "Connections used by requests, opened or reused from the pool",
+            ("host", "reused"),
+        )
+        self.loop_lag = registry.histogram(
+            "ruia_loop_lag_seconds",
+            "Extra seconds the event loop took to run a timer",
+            buckets=LAG_BUCKETS,
+        )
+        self.loop_lag_quantiles = registry.gauge(
+            "ruia_loop_lag_quantile_seconds",
+            "Quantiles of the recent event loop lag",
+            ("quantile",),
+        )
+        self.slow_steps = registry.counter(
+            "ruia_slow_steps_total",
+            "Steps of callbacks, middleware, fields and clean methods which blocked the loop",
+            ("kind", "name"),
+        )
+        self.dns_lookups = registry.counter(
+            "ruia_dns_lookups_total",
+            "Lookups of the caching resolver by result: hit, negative_hit, miss, shared, prefetch or failure",
+            ("result",),
+        )
+        self.http_cache = registry.counter(
+            "ruia_http_cache_total",
+            "Requests of the HTTP cache by result: hit, revalidated or miss, and responses stored or evicted",
+            ("result",),
+        )
+        self.inflight = registry.gauge(
+            "ruia_inflight_requests", "Items taken by the workers and not finished yet"
+        )
+
+    def observe_fetch(self, request, status, latency: float):
+        """
+        Record a fetch attempt, see Request.fetch_observer
+        """
+        host = self.registry.host_label(urlparse(request.url).hostname or "")
+        self.requests.inc(host)
+        if request.retry_times < request.request_config.get("RETRIES", 3):
+            self.retries.inc(host)
+        if status is None:
+            self.errors.inc(host)
+            self.responses.inc("error")
+        else:
+            self.responses.inc(str(status))
+            self.latency.observe(latency, host)
+
+    def observe_timings(self, request, timings):
+        """
+        Record the RequestTimings of a finished request
+        """
+        host = self.registry.host_label(urlparse(request.url).hostname or "")
+        for phase in PHASES:
+            value = getattr(timings, phase)
+            if value is not None:
+                self.phases.observe(value, host, phase)
+        if timings.reused is not None:
+            self.connections.inc(host, str(timings.reused).lower())
+
+    def observe_bytes(self, host: str, n: int):
+        self.bytes.inc(self.registry.host_label(host), amount=n)
+
+    def observe_finished(self, ok: bool):
+        self.finished.inc("success" if ok else "failed")
+
+    def observe_item(self, item):
+        self.items.inc(type(item).__name__)
+
+    def sample_queue(self, size: int):
+        self.queue_size.set(size)
+        self.registry.sample_queue(size)
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Return a TraceConfig of aiohttp which counts the received bytes of a session
+        """
+
+        async def on_request_start(session, context, params):
+            context.metrics_host = params.url.host or ""
+
+        async def on_response_chunk_received(session, context, params):
+            self.observe_bytes(getattr(context, "metrics_host", ""), len(params.chunk))
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_response_chunk_received.append(on_response_chunk_received)
+        return trace_config
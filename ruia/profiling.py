@@ -0,0 +1,216 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Time the callbacks, the middleware, the field extractions and the clean methods of a spider
+    Changelog: all notable changes to this file will be documented
+"""
+
+import contextvars
+
+from time import perf_counter
+
+from ruia.loopmonitor import get_loop_monitor
+
+# The Profiler of the running spider, None when profiling is off
+_current_profiler = contextvars.ContextVar("profiler", default=None)
+
+
+def get_profiler():
+    """
+    Return the Profiler of the running spider, or None
+    """
+    return _current_profiler.get()
+
+
+def set_profiler(profiler) -> contextvars.Token:
+    """
+    Set the Profiler of the current context, the tasks created afterwards inherit it
+    :return: the token to pass to `reset_profiler`
+    """
+    return _current_profiler.set(profiler)
+
+
+def reset_profiler(token: contextvars.Token):
+    _current_profiler.reset(token)
+
+
+def field_selector(field) -> str:
+    """
+    Return the selector of a field, used to name it in reports
+    """
+    for attr in ("css_select", "xpath_select", "_re_select"):
+        selector = getattr(field, attr, None)
+        if selector:
+            return selector
+    return type(field).__name__
+
+
+def instrument(awaitable, kind: str, name: str):
+    """
+    Return `awaitable` timed for the Profiler and the LoopMonitor of the running spider,
+    or `awaitable` itself if both are off
+    """
+    profiler = get_profiler()
+    monitor = get_loop_monitor()
+    if profiler is None and monitor is None:
+        return awaitable
+    return _Timed(
+        awaitable,
+        on_done=profiler and (lambda seconds: profiler.record(kind, name, seconds)),
+        on_step=monitor and (lambda seconds: monitor.check(kind, name, seconds)),
+    )
+
+
+def instrument_async_gen(async_gen, kind: str, name: str):
+    """
+    Return `async_gen` timed for the Profiler and the LoopMonitor of the running spider,
+    or `async_gen` itself if both are off
+    """
+    profiler = get_profiler()
+    monitor = get_loop_monitor()
+    if profiler is None and monitor is None:
+        return async_gen
+    return _timed_async_gen(async_gen, kind, name, profiler, monitor)
+
+
+def record_call(kind: str, name: str, seconds: float):
+    """
+    Report a call which does not await, eg: Field.extract
+    """
+    profiler = get_profiler()
+    if profiler is not None:
+        profiler.record(kind, name, seconds)
+    monitor = get_loop_monitor()
+    if monitor is not None:
+        monitor.check(kind, name, seconds)
+
+
+def is_instrumented() -> bool:
+    return get_profiler() is not None or get_loop_monitor() is not None
+
+
+class _Timed:
+    """
+    Await an awaitable and only count the time spent running it,
+    the time it is suspended waiting for IO is not counted
+    """
+
+    __slots__ = ("awaitable", "on_done", "on_step")
+
+    def __init__(self, awaitable, on_done=None, on_step=None):
+        """
+        :param awaitable: the awaitable to time
+        :param on_done: called with the running time once it is done
+        :param on_step: called with the running time of each step, a step holds the loop
+        """
+        self.awaitable = awaitable
+        self.on_done = on_done
+        self.on_step = on_step
+
+    def __await__(self):
+        iterator = self.awaitable.__await__()
+        elapsed = 0.0
+        send, value = iterator.send, None
+        try:
+            while True:
+                start = perf_counter()
+                try:
+                    yielded = send(value)
+                except StopIteration as e:
+                    return e.value
+                finally:
+                    step = perf_counter() - start
+                    elapsed += step
+                    if self.on_step is not None:
+                        self.on_step(step)
+                try:
+                    value = yield yielded
+                    send = iterator.send
+                except GeneratorExit:
+                    iterator.close()
+                    raise
+                except BaseException as e:
+                    send, value = iterator.throw, e
+        finally:
+            if self.on_done is not None:
+                self.on_done(elapsed)
+
+
+async def _timed_async_gen(async_gen, kind: str, name: str, profiler, monitor):
+    """
+    Yield from `async_gen`, the running time of all its steps is recorded as one call
+    """
+    elapsed = 0.0
+
+    def add(seconds):
+        nonlocal elapsed
+        elapsed += seconds
+
+    on_step = monitor and (lambda seconds: monitor.check(kind, name, seconds))
+    try:
+        while True:
+            try:
+                value = await _Timed(async_gen.__anext__(), add, on_step)
+            except StopAsyncIteration:
+                break
+            yield value
+    finally:
+        await async_gen.aclose()
+        if profiler is not None:
+            profiler.record(kind, name, elapsed)
+
+
+class Profiler:
+    """
+    Sum the running time of callbacks, field extractions and clean methods by name,
+    the time of a callback includes the fields and the clean methods it ran
+    """
+
+    def __init__(self):
+        # (kind, name) -> [calls, total seconds, max seconds]
+        self.stats = {}
+
+    def record(self, kind: str, name: str, seconds: float):
+        stat = self.stats.get((kind, name))
+        if stat is None:
+            self.stats[(kind, name)] = [1, seconds, seconds]
+        else:
+            stat[0] += 1
+            stat[1] += seconds
+            if seconds > stat[2]:
+                stat[2] = seconds
+
+    def timed(self, awaitable, kind: str, name: str):
+        """
+        Return an awaitable of the result of `awaitable`, its running time is recorded
+        """
+        return _Timed(awaitable, lambda seconds: self.record(kind, name, seconds))
+
+    def timed_async_gen(self, async_gen, kind: str, name: str):
+        """
+        Yield from `async_gen`, the running time of all its steps is recorded as one call
+        """
+        return _timed_async_gen(async_gen, kind, name, self, None)
+
+    def top(self, n: int = 20, kind: str = None) -> list:
+        """
+        Return the n hot spots with the longest total time
+        :param kind: callback, middleware, field or clean, None for all of them
+        :return: a list of (kind, name, calls, total seconds, max seconds)
+        """
+        rows = [
+            (stat_kind, name, *stat)
+            for (stat_kind, name), stat in self.stats.items()
+            if kind is None or stat_kind == kind
+        ]
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows[:n]
+
+    def report(self, n: int = 20) -> str:
+        lines = [f"Profile, top {n} of each kind by total time:"]
+        for kind in ("callback", "middleware", "field", "clean"):
+            for _, name, calls, total, max_seconds in self.top(n, kind):
+                lines.append(
+                    f"  {kind:<10} {name}: calls {calls}, total {total:.4f}s, "
+                    f"mean {total / calls:.6f}s, max {max_seconds:.6f}s"
+                )
+        return "\n".join(lines)
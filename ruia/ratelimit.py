@@ -0,0 +1,269 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Token bucket rate limits of requests and bytes per second, global and per host
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import weakref
+
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+import aiohttp
+
+
+class TokenBucket:
+    """
+    `rate` tokens are added per second, up to `capacity`.
+    Bytes are taken after they are received, so the tokens can go below 0
+    """
+
+    __slots__ = ("rate", "capacity", "tokens", "last_time")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.last_time = now
+
+    def _refill(self, now: float):
+        if now > self.last_time:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.last_time) * self.rate
+            )
+            self.last_time = now
+
+    def wait_time(self, n: float, now: float) -> float:
+        """
+        Seconds until there are n tokens
+        """
+        self._refill(now)
+        return max(0.0, (n - self.tokens) / self.rate)
+
+    def take(self, n: float, now: float):
+        self._refill(now)
+        self.tokens -= n
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Buckets:
+    """
+    Buckets of a host, with the requests deferred until they have tokens
+    """
+
+    __slots__ = ("requests", "bytes", "deferred", "timer")
+
+    def __init__(self):
+        self.requests = None
+        self.bytes = None
+        self.deferred = deque()
+        self.timer = None
+
+
+class RateLimiter:
+    """
+    Limit the requests and the bytes per second of the spider and of each host.
+    A request without tokens is not slept on: it is deferred here,
+    and `on_ready` puts it back into the frontier once it has its tokens.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 0,
+        bytes_per_second: float = 0,
+        host_requests_per_second: float = 0,
+        host_bytes_per_second: float = 0,
+        burst: float = 1,
+        on_ready=None,
+        max_hosts: int = 10000,
+    ):
+        """
+        :param requests_per_second: requests per second of all hosts, 0 means no limit
+        :param bytes_per_second: received bytes per second of all hosts, 0 means no limit
+        :param host_requests_per_second: requests per second of each host, 0 means no limit
+        :param host_bytes_per_second: received bytes per second of each host, 0 means no limit
+        :param burst: seconds of tokens a bucket can save up, at least one request
+        :param on_ready: called with a deferred request once it has its tokens
+        :param max_hosts: max number of idle hosts whose buckets are kept
+        """
+        self.requests_per_second = requests_per_second
+        self.bytes_per_second = bytes_per_second
+        self.host_requests_per_second = host_requests_per_second
+        self.host_bytes_per_second = host_bytes_per_second
+        self.burst = burst
+        self.on_ready = on_ready
+        self.max_hosts = max_hosts
+        self.per_host = bool(host_requests_per_second or host_bytes_per_second)
+        self._global = None
+        self._hosts = OrderedDict()
+        self._admitted = weakref.WeakSet()
+
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_event_loop().time()
+
+    def _new_buckets(self, requests_per_second, bytes_per_second) -> _Buckets:
+        now = self._now()
+        buckets = _Buckets()
+        if requests_per_second:
+            buckets.requests = TokenBucket(
+                requests_per_second,
+                max(1.0, requests_per_second * self.burst),
+                now,
+            )
+        if bytes_per_second:
+            buckets.bytes = TokenBucket(
+                bytes_per_second, bytes_per_second * self.burst, now
+            )
+        return buckets
+
+    def _get_global(self) -> _Buckets:
+        if self._global is None:
+            self._global = self._new_buckets(
+                self.requests_per_second, self.bytes_per_second
+            )
+        return self._global
+
+    def _get_host(self, key: str) -> _Buckets:
+        buckets = self._hosts.get(key)
+        if buckets is None:
+            buckets = self._hosts[key] = self._new_buckets(
+                self.host_requests_per_second, self.host_bytes_per_second
+            )
+            self._evict()
+        else:
+            self._hosts.move_to_end(key)
+        return buckets
+
+    def _evict(self):
+        if len(self._hosts) <= self.max_hosts:
+            return
+        now = self._now()
+        for key in list(self._hosts):
+            if len(self._hosts) <= self.max_hosts:
+                break
+            buckets = self._hosts[key]
+            if (
+                not buckets.deferred
+                and (buckets.requests is None or buckets.requests.is_full(now))
+                and (buckets.bytes is None or buckets.bytes.is_full(now))
+            ):
+                del self._hosts[key]
+
+    def get_key(self, url: str) -> str:
+        """
+        Return the host name, or "" for all hosts if there is no per-host limit
+        """
+        return (urlparse(url).hostname or "") if self.per_host else ""
+
+    def _bucket_list(self, key: str) -> list:
+        bucket_list = [self._get_global()]
+        if self.per_host:
+            bucket_list.append(self._get_host(key))
+        return bucket_list
+
+    def _wait_time(self, key: str) -> float:
+        now = self._now()
+        wait_time = 0.0
+        for buckets in self._bucket_list(key):
+            if buckets.requests is not None:
+                wait_time = max(wait_time, buckets.requests.wait_time(1, now))
+            if buckets.bytes is not None:
+                # Bytes are paid afterwards, wait until the debt is paid off
+                wait_time = max(wait_time, buckets.bytes.wait_time(0, now))
+        return wait_time
+
+    def _take(self, key: str, request):
+        now = self._now()
+        for buckets in self._bucket_list(key):
+            if buckets.requests is not None:
+                buckets.requests.take(1, now)
+        self._admitted.add(request)
+
+    def try_acquire(self, request) -> bool:
+        """
+        Take the tokens of a request, or defer it until they are available.
+        A request keeps its tokens until `dispatched` is called, eg: while parked for a busy host
+        """
+        if request in self._admitted:
+            return True
+        key = self.get_key(request.url)
+        buckets = self._get_host(key) if self.per_host else self._get_global()
+        if not buckets.deferred and self._wait_time(key) <= 0:
+            self._take(key, request)
+            return True
+        # Behind the requests of the same host deferred before it
+        buckets.deferred.append(request)
+        self._schedule(key, buckets)
+        return False
+
+    def dispatched(self, request):
+        """
+        The request is being sent, its tokens are used
+        """
+        self._admitted.discard(request)
+
+    def record_bytes(self, key: str, n: int):
+        """
+        Take the tokens of n received bytes
+        """
+        now = self._now()
+        if self.bytes_per_second:
+            self._get_global().bytes.take(n, now)
+        if self.host_bytes_per_second:
+            self._get_host(key).bytes.take(n, now)
+
+    def _schedule(self, key: str, buckets: _Buckets):
+        if buckets.timer is None and buckets.deferred:
+            buckets.timer = asyncio.get_event_loop().call_later(
+                self._wait_time(key), self._on_timer, key, buckets
+            )
+
+    def _on_timer(self, key: str, buckets: _Buckets):
+        buckets.timer = None
+        while buckets.deferred and self._wait_time(key) <= 0:
+            request = buckets.deferred.popleft()
+            self._take(key, request)
+            if self.on_ready is not None:
+                self.on_ready(request)
+        self._schedule(key, buckets)
+
+    def deferred_requests(self) -> list:
+        """
+        Return the requests waiting for tokens, used by checkpoints
+        """
+        all_buckets = [self._global] if self._global is not None else []
+        all_buckets.extend(self._hosts.values())
+        return [request for buckets in all_buckets for request in buckets.deferred]
+
+    def close(self):
+        """
+        Cancel the timers and forget the deferred requests
+        """
+        all_buckets = [self._global] if self._global is not None else []
+        all_buckets.extend(self._hosts.values())
+        for buckets in all_buckets:
+            if buckets.timer is not None:
+                buckets.timer.cancel()
+                buckets.timer = None
+            buckets.deferred.clear()
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        Return a TraceConfig of aiohttp which counts the received bytes of a session
+        """
+
+        async def on_request_start(session, context, params):
+            context.rate_limit_key = self.get_key(str(params.url))
+
+        async def on_response_chunk_received(session, context, params):
+            self.record_bytes(getattr(context, "rate_limit_key", ""), len(params.chunk))
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_response_chunk_received.append(on_response_chunk_received)
+        return trace_config
@@ -12,12 +12,18 @@ from asyncio.locks import Semaphore
 from inspect import iscoroutinefunction
 from types import AsyncGeneratorType
 from typing import Coroutine, Optional, Tuple
+from urllib.parse import urlparse
 
 import aiohttp
 import async_timeout
 
-from ruia.exceptions import InvalidRequestMethod
+from ruia.bodylimit import LimitedResponse, limit_response
+from ruia.dupefilter import request_fingerprint
+from ruia.exceptions import InvalidRequestMethod, ResponseLimitError, RetryLater
+from ruia.profiling import instrument, instrument_async_gen
 from ruia.response import Response
+from ruia.retry import is_retryable, parse_retry_after, retry_delay
+from ruia.timings import RequestTimings, timing_trace_config
 from ruia.utils import get_logger
 
 try:
@@ -28,6 +34,16 @@ except ImportError:
     pass
 
 
+def is_config_code(value) -> bool:
+    """
+    Whether a request_config value is code, eg: RETRY_FUNC or RETRY_EXCEPTIONS,
+    it is not serialized and is taken from the spider again
+    """
+    if isinstance(value, (tuple, list)):
+        return any(callable(item) for item in value)
+    return callable(value)
+
+
 class Request:
     """
     Request class for each request
@@ -59,6 +75,8 @@ class Request:
         request_config: dict = None,
         request_session=None,
         close_request_session=False,
+        priority: int = 0,
+        dont_filter: bool = False,
         **aiohttp_kwargs,
     ):
         """
@@ -73,6 +91,8 @@ class Request:
             request_config (dict, optional): Manage the target request. Defaults to None.
             request_session (_type_, optional): aiohttp.ClientSession. Defaults to None.
             close_request_session (_type_, optional): whether to close the aiohttp.ClientSession. Defaults to None.
+            priority (int, optional): A higher priority is crawled first by the spider. Defaults to 0.
+            dont_filter (bool, optional): Skip the duplicate filter of the spider. Defaults to False.
         """
         self.url = url
         self.method = method.upper()
@@ -81,6 +101,8 @@ class Request:
             raise InvalidRequestMethod(f"{self.method} method is not supported")
 
         self.callback = callback
+        self.priority = priority
+        self.dont_filter = dont_filter
         self.encoding = encoding
         self.headers = headers or {}
         self.metadata = metadata or {}
@@ -94,12 +116,84 @@ class Request:
         self.close_request_session = close_request_session
         self.logger = get_logger(name=self.name)
         self.retry_times = self.request_config.get("RETRIES", 3)
+        # Called with (request, status, latency) after each attempt, status is None on errors
+        self.fetch_observer = None
+        # RequestTimings of the last attempt
+        self.timings = None
+        # HttpCache replaying and storing the responses, see ruia.httpcache
+        self.http_cache = None
+        # Raise RetryLater instead of retrying in place, set by the spider which retries it from its timer heap
+        self.defer_retries = False
+        # RetryBudget shared by the requests of a spider, enforces RETRY_BUDGET
+        self.retry_budget = None
+        # Defaults of MAX_BODY_SIZE and ALLOWED_CONTENT_TYPES, set by the spider
+        self.max_body_size = None
+        self.allowed_content_types = None
+        self._fingerprint = None
+
+    def to_dict(self) -> dict:
+        """
+        Return a compact serializable form of the request,
+        the callback is referenced by its method name and callables of request_config are skipped
+        """
+        return {
+            "url": self.url,
+            "method": self.method,
+            "callback": self.callback.__name__ if self.callback else None,
+            "encoding": self.encoding,
+            "headers": dict(self.headers),
+            "metadata": self.metadata,
+            "request_config": {
+                key: value
+                for key, value in self.request_config.items()
+                if not is_config_code(value)
+            },
+            "priority": self.priority,
+            "dont_filter": self.dont_filter,
+            "ssl": self.ssl,
+            "retry_times": self.retry_times,
+            "aiohttp_kwargs": self.aiohttp_kwargs,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, callback=None, request_session=None):
+        """
+        Init a request from the result of `to_dict`
+        :param data: dict
+        :param callback: the callback resolved from data["callback"]
+        :param request_session: aiohttp.ClientSession
+        """
+        request = cls(
+            url=data["url"],
+            method=data["method"],
+            callback=callback,
+            encoding=data["encoding"],
+            headers=data["headers"],
+            metadata=data["metadata"],
+            request_config=data["request_config"],
+            request_session=request_session,
+            priority=data["priority"],
+            dont_filter=data["dont_filter"],
+            ssl=data["ssl"],
+            **data["aiohttp_kwargs"],
+        )
+        request.retry_times = data["retry_times"]
+        return request
+
+    @property
+    def fingerprint(self) -> str:
+        """Fingerprint made of method, canonical url and body"""
+        if self._fingerprint is None:
+            self._fingerprint = request_fingerprint(self)
+        return self._fingerprint
 
     @property
     def current_request_session(self):
         """Get current aiohttp session"""
         if self.request_session is None:
-            self.request_session = aiohttp.ClientSession()
+            self.request_session = aiohttp.ClientSession(
+                trace_configs=[timing_trace_config()]
+            )
             self.close_request_session = True
         return self.request_session
 
@@ -117,9 +211,17 @@ class Request:
             await asyncio.sleep(self.request_config["DELAY"])
 
         timeout = self.request_config.get("TIMEOUT", 10)
+        if self.retry_budget is not None and "RETRY_BUDGET" in self.request_config:
+            self.retry_budget.record_request(self.host)
+        start_time = asyncio.get_event_loop().time()
         try:
             async with async_timeout.timeout(timeout):
                 resp = await self._make_request()
+                if isinstance(resp, LimitedResponse):
+                    # Read within the timeout, a body over MAX_BODY_SIZE fails the request here
+                    await resp.read()
+            self._observe_fetch(resp.status, start_time)
+            start_time = None
             try:
                 resp_encoding = resp.get_encoding()
             except Exception as _:
@@ -137,6 +239,8 @@ class Request:
                 aws_json=resp.json,
                 aws_text=resp.text,
                 aws_read=resp.read,
+                timings=self.timings,
+                from_cache=getattr(resp, "from_cache", False),
             )
             # Retry middleware
             aws_valid_response = self.request_config.get("VALID")
@@ -146,12 +250,33 @@ class Request:
                 return response
             else:
                 return await self._retry(
-                    error_msg=f"Request url failed with status {response.status}!"
+                    error_msg=f"Request url failed with status {response.status}!",
+                    retry_after=parse_retry_after(
+                        (response.headers or {}).get("Retry-After")
+                    ),
+                    response=response,
                 )
-        except asyncio.TimeoutError:
-            return await self._retry(error_msg="timeout")
+        except RetryLater:
+            raise
+        except asyncio.TimeoutError as e:
+            self._observe_fetch(None, start_time)
+            return await self._retry(error_msg="timeout", error=e)
+        except ResponseLimitError as e:
+            self._observe_fetch(None, start_time)
+            self.logger.error(f"<Dropped: {self.url}> {e}")
+            return await self._retry(error_msg=e, error=e)
         except Exception as e:
-            return await self._retry(error_msg=e)
+            self._observe_fetch(None, start_time)
+            return await self._retry(error_msg=e, error=e)
+
+    def _observe_fetch(self, status: Optional[int], start_time: Optional[float]):
+        """
+        Report an attempt to `fetch_observer`,
+        start_time is None once the response arrived, later errors come from VALID
+        """
+        if self.fetch_observer is not None and start_time is not None:
+            latency = asyncio.get_event_loop().time() - start_time
+            self.fetch_observer(self, status, latency)
 
     async def fetch_callback(
         self, sem: Semaphore
@@ -164,51 +289,119 @@ class Request:
         try:
             async with sem:
                 response = await self.fetch()
+        except RetryLater:
+            # Retried by the spider, the callback gets the response of the last attempt
+            raise
         except Exception as e:
             response = None
             self.logger.error(f"<Error: {self.url} {e}>")
 
         if self.callback is not None:
+            name = getattr(self.callback, "__qualname__", repr(self.callback))
             if iscoroutinefunction(self.callback):
-                callback_result = await self.callback(response)
+                callback_result = await instrument(
+                    self.callback(response), "callback", name
+                )
             else:
                 callback_result = self.callback(response)
+                if isinstance(callback_result, AsyncGeneratorType):
+                    callback_result = instrument_async_gen(
+                        callback_result, "callback", name
+                    )
         else:
             callback_result = None
         return callback_result, response
 
     async def _make_request(self):
-        """Make a request by using aiohttp"""
+        """Make a request by using aiohttp, or replay it from `http_cache`"""
+        headers, entry = self.headers, None
+        if self.http_cache is not None:
+            entry = self.http_cache.get(self)
+            if entry is not None:
+                if self.http_cache.is_fresh(entry, self):
+                    self.logger.info(f"<{self.method}: {self.url}> from the cache")
+                    self.timings = None
+                    return self.http_cache.replay(entry, self)
+                headers = dict(headers, **entry.conditional_headers())
         self.logger.info(f"<{self.method}: {self.url}>")
+        aiohttp_kwargs = self.aiohttp_kwargs
+        if "trace_request_ctx" in aiohttp_kwargs:
+            self.timings = None
+        else:
+            # Filled by timing_trace_config if the session has it
+            self.timings = RequestTimings()
+            aiohttp_kwargs = dict(aiohttp_kwargs, trace_request_ctx=self.timings)
         if self.method == "GET":
             request_func = self.current_request_session.get(
-                self.url, headers=self.headers, ssl=self.ssl, **self.aiohttp_kwargs
+                self.url, headers=headers, ssl=self.ssl, **aiohttp_kwargs
             )
         else:
             request_func = self.current_request_session.post(
-                self.url, headers=self.headers, ssl=self.ssl, **self.aiohttp_kwargs
+                self.url, headers=headers, ssl=self.ssl, **aiohttp_kwargs
             )
         resp = await request_func
+        max_body_size = self.request_config.get("MAX_BODY_SIZE", self.max_body_size)
+        allowed_content_types = self.request_config.get(
+            "ALLOWED_CONTENT_TYPES", self.allowed_content_types
+        )
+        revalidated = entry is not None and resp.status == 304
+        if (max_body_size or allowed_content_types is not None) and not revalidated:
+            resp = limit_response(resp, max_body_size, allowed_content_types)
+        if self.http_cache is not None:
+            resp = await self.http_cache.process_response(self, resp, entry)
         return resp
 
-    async def _retry(self, error_msg):
-        """Manage request"""
-        if self.retry_times > 0:
-            # Sleep to give server a chance to process/cache prior request
-            if self.request_config.get("RETRY_DELAY", 0) > 0:
-                await asyncio.sleep(self.request_config["RETRY_DELAY"])
+    @property
+    def host(self) -> str:
+        return urlparse(self.url).hostname or ""
 
+    async def _retry(
+        self,
+        error_msg,
+        retry_after: Optional[float] = None,
+        response: Response = None,
+        error: Exception = None,
+    ):
+        """
+        Retry the request, unless its failure is permanent, see RETRY_STATUSES and RETRY_EXCEPTIONS,
+        or the RETRY_BUDGET of its host is used up
+        :param retry_after: seconds of the Retry-After header of the failed response
+        :param response: the failed response
+        :param error: the exception of the failed attempt
+        """
+        retry = self.retry_times > 0 and is_retryable(
+            self.request_config, response, error
+        )
+        if retry and not self._take_retry_budget():
+            self.logger.info(
+                f"<Retry budget of {self.host} used up, not retried: {self.url}>"
+            )
+            retry = False
+        if retry:
             retry_times = self.request_config.get("RETRIES", 3) - self.retry_times + 1
+            delay = retry_delay(self.request_config, retry_times, retry_after)
             self.logger.info(
                 f"<Retry url: {self.url}>, Retry times: {retry_times}, Retry message: {error_msg}>"
             )
             self.retry_times -= 1
+            if delay > 0 and not self.defer_retries:
+                # Sleep to give server a chance to process/cache prior request
+                await asyncio.sleep(delay)
+            request_ins = self
             retry_func = self.request_config.get("RETRY_FUNC")
             if retry_func and iscoroutinefunction(retry_func):
-                request_ins = await retry_func(weakref.proxy(self))
-                if isinstance(request_ins, Request):
-                    return await request_ins.fetch(delay=False)
-            return await self.fetch(delay=False)
+                result = await retry_func(weakref.proxy(self))
+                if (
+                    isinstance(result, Request)
+                    and type(result) is not weakref.ProxyType
+                ):
+                    request_ins = result
+            if self.defer_retries:
+                raise RetryLater(request_ins, delay, error_msg)
+            return await request_ins.fetch(delay=False)
+        elif response is not None and self.retry_times > 0:
+            # Not retried, eg: a 404, the callback gets it as is
+            return response
         else:
             response = Response(
                 url=self.url,
@@ -221,5 +414,11 @@ class Request:
 
             return response
 
+    def _take_retry_budget(self) -> bool:
+        ratio = self.request_config.get("RETRY_BUDGET")
+        if self.retry_budget is None or ratio is None:
+            return True
+        return self.retry_budget.try_retry(self.host, ratio)
+
     def __repr__(self):
         return f"<{self.method} {self.url}>"
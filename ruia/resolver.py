@@ -0,0 +1,478 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: An async DNS resolver with a TTL cache, negative caching, bounded lookups and prefetching
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import ipaddress
+import json
+import os
+import random
+import socket
+import struct
+import time
+
+from collections import OrderedDict
+
+from aiohttp.abc import AbstractResolver
+
+from ruia.exceptions import DNSLookupError
+
+QTYPE_A = 1
+QTYPE_AAAA = 28
+QCLASS_IN = 1
+RCODE_NOERROR = 0
+RCODE_NXDOMAIN = 3
+
+RESOLV_CONF = "/etc/resolv.conf"
+HOSTS_FILE = "/etc/hosts"
+# Name of the cache file in the job directory of a spider
+DNS_CACHE_FILE = "dns_cache.json"
+DNS_CACHE_VERSION = 1
+
+_FAMILY_QTYPES = {
+    socket.AF_INET: (QTYPE_A,),
+    socket.AF_INET6: (QTYPE_AAAA,),
+    socket.AF_UNSPEC: (QTYPE_A, QTYPE_AAAA),
+}
+_QTYPE_FAMILIES = {QTYPE_A: socket.AF_INET, QTYPE_AAAA: socket.AF_INET6}
+
+
+def is_ip_address(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return True
+
+
+def build_query(qid: int, host: str, qtype: int) -> bytes:
+    """
+    Build a DNS query of one question, recursion desired
+    """
+    labels = b"".join(
+        bytes((len(label),)) + label
+        for label in host.rstrip(".").encode("idna").split(b".")
+    )
+    return (
+        struct.pack("!HHHHHH", qid, 0x0100, 1, 0, 0, 0)
+        + labels
+        + b"\x00"
+        + struct.pack("!HH", qtype, QCLASS_IN)
+    )
+
+
+def _skip_name(data: bytes, offset: int) -> int:
+    while True:
+        length = data[offset]
+        if length & 0xC0 == 0xC0:
+            # A compression pointer ends the name
+            return offset + 2
+        if length == 0:
+            return offset + 1
+        offset += length + 1
+
+
+def parse_response(data: bytes) -> tuple:
+    """
+    Parse a DNS response
+    :return: (id, rcode, records), records is a list of (qtype, address, ttl) of its A and AAAA answers
+    """
+    try:
+        qid, flags, qdcount, ancount, _, _ = struct.unpack_from("!HHHHHH", data)
+        offset = 12
+        for _ in range(qdcount):
+            offset = _skip_name(data, offset) + 4
+        records = []
+        for _ in range(ancount):
+            offset = _skip_name(data, offset)
+            rtype, _, ttl, length = struct.unpack_from("!HHIH", data, offset)
+            offset += 10
+            rdata = data[offset : offset + length]
+            offset += length
+            if rtype == QTYPE_A and length == 4:
+                records.append((rtype, socket.inet_ntop(socket.AF_INET, rdata), ttl))
+            elif rtype == QTYPE_AAAA and length == 16:
+                records.append((rtype, socket.inet_ntop(socket.AF_INET6, rdata), ttl))
+    except (IndexError, struct.error):
+        raise DNSLookupError("<Resolver: malformed DNS response>")
+    return qid, flags & 0xF, records
+
+
+def parse_nameserver(nameserver) -> tuple:
+    """
+    :param nameserver: "1.1.1.1", "127.0.0.1:5353", "[::1]:53" or a (host, port) tuple
+    :return: (host, port)
+    """
+    if isinstance(nameserver, (tuple, list)):
+        return nameserver[0], int(nameserver[1])
+    if nameserver.startswith("["):
+        host, _, port = nameserver[1:].partition("]")
+        return host, int(port.lstrip(":") or 53)
+    if nameserver.count(":") == 1:
+        host, port = nameserver.split(":")
+        return host, int(port)
+    return nameserver, 53
+
+
+def read_nameservers(path: str = RESOLV_CONF) -> list:
+    """
+    Return the nameservers of resolv.conf, an empty list if it can not be read
+    """
+    nameservers = []
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) >= 2 and fields[0] == "nameserver":
+                    # eg: fe80::1%eth0, the zone is not supported
+                    host = fields[1].split("%")[0]
+                    if is_ip_address(host):
+                        nameservers.append((host, 53))
+    except OSError:
+        pass
+    return nameservers
+
+
+def read_hosts(path: str = HOSTS_FILE) -> dict:
+    """
+    Return the addresses of the host names of a hosts file, eg: localhost
+    :return: {host: [(family, address)]}
+    """
+    hosts = {}
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                fields = line.split("#")[0].split()
+                if len(fields) < 2 or not is_ip_address(fields[0]):
+                    continue
+                family = socket.AF_INET6 if ":" in fields[0] else socket.AF_INET
+                for name in fields[1:]:
+                    hosts.setdefault(name.lower(), []).append((family, fields[0]))
+    except OSError:
+        pass
+    return hosts
+
+
+class _DNSProtocol(asyncio.DatagramProtocol):
+    def __init__(self, qid: int, future: asyncio.Future):
+        self.qid = qid
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if self.future.done():
+            return
+        try:
+            response = parse_response(data)
+        except DNSLookupError:
+            return
+        # Answers of other queries are ignored, eg: spoofed ones
+        if response[0] == self.qid:
+            self.future.set_result(response)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+    def connection_lost(self, exc):
+        if not self.future.done():
+            self.future.set_exception(
+                exc or DNSLookupError("<Resolver: socket closed>")
+            )
+
+
+async def query(nameserver: tuple, host: str, qtype: int, timeout: float) -> tuple:
+    """
+    Send one query to a nameserver over UDP
+    :return: (id, rcode, records) of its response, see parse_response
+    """
+    loop = asyncio.get_event_loop()
+    qid = random.getrandbits(16)
+    future = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _DNSProtocol(qid, future), remote_addr=nameserver
+    )
+    try:
+        transport.sendto(build_query(qid, host, qtype))
+        return await asyncio.wait_for(future, timeout)
+    finally:
+        transport.close()
+
+
+class CachingResolver(AbstractResolver):
+    """
+    Resolve host names for aiohttp with its own UDP queries, without a thread for each lookup.
+    Answers are cached for their TTL and failures for `negative_ttl` seconds, concurrent lookups
+    of a host share one query and at most `max_concurrency` queries run at once.
+    `prefetch` resolves the host of a queued request before it is crawled
+    """
+
+    def __init__(
+        self,
+        nameservers: list = None,
+        max_concurrency: int = 50,
+        timeout: float = 2.0,
+        attempts: int = 2,
+        min_ttl: float = 10,
+        max_ttl: float = 3600,
+        negative_ttl: float = 30,
+        default_ttl: float = 300,
+        max_size: int = 10000,
+        max_prefetch: int = 1000,
+        metrics=None,
+    ):
+        """
+        :param nameservers: "1.1.1.1", "127.0.0.1:5353" or (host, port), defaults to the ones of resolv.conf,
+            getaddrinfo of the loop is used if there are none
+        :param max_concurrency: max number of lookups at once
+        :param timeout: seconds to wait for the answer of a nameserver
+        :param attempts: number of times each nameserver is tried
+        :param min_ttl: seconds an answer is cached at least, whatever its TTL
+        :param max_ttl: seconds an answer is cached at most
+        :param negative_ttl: seconds a failed lookup is cached
+        :param default_ttl: seconds the answers without a TTL are cached, eg: from getaddrinfo or the hosts file
+        :param max_size: max number of cached lookups, the least recently used ones are dropped
+        :param max_prefetch: max number of pending prefetches, the others are skipped
+        :param metrics: CrawlMetrics, counts the cache hits, misses and failures
+        """
+        if nameservers is None:
+            nameservers = read_nameservers()
+        self.nameservers = [parse_nameserver(ns) for ns in nameservers]
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.attempts = attempts
+        self.min_ttl = min_ttl
+        self.max_ttl = max_ttl
+        self.negative_ttl = negative_ttl
+        self.default_ttl = default_ttl
+        self.max_size = max_size
+        self.max_prefetch = max_prefetch
+        self.metrics = metrics
+        self.hosts = read_hosts()
+        # (host, family) -> (expires at, [(family, address)] or None if it failed, error)
+        self._cache = OrderedDict()
+        # (host, family) -> task of the running lookup
+        self._lookups = {}
+        self._semaphore = None
+
+    @staticmethod
+    def _now() -> float:
+        # Wall clock, the expiry times are kept across runs
+        return time.time()
+
+    def _count(self, result: str):
+        if self.metrics is not None:
+            self.metrics.dns_lookups.inc(result)
+
+    async def resolve(
+        self, host: str, port: int = 0, family: int = socket.AF_INET
+    ) -> list:
+        """
+        Return the addresses of a host in the format of aiohttp
+        :raise DNSLookupError: the host can not be resolved
+        """
+        if is_ip_address(host):
+            addresses = [(socket.AF_INET6 if ":" in host else socket.AF_INET, host)]
+        else:
+            addresses = await self.lookup(host, family)
+        return [
+            {
+                "hostname": host,
+                "host": address,
+                "port": port,
+                "family": address_family,
+                "proto": 0,
+                "flags": socket.AI_NUMERICHOST | socket.AI_NUMERICSERV,
+            }
+            for address_family, address in addresses
+        ]
+
+    async def lookup(self, host: str, family: int = socket.AF_INET) -> list:
+        """
+        :return: the (family, address) of a host, from the cache if it has not expired
+        :raise DNSLookupError: the host can not be resolved, or failed to within `negative_ttl` seconds
+        """
+        key = (host.lower().rstrip("."), family)
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] > self._now():
+            self._cache.move_to_end(key)
+            if entry[1] is None:
+                self._count("negative_hit")
+                raise DNSLookupError(entry[2])
+            self._count("hit")
+            return entry[1]
+        task = self._lookups.get(key)
+        if task is None:
+            self._count("miss")
+            task = self._start_lookup(key)
+        else:
+            # eg: prefetched, or resolved by another request meanwhile
+            self._count("shared")
+        # Cancelling one of the waiters does not cancel the lookup of the others
+        return await asyncio.shield(task)
+
+    def prefetch(self, host: str, family: int = socket.AF_UNSPEC) -> bool:
+        """
+        Resolve a host in the background unless it is cached or being resolved
+        :param family: the family of the connector, it is part of the cache key
+        :return: whether a lookup was started
+        """
+        if not host or is_ip_address(host) or len(self._lookups) >= self.max_prefetch:
+            return False
+        key = (host.lower().rstrip("."), family)
+        entry = self._cache.get(key)
+        if key in self._lookups or (entry is not None and entry[0] > self._now()):
+            return False
+        self._count("prefetch")
+        self._start_lookup(key)
+        return True
+
+    def _start_lookup(self, key: tuple) -> asyncio.Task:
+        task = asyncio.ensure_future(self._lookup(*key))
+        self._lookups[key] = task
+
+        def done(task):
+            self._lookups.pop(key, None)
+            if not task.cancelled():
+                # A prefetch nobody waits for must not log its error
+                task.exception()
+
+        task.add_done_callback(done)
+        return task
+
+    async def _lookup(self, host: str, family: int) -> list:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            try:
+                addresses, ttl = await self._query(host, family)
+            except DNSLookupError as e:
+                self._count("failure")
+                self._store((host, family), None, self.negative_ttl, str(e))
+                raise
+        self._store(
+            (host, family), addresses, min(max(ttl, self.min_ttl), self.max_ttl)
+        )
+        return addresses
+
+    def _store(self, key: tuple, addresses, ttl: float, error: str = None):
+        self._cache[key] = (self._now() + ttl, addresses, error)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    async def _query(self, host: str, family: int) -> tuple:
+        """
+        :return: ([(family, address)], TTL in seconds)
+        """
+        families = {_QTYPE_FAMILIES[qtype] for qtype in _FAMILY_QTYPES[family]}
+        static = [info for info in self.hosts.get(host, ()) if info[0] in families]
+        if static:
+            return static, self.default_ttl
+        if not self.nameservers:
+            return await self._getaddrinfo(host, family), self.default_ttl
+        results = await asyncio.gather(
+            *[self._query_type(host, qtype) for qtype in _FAMILY_QTYPES[family]],
+            return_exceptions=True,
+        )
+        records = []
+        for result in results:
+            if isinstance(result, BaseException):
+                # Only failed if no family could be resolved
+                if len(results) == 1 or all(
+                    isinstance(r, BaseException) for r in results
+                ):
+                    raise result
+                continue
+            records.extend(result)
+        if not records:
+            raise DNSLookupError(f"<Resolver: no address for {host}>")
+        addresses = [(_QTYPE_FAMILIES[qtype], address) for qtype, address, _ in records]
+        return addresses, min(ttl for _, _, ttl in records)
+
+    async def _query_type(self, host: str, qtype: int) -> list:
+        """
+        Ask the nameservers in turn until one answers
+        :return: the (qtype, address, ttl) records of the answer
+        """
+        error = f"<Resolver: no nameserver answered for {host}>"
+        for _ in range(self.attempts):
+            for nameserver in self.nameservers:
+                try:
+                    _, rcode, records = await query(
+                        nameserver, host, qtype, self.timeout
+                    )
+                except (OSError, asyncio.TimeoutError):
+                    continue
+                if rcode == RCODE_NXDOMAIN:
+                    raise DNSLookupError(f"<Resolver: {host} does not exist>")
+                if rcode == RCODE_NOERROR:
+                    return [record for record in records if record[0] == qtype]
+                # eg: SERVFAIL or REFUSED, another nameserver may answer
+                error = f"<Resolver: {host} failed with rcode {rcode}>"
+        raise DNSLookupError(error)
+
+    async def _getaddrinfo(self, host: str, family: int) -> list:
+        try:
+            infos = await asyncio.get_event_loop().getaddrinfo(
+                host, None, family=family, type=socket.SOCK_STREAM
+            )
+        except OSError as e:
+            raise DNSLookupError(f"<Resolver: {host} can not be resolved, {e}>")
+        addresses = []
+        for info_family, _, _, _, sockaddr in infos:
+            if (info_family, sockaddr[0]) not in addresses:
+                addresses.append((info_family, sockaddr[0]))
+        return addresses
+
+    def save(self, path: str) -> int:
+        """
+        Write the entries of the cache which have not expired to a JSON file
+        :return: the number of entries written
+        """
+        now = self._now()
+        entries = [
+            [host, family, expires, addresses, error]
+            for (host, family), (expires, addresses, error) in self._cache.items()
+            if expires > now
+        ]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": DNS_CACHE_VERSION, "entries": entries}, f)
+        os.replace(tmp_path, path)
+        return len(entries)
+
+    def load(self, path: str) -> int:
+        """
+        Add the entries of a file written by `save` which have not expired yet
+        :return: the number of entries loaded, 0 if there is no file
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return 0
+        except ValueError:
+            # eg: written partly, the cache is only an optimization
+            return 0
+        if data.get("version") != DNS_CACHE_VERSION:
+            return 0
+        now = self._now()
+        loaded = 0
+        for host, family, expires, addresses, error in data["entries"]:
+            if expires > now:
+                if addresses is not None:
+                    addresses = [tuple(address) for address in addresses]
+                self._cache[(host, family)] = (expires, addresses, error)
+                loaded += 1
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return loaded
+
+    async def close(self):
+        tasks = list(self._lookups.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
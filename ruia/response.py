@@ -42,6 +42,8 @@ class Response(object):
         aws_json: Callable = None,
         aws_read: Callable = None,
         aws_text: Callable = None,
+        timings=None,
+        from_cache: bool = False,
     ):
         self._callback_result = None
         self._encoding = encoding
@@ -59,6 +61,8 @@ class Response(object):
         self._aws_json = aws_json
         self._aws_read = aws_read
         self._aws_text = aws_text
+        self._timings = timings
+        self._from_cache = from_cache
 
     @property
     def callback_result(self):
@@ -133,6 +137,16 @@ class Response(object):
         """Return status"""
         return self._status
 
+    @property
+    def timings(self):
+        """Return the RequestTimings of the request, None without a timing TraceConfig or if replayed from the cache"""
+        return self._timings
+
+    @property
+    def from_cache(self) -> bool:
+        """Return whether the body was replayed from the HttpCache of the request"""
+        return self._from_cache
+
     def html_etree(self, html: str, **kwargs):
         """
         Return etree HTML
@@ -0,0 +1,212 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Retry policy, backoff and per-host budget of retries, and the timer heap the spider retries requests from
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import heapq
+import itertools
+import random
+import time
+
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import aiohttp
+
+# Default backoff of request_config, see retry_delay
+RETRY_BACKOFF = 2
+RETRY_JITTER = 0.25
+RETRY_MAX_DELAY = 300
+# Default retry policy of request_config, other failures are permanent, eg: 404, 410 or 403
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+# Timeouts, refused or reset connections, DNS failures and truncated bodies
+RETRY_EXCEPTIONS = (
+    asyncio.TimeoutError,
+    ConnectionError,
+    aiohttp.ClientConnectionError,
+    aiohttp.ClientPayloadError,
+)
+
+
+def parse_retry_after(value: Optional[str], now: float = None) -> Optional[float]:
+    """
+    :param value: a Retry-After header, seconds or an HTTP date
+    :return: seconds to wait, None if it is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+
+def retry_delay(
+    request_config: dict, attempt: int, retry_after: Optional[float] = None
+) -> float:
+    """
+    Return the seconds to wait before a retry:
+    RETRY_DELAY * RETRY_BACKOFF ** (attempt - 1), plus up to RETRY_JITTER of it at random,
+    at least `retry_after` and at most RETRY_MAX_DELAY
+    :param request_config: the request_config of the request
+    :param attempt: 1 for the first retry
+    :param retry_after: seconds of the Retry-After header of the failed response
+    """
+    delay = request_config.get("RETRY_DELAY", 0) * request_config.get(
+        "RETRY_BACKOFF", RETRY_BACKOFF
+    ) ** max(0, attempt - 1)
+    delay *= 1 + random.random() * request_config.get("RETRY_JITTER", RETRY_JITTER)
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return min(delay, request_config.get("RETRY_MAX_DELAY", RETRY_MAX_DELAY))
+
+
+def is_retryable(request_config: dict, response=None, error=None) -> bool:
+    """
+    Whether a failed attempt is retried, from RETRY_STATUSES and RETRY_EXCEPTIONS of request_config
+    :param response: the failed response, a successful status means VALID marked it as failed
+    :param error: the exception of the attempt, if it raised
+    """
+    if error is not None:
+        return isinstance(
+            error, tuple(request_config.get("RETRY_EXCEPTIONS", RETRY_EXCEPTIONS))
+        )
+    if response is None:
+        return True
+    status = response.status
+    return status in request_config.get("RETRY_STATUSES", RETRY_STATUSES) or (
+        200 <= status <= 299
+    )
+
+
+class RetryBudget:
+    """
+    Keep the retries of each host within a share of its requests, RETRY_BUDGET of request_config,
+    so that a failing host does not multiply its load by RETRIES
+    """
+
+    def __init__(self, min_retries: int = 10, max_hosts: int = 10000):
+        """
+        :param min_retries: retries of a host allowed whatever its requests, eg: at the start of a crawl
+        :param max_hosts: number of hosts counted, the least recently used ones are forgotten
+        """
+        self.min_retries = min_retries
+        self.max_hosts = max_hosts
+        # host -> [requests, retries]
+        self._hosts = OrderedDict()
+        self.denied = 0
+
+    def _get(self, host: str) -> list:
+        counts = self._hosts.get(host)
+        if counts is None:
+            counts = self._hosts[host] = [0, 0]
+            if len(self._hosts) > self.max_hosts:
+                self._hosts.popitem(last=False)
+        else:
+            self._hosts.move_to_end(host)
+        return counts
+
+    def record_request(self, host: str):
+        """
+        Count an attempt of a request of the host, retries included
+        """
+        self._get(host)[0] += 1
+
+    def try_retry(self, host: str, ratio: float) -> bool:
+        """
+        Take a retry of the host if it has some left
+        :param ratio: max retries per request of the host, beyond `min_retries`
+        """
+        counts = self._get(host)
+        if counts[1] >= self.min_retries + ratio * counts[0]:
+            self.denied += 1
+            return False
+        counts[1] += 1
+        return True
+
+    def counts(self, host: str) -> tuple:
+        """
+        :return: (requests, retries) of the host
+        """
+        return tuple(self._hosts.get(host, (0, 0)))
+
+
+class RetryScheduler:
+    """
+    Hold failed requests until their retry is due, on a heap with a single timer.
+    A waiting retry holds neither a worker slot nor a concurrency slot,
+    `on_ready` puts it back into the frontier once it is due
+    """
+
+    def __init__(self, on_ready=None):
+        """
+        :param on_ready: called with each request once its retry is due
+        """
+        self.on_ready = on_ready
+        # (due time, sequence, request), the sequence keeps the order of requests due at once
+        self._heap = []
+        self._counter = itertools.count()
+        self._timer = None
+
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_event_loop().time()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, request, delay: float):
+        """
+        Retry `request` in `delay` seconds
+        """
+        due = self._now() + max(0.0, delay)
+        heapq.heappush(self._heap, (due, next(self._counter), request))
+        if self._heap[0][2] is request:
+            # Due before the others, the timer is set again
+            self._set_timer()
+
+    def _set_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._heap:
+            self._timer = asyncio.get_event_loop().call_later(
+                max(0.0, self._heap[0][0] - self._now()), self._on_timer
+            )
+
+    def _on_timer(self):
+        self._timer = None
+        now = self._now()
+        while self._heap and self._heap[0][0] <= now:
+            _, _, request = heapq.heappop(self._heap)
+            if self.on_ready is not None:
+                self.on_ready(request)
+        self._set_timer()
+
+    def pending_requests(self) -> list:
+        """
+        Return the requests waiting for their retry, used by checkpoints
+        """
+        return [request for _, _, request in sorted(self._heap)]
+
+    def next_due(self) -> Optional[float]:
+        """
+        Seconds until the next retry is due, None if there is none
+        """
+        return max(0.0, self._heap[0][0] - self._now()) if self._heap else None
+
+    def close(self):
+        """
+        Cancel the timer and forget the waiting requests
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._heap = []
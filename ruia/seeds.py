@@ -0,0 +1,83 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Read start urls lazily from plain text, gzipped text and CSV files
+    Changelog: all notable changes to this file will be documented
+"""
+
+import csv
+import gzip
+import io
+
+from typing import Iterator, Union
+
+
+def open_text(path: str, encoding: str = "utf-8", newline: str = None):
+    """
+    Open a text file for reading, a file ending with .gz is decompressed on the fly
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, mode="rt", encoding=encoding, newline=newline)
+    return io.open(path, mode="r", encoding=encoding, newline=newline)
+
+
+class TextSeeds:
+    """
+    Urls of a text file, one per line, blank lines and lines starting with # are skipped.
+    The file is read lazily each time it is iterated, eg: start_urls = TextSeeds('urls.txt.gz')
+    """
+
+    def __init__(self, path: str, encoding: str = "utf-8"):
+        """
+        :param path: a text file, or a gzipped one if it ends with .gz
+        :param encoding: encoding of the file
+        """
+        self.path = path
+        self.encoding = encoding
+
+    def __iter__(self) -> Iterator[str]:
+        with open_text(self.path, encoding=self.encoding) as f:
+            for line in f:
+                url = line.strip()
+                if url and not url.startswith("#"):
+                    yield url
+
+
+class CsvSeeds:
+    """
+    Urls of a column of a CSV file, read lazily each time it is iterated,
+    eg: start_urls = CsvSeeds('sites.csv', column='url')
+    """
+
+    def __init__(
+        self,
+        path: str,
+        column: Union[int, str] = 0,
+        encoding: str = "utf-8",
+        **csv_kwargs,
+    ):
+        """
+        :param path: a CSV file, or a gzipped one if it ends with .gz
+        :param column: index of the column, or its name in the header row
+        :param encoding: encoding of the file
+        :param csv_kwargs: passed to csv.reader, eg: delimiter
+        """
+        self.path = path
+        self.column = column
+        self.encoding = encoding
+        self.csv_kwargs = csv_kwargs
+
+    def __iter__(self) -> Iterator[str]:
+        with open_text(self.path, encoding=self.encoding, newline="") as f:
+            reader = csv.reader(f, **self.csv_kwargs)
+            column = self.column
+            if isinstance(column, str):
+                header = next(reader, [])
+                try:
+                    column = header.index(column)
+                except ValueError:
+                    raise ValueError(
+                        f"<CsvSeeds: no column {self.column} in {self.path}>"
+                    )
+            for row in reader:
+                if len(row) > column and row[column].strip():
+                    yield row[column].strip()
@@ -0,0 +1,197 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Run a spider in several processes, each one crawls a shard of the urls
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import bisect
+import hashlib
+import multiprocessing
+import os
+import queue
+
+from urllib.parse import urlparse
+
+STATS_KEYS = ("success_counts", "failed_counts", "filtered_counts")
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode("utf-8")).digest()[:8], "big")
+
+
+class ConsistentHashRing:
+    """
+    Map keys to shards with a hash ring, each shard owns `replicas` virtual nodes
+    """
+
+    def __init__(self, shards: int, replicas: int = 100):
+        """
+        :param shards: number of shards
+        :param replicas: virtual nodes of each shard, more nodes spread the keys more evenly
+        """
+        nodes = sorted(
+            (_hash(f"{shard}-{replica}"), shard)
+            for shard in range(shards)
+            for replica in range(replicas)
+        )
+        self._hashes = [node_hash for node_hash, _ in nodes]
+        self._shards = [shard for _, shard in nodes]
+
+    def get_shard(self, key: str) -> int:
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._shards[index]
+
+
+class ShardContext:
+    """
+    What a shard process shares with the others: the inboxes of all shards
+    and a counter of the requests queued or forwarded, but not finished yet, in all shards
+    """
+
+    def __init__(
+        self,
+        index: int,
+        inboxes: list,
+        pending,
+        shard_by: str = "host",
+        poll_interval: float = 0.05,
+    ):
+        """
+        :param index: index of this shard
+        :param inboxes: a multiprocessing.Queue of serialized requests for each shard
+        :param pending: a multiprocessing.Value, crawling ends when it drops to 0
+        :param shard_by: host or fingerprint
+        :param poll_interval: seconds between two polls of the inbox
+        """
+        if shard_by not in ("host", "fingerprint"):
+            raise ValueError(
+                f"<Shard: invalid shard_by {shard_by}, expected host or fingerprint>"
+            )
+        self.index = index
+        self.inboxes = inboxes
+        self.pending = pending
+        self.shard_by = shard_by
+        self.poll_interval = poll_interval
+        self.ring = ConsistentHashRing(len(inboxes))
+
+    def get_shard(self, request) -> int:
+        """
+        Return the index of the shard which crawls the request
+        """
+        if self.shard_by == "host":
+            key = urlparse(request.url).hostname or ""
+        else:
+            key = request.fingerprint
+        return self.ring.get_shard(key)
+
+    def add_pending(self, n: int):
+        with self.pending.get_lock():
+            self.pending.value += n
+
+    def forward(self, shard: int, data: bytes):
+        """
+        Send a serialized request to another shard
+        """
+        self.add_pending(1)
+        self.inboxes[shard].put(data)
+
+    def receive(self, max_counts: int = 1000) -> list:
+        """
+        Return the serialized requests sent to this shard without waiting
+        """
+        inbox = self.inboxes[self.index]
+        received = []
+        while len(received) < max_counts:
+            try:
+                received.append(inbox.get_nowait())
+            except queue.Empty:
+                break
+        return received
+
+    async def wait_finished(self):
+        """
+        Wait until no shard has any request left
+        """
+        while self.pending.value > 0:
+            await asyncio.sleep(self.poll_interval)
+
+
+def _run_shard(spider_cls, context: ShardContext, results, start_kwargs: dict):
+    try:
+        spider_ins = spider_cls.start(shard=context, **start_kwargs)
+        stats = {key: getattr(spider_ins, key) for key in STATS_KEYS}
+    except BaseException as e:
+        results.put((context.index, None, repr(e)))
+        raise
+    results.put((context.index, stats, None))
+
+
+def run_sharded(
+    spider_cls,
+    processes: int = None,
+    shard_by: str = "host",
+    start_method: str = None,
+    **start_kwargs,
+) -> dict:
+    """
+    Start `processes` processes, each one runs `spider_cls.start` with its own loop and session.
+    Every request is crawled by the shard its host or fingerprint maps to,
+    the others forward it there.
+    :param spider_cls: a subclass of Spider, it must be importable if the processes are spawned
+    :param processes: number of processes, defaults to the number of CPUs
+    :param shard_by: host, which keeps the per-host limits exact, or fingerprint
+    :param start_method: multiprocessing start method, defaults to the platform's default
+    :param start_kwargs: passed to `spider_cls.start`, `job_dir` gets a sub directory for each shard
+    :return: the merged statistics, with the statistics of each shard in `shards`
+    """
+    processes = processes or os.cpu_count() or 1
+    mp_context = multiprocessing.get_context(start_method)
+    inboxes = [mp_context.Queue() for _ in range(processes)]
+    # Each shard holds one until its start urls are queued, so nobody finishes too early
+    pending = mp_context.Value("q", processes)
+    results = mp_context.Queue()
+    job_dir = start_kwargs.pop("job_dir", None)
+
+    workers = []
+    for index in range(processes):
+        context = ShardContext(index, inboxes, pending, shard_by=shard_by)
+        kwargs = dict(start_kwargs)
+        if job_dir:
+            kwargs["job_dir"] = os.path.join(job_dir, f"shard-{index}")
+        worker = mp_context.Process(
+            target=_run_shard,
+            args=(spider_cls, context, results, kwargs),
+            name=f"{spider_cls.name}-shard-{index}",
+        )
+        worker.start()
+        workers.append(worker)
+
+    shard_stats = [None] * processes
+    try:
+        received = 0
+        while received < processes:
+            try:
+                index, stats, error = results.get(timeout=0.5)
+            except queue.Empty:
+                crashed = [w for w in workers if w.exitcode not in (None, 0)]
+                if crashed:
+                    raise RuntimeError(
+                        f"<Shard: {crashed[0].name} exited with code {crashed[0].exitcode}>"
+                    )
+                continue
+            if error is not None:
+                raise RuntimeError(f"<Shard: shard {index} failed, {error}>")
+            shard_stats[index] = stats
+            received += 1
+    except BaseException:
+        for worker in workers:
+            worker.terminate()
+        raise
+    finally:
+        for worker in workers:
+            worker.join()
+
+    merged = {key: sum(stats[key] for stats in shard_stats) for key in STATS_KEYS}
+    merged["shards"] = shard_stats
+    return merged
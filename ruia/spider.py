@@ -5,6 +5,9 @@
 """
 
 import asyncio
+import contextvars
+import json
+import os
 import sys
 import typing
 
@@ -16,20 +19,45 @@ except ImportError:
 
 from datetime import datetime
 from functools import reduce
-from inspect import isawaitable
+from inspect import isawaitable, signature
 from signal import SIGINT, SIGTERM
 from types import AsyncGeneratorType
+from urllib.parse import urlparse
 
-from aiohttp import ClientSession
+from aiohttp import ClientSession, TCPConnector
 
-from ruia.exceptions import NothingMatchedError, NotImplementedParseError
+from ruia.adaptive import AdaptiveSemaphore, ConcurrencyController
+from ruia.broker import RemoteFrontier
+from ruia.checkpoint import load_checkpoint, save_checkpoint
+from ruia.dupefilter import get_dupefilter
+from ruia.exceptions import NothingMatchedError, NotImplementedParseError, RetryLater
+from ruia.frontier import CallbackItem, get_frontier
+from ruia.httpcache import HttpCache
 from ruia.item import Item
+from ruia.loopmonitor import (
+    LoopMonitor,
+    reset_loop_monitor,
+    set_current_url,
+    set_loop_monitor,
+)
+from ruia.metrics import CrawlMetrics
 from ruia.middleware import Middleware
-from ruia.request import Request
+from ruia.profiling import Profiler, instrument, reset_profiler, set_profiler
+from ruia.ratelimit import RateLimiter
+from ruia.request import Request, is_config_code
+from ruia.resolver import DNS_CACHE_FILE, CachingResolver
+from ruia.retry import RetryBudget, RetryScheduler
 from ruia.response import Response
+from ruia.sharding import run_sharded
 from ruia.spider_hook import SpiderHook
+from ruia.status import StatusServer
+from ruia.throttle import HostLimiter
+from ruia.timings import timing_trace_config
 from ruia.utils import get_logger
 
+# Whether the running worker task holds a slot of `worker_sem`, see `_wait_for_frontier_space`
+_worker_slot = contextvars.ContextVar("worker_slot", default=None)
+
 if sys.version_info >= (3, 8) and sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
 
@@ -63,16 +91,117 @@ class Spider(SpiderHook):
     # Some fields for statistics
     failed_counts: int = 0
     success_counts: int = 0
+    filtered_counts: int = 0
+
+    # Record latency histograms and counters in `self.metrics`, the frontier size is sampled every metrics_interval
+    metrics_enabled: bool = True
+    metrics_interval: float = 1
+    # Time callbacks, field extractions and clean methods, the top `profile_top` are logged at the end
+    profile: bool = False
+    profile_top: int = 20
+
+    # Sample the event loop lag every loop_lag_interval seconds and report the callbacks, middleware
+    # and clean methods holding the loop for slow_step_threshold seconds or more
+    loop_monitor_enabled: bool = True
+    loop_lag_interval: float = 0.1
+    slow_step_threshold: float = 0.1
+
+    # Serve /metrics(OpenMetrics) and /status(JSON) on this port while crawling, 0 picks a free one
+    status_port: int = None
+    status_host: str = "127.0.0.1"
+
+    # Put failed requests back into the frontier once their retry is due, see ruia.retry,
+    # instead of retrying them in place, so that a waiting retry holds no concurrency slot
+    scheduled_retries: bool = True
+    # Retries of a host allowed beyond the RETRY_BUDGET share of its requests, see RetryBudget
+    retry_budget_min: int = 10
 
     # Concurrency control
     worker_numbers: int = 2
     concurrency: int = 3
 
-    # Spider entry
-    start_urls: list = []
+    # Resize `concurrency`, and `host_concurrency` if set, from the latency and the error rate of responses
+    adaptive_concurrency: bool = False
+    # Passed to AIMDController, eg: min_limit, max_limit, window
+    adaptive_concurrency_kwargs: dict = None
+
+    # Per-host politeness, 0 means no limit
+    host_concurrency: int = 0
+    host_delay: float = 0
+    # Apply the per-host limits to the resolved IP instead of the host name
+    host_limit_by_ip: bool = False
+
+    # Token bucket rate limits per second, 0 means no limit
+    rate_limit: float = 0
+    rate_limit_bytes: float = 0
+    host_rate_limit: float = 0
+    host_rate_limit_bytes: float = 0
+    # Seconds of tokens a bucket can save up for a burst
+    rate_limit_burst: float = 1
+
+    # Connection pool of the spider's session, shared by all its requests.
+    # connector_limit defaults to the largest concurrency, at least 100, 0 means no limit
+    connector_limit: int = None
+    connector_limit_per_host: int = 0
+    # Seconds an idle connection is kept alive
+    connector_keepalive_timeout: float = 15
+    # Seconds the resolved addresses of a host are cached, None caches them forever
+    connector_dns_cache_ttl: typing.Optional[int] = 10
+    # Close every connection after its response, no keep-alive
+    connector_force_close: bool = False
+    # Happy eyeballs(RFC 8305) delay in seconds, None keeps the default of aiohttp, needs aiohttp>=3.10
+    connector_happy_eyeballs_delay: typing.Optional[float] = None
+    # Other keyword arguments of aiohttp.TCPConnector
+    connector_kwargs: dict = None
 
-    # A queue to save coroutines
-    worker_tasks: list = []
+    # Resolve hosts with a CachingResolver instead of a thread for each lookup, see ruia.resolver.
+    # Answers are cached for their TTL, failures for a while, and at most dns_concurrency lookups run at once
+    dns_resolver: bool = False
+    dns_concurrency: int = 50
+    # Resolve the host of each queued request before a worker takes it
+    dns_prefetch: bool = True
+    # Keep the cache across runs in this JSON file, defaults to dns_cache.json of job_dir
+    dns_cache_path: str = None
+    # Other keyword arguments of CachingResolver, eg: nameservers, negative_ttl, min_ttl, max_ttl
+    dns_kwargs: dict = None
+
+    # Cache the responses in this SQLite file and replay them, see ruia.httpcache
+    http_cache_path: str = None
+    # always, rfc or ignore_cache_control
+    http_cache_policy: str = "rfc"
+    # Seconds a response is kept, 0 keeps it until it is evicted
+    http_cache_expiration: float = 0
+    # Max bytes of the cached bodies, the least recently used responses are evicted, 0 means no limit
+    http_cache_max_size: int = 0
+
+    # Defaults of MAX_BODY_SIZE and ALLOWED_CONTENT_TYPES of request_config, see ruia.bodylimit.
+    # A response over max_body_size bytes is dropped while its body streams in, 0 means no limit
+    max_body_size: int = 0
+    # Media types of the responses kept, eg: ["text/html", "text/*"], None keeps them all
+    allowed_content_types: typing.Optional[list] = None
+
+    # Frontier policy: fifo, lifo(depth-first) or priority
+    frontier_policy: str = "priority"
+    # High-water mark of the frontier, callbacks wait while it is full, 0 means no limit
+    frontier_maxsize: int = 0
+    # Spill the frontier to this SQLite file, only `frontier_memory_size` requests stay in memory
+    frontier_path: str = None
+    frontier_memory_size: int = 10000
+    # Share the frontier and the duplicate filter of a FrontierBroker at host:port
+    frontier_broker: str = None
+
+    # Duplicate filter: None, set(exact) or bloom(memory-bounded)
+    dupefilter: str = None
+    dupefilter_kwargs: dict = None
+
+    # Save the crawl state to this directory every `checkpoint_interval` seconds and resume from it
+    job_dir: str = None
+    checkpoint_interval: float = 60
+
+    # Spider entry, an iterable or an async iterable of urls, see ruia.seeds for reading them from files
+    start_urls: list = []
+    # Max number of start requests waiting in the frontier
+    start_urls_lookahead: int = 1000
 
     def __init__(
         self,
@@ -80,6 +209,8 @@ class Spider(SpiderHook):
         loop=None,
         is_async_start: bool = False,
         cancel_tasks: bool = True,
+        job_dir: str = None,
+        shard=None,
         **spider_kwargs,
     ):
         """
@@ -87,10 +218,12 @@ class Spider(SpiderHook):
         :param middleware: a list of or a single Middleware
         :param loop: asyncio event llo
         :param is_async_start: start spider by using async
+        :param job_dir: save checkpoints to this directory and resume from them
+        :param shard: ShardContext of this process, set by `start_sharded`
         :param spider_kwargs
         """
         if not self.start_urls or not isinstance(
-            self.start_urls, collectionsAbc.Iterable
+            self.start_urls, (collectionsAbc.Iterable, collectionsAbc.AsyncIterable)
         ):
             raise ValueError(
                 "Ruia spider must have a param named start_urls, eg: start_urls = ['https://www.github.com']"
@@ -107,28 +240,201 @@ class Spider(SpiderHook):
         self.aiohttp_kwargs = self.aiohttp_kwargs or {}
         self.spider_kwargs = spider_kwargs
         self.request_config = self.request_config or {}
+        if (
+            self.rate_limit
+            or self.rate_limit_bytes
+            or self.host_rate_limit
+            or self.host_rate_limit_bytes
+        ):
+            self.rate_limiter = RateLimiter(
+                requests_per_second=self.rate_limit,
+                bytes_per_second=self.rate_limit_bytes,
+                host_requests_per_second=self.host_rate_limit,
+                host_bytes_per_second=self.host_rate_limit_bytes,
+                burst=self.rate_limit_burst,
+                on_ready=self._requeue_parked_request,
+            )
+        else:
+            self.rate_limiter = None
+        self.metrics = CrawlMetrics() if self.metrics_enabled else None
+        if self.dns_resolver:
+            self.resolver = CachingResolver(
+                max_concurrency=self.dns_concurrency,
+                metrics=self.metrics,
+                **(self.dns_kwargs or {}),
+            )
+        else:
+            self.resolver = None
+        if self.http_cache_path:
+            self.http_cache = HttpCache(
+                self.http_cache_path,
+                policy=self.http_cache_policy,
+                expiration=self.http_cache_expiration,
+                max_size=self.http_cache_max_size,
+                metrics=self.metrics,
+            )
+        else:
+            self.http_cache = None
+        # set logger
+        self.logger = get_logger(name=self.name)
         try:
             self.request_session = getattr(self, "request_session")
         except Exception as _:
-            self.request_session = ClientSession()
+            # Timings and received bytes are only recorded for the spider's own session
+            trace_configs = [timing_trace_config()]
+            if self.rate_limiter is not None:
+                trace_configs.append(self.rate_limiter.trace_config())
+            if self.metrics is not None:
+                trace_configs.append(self.metrics.trace_config())
+            self.request_session = ClientSession(
+                connector=self._make_connector(), trace_configs=trace_configs
+            )
 
         self.cancel_tasks = cancel_tasks
         self.is_async_start = is_async_start
 
-        # set logger
-        self.logger = get_logger(name=self.name)
-
         # customize middleware
         if isinstance(middleware, list):
             self.middleware = reduce(lambda x, y: x + y, middleware)
         else:
             self.middleware = middleware or Middleware()
 
-        # async queue as a producer
-        self.request_queue = asyncio.Queue()
+        # async queue as a producer, it holds requests and callback items
+        if self.frontier_broker:
+            self.request_queue = RemoteFrontier(
+                self.frontier_broker,
+                serialize=self.serialize_request,
+                deserialize=self.deserialize_request,
+                on_filtered=self._add_filtered_counts,
+            )
+        elif self.frontier_path:
+            self.request_queue = get_frontier(
+                self.frontier_policy,
+                path=self.frontier_path,
+                serialize=self.serialize_request,
+                deserialize=self.deserialize_request,
+                memory_size=self.frontier_memory_size,
+            )
+        else:
+            self.request_queue = get_frontier(self.frontier_policy)
+        # set while the frontier is below `frontier_maxsize`
+        self.frontier_space = asyncio.Event()
+        self.frontier_space.set()
 
-        # semaphore, used for concurrency control
-        self.sem = asyncio.Semaphore(self.concurrency)
+        # seen-set of request fingerprints
+        if self.dupefilter is not None:
+            self.request_dupefilter = get_dupefilter(
+                self.dupefilter, **(self.dupefilter_kwargs or {})
+            )
+        else:
+            self.request_dupefilter = None
+
+        # semaphore, used for concurrency control,
+        # and the bound of queued items in flight, shared by all workers
+        if self.adaptive_concurrency:
+            self.sem = AdaptiveSemaphore(self.concurrency)
+            self.worker_sem = AdaptiveSemaphore(self.concurrency)
+        else:
+            self.sem = asyncio.Semaphore(self.concurrency)
+            self.worker_sem = asyncio.Semaphore(self.concurrency)
+        self.workers = []
+        self.inflight_tasks = set()
+        # queued items taken by the workers and not finished yet
+        self.inflight_requests = set()
+        self.master_task = None
+        # checkpoint and shard inbox loops
+        self.background_tasks = []
+        self.stopping = False
+        self.shard = shard
+        self.status_server = None
+        self.retry_scheduler = (
+            RetryScheduler(on_ready=self._requeue_parked_request)
+            if self.scheduled_retries
+            else None
+        )
+        # Enforces the RETRY_BUDGET of request_config for each host
+        self.retry_budget = RetryBudget(min_retries=self.retry_budget_min)
+        self.profiler = Profiler() if self.profile else None
+        if self.loop_monitor_enabled:
+            self.loop_monitor = LoopMonitor(
+                interval=self.loop_lag_interval,
+                threshold=self.slow_step_threshold,
+                metrics=self.metrics,
+            )
+        else:
+            self.loop_monitor = None
+        if self.host_concurrency > 0 or self.host_delay > 0:
+            self.host_limiter = HostLimiter(
+                concurrency=self.host_concurrency,
+                delay=self.host_delay,
+                by_ip=self.host_limit_by_ip,
+                on_ready=self._requeue_parked_request,
+            )
+        else:
+            self.host_limiter = None
+        if self.adaptive_concurrency:
+            self.concurrency_controller = ConcurrencyController(
+                [self.sem, self.worker_sem],
+                self.concurrency,
+                host_limiter=self.host_limiter if self.host_concurrency > 0 else None,
+                **(self.adaptive_concurrency_kwargs or {}),
+            )
+        else:
+            self.concurrency_controller = None
+
+        # Resume the statistics and the seen fingerprints, the requests are queued by start_master
+        self.job_dir = job_dir or self.job_dir
+        self.start_urls_consumed = 0
+        self.start_urls_finished = True
+        self.resume_state = load_checkpoint(self.job_dir) if self.job_dir else None
+        if self.resume_state is not None:
+            for key, value in self.resume_state["stats"].items():
+                setattr(self, key, value)
+            if self.request_dupefilter is not None:
+                self.request_dupefilter = (
+                    self.resume_state["dupefilter"] or self.request_dupefilter
+                )
+
+    def _make_connector(self) -> TCPConnector:
+        """
+        Build the connection pool of the spider's session from the connector_* attributes
+        """
+        limit = self.connector_limit
+        if limit is None:
+            max_concurrency = self.concurrency
+            if self.adaptive_concurrency:
+                max_concurrency = max(
+                    max_concurrency,
+                    (self.adaptive_concurrency_kwargs or {}).get("max_limit", 64),
+                )
+            limit = max(100, max_concurrency)
+        kwargs = dict(
+            limit=limit,
+            limit_per_host=self.connector_limit_per_host,
+            ttl_dns_cache=self.connector_dns_cache_ttl,
+            force_close=self.connector_force_close,
+        )
+        if not self.connector_force_close:
+            # aiohttp refuses a keep-alive timeout along with force_close
+            kwargs["keepalive_timeout"] = self.connector_keepalive_timeout
+        if self.connector_happy_eyeballs_delay is not None:
+            if "happy_eyeballs_delay" in signature(TCPConnector).parameters:
+                kwargs["happy_eyeballs_delay"] = self.connector_happy_eyeballs_delay
+            else:
+                self.logger.warning(
+                    "connector_happy_eyeballs_delay needs aiohttp>=3.10, it is ignored"
+                )
+        if self.resolver is not None:
+            # Its own cache follows the TTL of each answer
+            kwargs["resolver"] = self.resolver
+            kwargs["use_dns_cache"] = False
+        kwargs.update(self.connector_kwargs or {})
+        return TCPConnector(**kwargs)
+
+    def _get_dns_cache_path(self) -> typing.Optional[str]:
+        if self.dns_cache_path:
+            return self.dns_cache_path
+        return os.path.join(self.job_dir, DNS_CACHE_FILE) if self.job_dir else None
 
     async def _process_async_callback(
         self, callback_result: AsyncGeneratorType, response: Response = None
@@ -138,17 +444,16 @@ class Spider(SpiderHook):
                 if isinstance(each_callback, AsyncGeneratorType):
                     await self._process_async_callback(each_callback)
                 elif isinstance(each_callback, Request):
-                    self.request_queue.put_nowait(
-                        self.handle_request(request=each_callback)
-                    )
+                    await self._enqueue_request(each_callback)
                 elif isinstance(each_callback, typing.Coroutine):
-                    self.request_queue.put_nowait(
-                        self.handle_callback(
-                            aws_callback=each_callback, response=response
-                        )
+                    await self._wait_for_frontier_space()
+                    self._put_request_item(
+                        CallbackItem(aws_callback=each_callback, response=response)
                     )
                 elif isinstance(each_callback, Item):
                     # Process target item
+                    if self.metrics is not None:
+                        self.metrics.observe_item(each_callback)
                     await self.process_item(each_callback)
                 else:
                     await self.process_callback_result(each_callback)
@@ -164,6 +469,8 @@ class Spider(SpiderHook):
             count whether each request was successful or not, and call the handler function finally.
         """
         if response:
+            if self.metrics is not None:
+                self.metrics.observe_finished(response.ok)
             if response.ok:
                 # Process succeed response
                 self.success_counts += 1
@@ -180,7 +487,9 @@ class Spider(SpiderHook):
                     try:
                         aws_middleware_func = middleware(self, request)
                         if isawaitable(aws_middleware_func):
-                            await aws_middleware_func
+                            await instrument(
+                                aws_middleware_func, "middleware", middleware.__name__
+                            )
                         else:
                             msg = f"<Middleware {middleware.__name__}: must be a coroutine function"
                             self.logger.error(msg)
@@ -195,7 +504,9 @@ class Spider(SpiderHook):
                     try:
                         aws_middleware_func = middleware(self, request, response)
                         if isawaitable(aws_middleware_func):
-                            await aws_middleware_func
+                            await instrument(
+                                aws_middleware_func, "middleware", middleware.__name__
+                            )
                         else:
                             msg = f"<Middleware {middleware.__name__}: must be a coroutine function"
                             self.logger.error(msg)
@@ -224,17 +535,57 @@ class Spider(SpiderHook):
                     f"{self.name} tried to use loop.add_signal_handler "
                     "but it is not implemented on this platform."
                 )
+        if self.status_port is not None:
+            self.status_server = StatusServer(
+                self, host=self.status_host, port=self.status_port
+            )
+            address = await self.status_server.start()
+            self.logger.info(f"Status server listening on http://{address}")
+        dns_cache_path = self._get_dns_cache_path()
+        if self.resolver is not None and dns_cache_path:
+            loaded = self.resolver.load(dns_cache_path)
+            self.logger.info(f"Loaded {loaded} DNS cache entries from {dns_cache_path}")
+        # Inherited by the tasks of this spider, so Items find them too
+        profiler_token = set_profiler(self.profiler)
+        monitor_token = set_loop_monitor(self.loop_monitor)
+        if self.loop_monitor is not None:
+            self.loop_monitor.start()
         # Run hook before spider start crawling
         await self._run_spider_hook(after_start)
 
         # Actually run crawling
         try:
-            await self.start_master()
+            self.master_task = asyncio.ensure_future(self.start_master())
+            await self.master_task
+            if self.is_async_start and self.cancel_tasks:
+                # Run from the task awaiting the master, so that it is not cancelled itself
+                await self.cancel_all_tasks()
+        except asyncio.CancelledError:
+            # Stopped by a signal
+            if not self.stopping:
+                raise
         finally:
             # Run hook after spider finished crawling
             await self._run_spider_hook(before_stop)
+            if self.status_server is not None:
+                await self.status_server.close()
+            reset_profiler(profiler_token)
+            reset_loop_monitor(monitor_token)
+            if self.loop_monitor is not None:
+                await self.loop_monitor.stop()
+            if self.profiler is not None:
+                self.logger.info(self.profiler.report(self.profile_top))
             if self.request_session is not None:
                 await self.request_session.close()
+            if self.resolver is not None:
+                await self.resolver.close()
+                if dns_cache_path:
+                    self.resolver.save(dns_cache_path)
+            if self.http_cache is not None:
+                self.http_cache.close()
+            close_frontier = getattr(self.request_queue, "close", None)
+            if close_frontier is not None:
+                close_frontier()
             # Display logs about this crawl task
             end_time = datetime.now()
             self.logger.info(
@@ -243,6 +594,8 @@ class Spider(SpiderHook):
 
             if self.failed_counts:
                 self.logger.info(f"Failed requests: {self.failed_counts}")
+            if self.filtered_counts:
+                self.logger.info(f"Filtered requests: {self.filtered_counts}")
             self.logger.info(f"Time usage: {end_time - start_time}")
             self.logger.info("Spider finished!")
 
@@ -254,6 +607,7 @@ class Spider(SpiderHook):
         after_start=None,
         before_stop=None,
         cancel_tasks: bool = True,
+        job_dir: str = None,
         **spider_kwargs,
     ):
         """
@@ -263,6 +617,7 @@ class Spider(SpiderHook):
         :param after_start: hook
         :param before_stop: hook
         :param cancel_tasks: cancel async tasks
+        :param job_dir: save checkpoints to this directory and resume from them
         :param spider_kwargs: Additional keyword args to initialize spider
         :return: An instance of :cls:`Spider`
         """
@@ -272,6 +627,7 @@ class Spider(SpiderHook):
             loop=loop,
             is_async_start=True,
             cancel_tasks=cancel_tasks,
+            job_dir=job_dir,
             **spider_kwargs,
         )
         await spider_ins._start(after_start=after_start, before_stop=before_stop)
@@ -298,6 +654,7 @@ class Spider(SpiderHook):
         after_start=None,
         before_stop=None,
         close_event_loop=True,
+        job_dir: str = None,
         **spider_kwargs,
     ):
         """
@@ -307,22 +664,51 @@ class Spider(SpiderHook):
         :param middleware: customize middleware or a list of middleware
         :param loop: event loop
         :param close_event_loop: bool
+        :param job_dir: save checkpoints to this directory and resume from them
         :param spider_kwargs: Additional keyword args to initialize spider
         :return: An instance of :cls:`Spider`
         """
         loop = loop or asyncio.new_event_loop()
-        spider_ins = cls(middleware=middleware, loop=loop, **spider_kwargs)
+        spider_ins = cls(
+            middleware=middleware, loop=loop, job_dir=job_dir, **spider_kwargs
+        )
 
         # Actually start crawling
         spider_ins.loop.run_until_complete(
             spider_ins._start(after_start=after_start, before_stop=before_stop)
         )
+        # The loop is owned by this spider, cancel what is left before closing it
+        spider_ins.loop.run_until_complete(spider_ins.cancel_all_tasks())
         spider_ins.loop.run_until_complete(spider_ins.loop.shutdown_asyncgens())
         if close_event_loop:
             spider_ins.loop.close()
 
         return spider_ins
 
+    @classmethod
+    def start_sharded(
+        cls,
+        processes: int = None,
+        shard_by: str = "host",
+        start_method: str = None,
+        **start_kwargs,
+    ) -> dict:
+        """
+        Start the spider in several processes, each one crawls the requests of its shard
+        :param processes: number of processes, defaults to the number of CPUs
+        :param shard_by: host or fingerprint
+        :param start_method: multiprocessing start method
+        :param start_kwargs: passed to `start` in each process
+        :return: the merged statistics of all shards
+        """
+        return run_sharded(
+            cls,
+            processes=processes,
+            shard_by=shard_by,
+            start_method=start_method,
+            **start_kwargs,
+        )
+
     async def handle_callback(self, aws_callback: typing.Coroutine, response):
         """
         Process coroutine callback function
@@ -330,7 +716,9 @@ class Spider(SpiderHook):
         callback_result = None
 
         try:
-            callback_result = await aws_callback
+            callback_result = await instrument(
+                aws_callback, "callback", aws_callback.__qualname__
+            )
         except NothingMatchedError as e:
             self.logger.error(f"<Item: {str(e).lower()}>")
         except Exception as e:
@@ -351,11 +739,27 @@ class Spider(SpiderHook):
         """
         callback_result, response = None, None
 
+        if request.request_session is None:
+            request.request_session = self.request_session
         try:
             await self._run_request_middleware(request)
-            callback_result, response = await request.fetch_callback(self.sem)
+            if self.metrics is not None or self.concurrency_controller is not None:
+                request.fetch_observer = self._observe_fetch
+            if request.http_cache is None:
+                request.http_cache = self.http_cache
+            request.retry_budget = self.retry_budget
+            request.max_body_size = self.max_body_size
+            request.allowed_content_types = self.allowed_content_types
+            if self.host_limiter is None:
+                sem = self.sem
+            else:
+                sem = self.host_limiter.slot(request, self.sem)
+            callback_result, response = await request.fetch_callback(sem)
             await self._run_response_middleware(request, response)
             await self._process_response(request=request, response=response)
+        except RetryLater:
+            # Only raised if request.defer_retries is set, see _process_worker_task
+            raise
         except NotImplementedParseError as e:
             self.logger.error(e)
         except NothingMatchedError as e:
@@ -401,8 +805,12 @@ class Spider(SpiderHook):
         Process the start URLs
         :return: AN async iterator
         """
-        for url in self.start_urls:
-            yield self.request(url=url, callback=self.parse, metadata=self.metadata)
+        if isinstance(self.start_urls, collectionsAbc.AsyncIterable):
+            async for url in self.start_urls:
+                yield self.request(url=url, callback=self.parse, metadata=self.metadata)
+        else:
+            for url in self.start_urls:
+                yield self.request(url=url, callback=self.parse, metadata=self.metadata)
 
     def request(
         self,
@@ -415,6 +823,8 @@ class Spider(SpiderHook):
         metadata: dict = None,
         request_config: dict = None,
         request_session=None,
+        priority: int = 0,
+        dont_filter: bool = False,
         **aiohttp_kwargs,
     ):
         """
@@ -428,6 +838,8 @@ class Spider(SpiderHook):
             metadata (dict, optional): _description_. Send the data to callback func to None.
             request_config (dict, optional): Manage the target request. Defaults to None.
             request_session (_type_, optional):  aiohttp.ClientSession. Defaults to None.
+            priority (int, optional): A higher priority is crawled first. Defaults to 0.
+            dont_filter (bool, optional): Skip the duplicate filter. Defaults to False.
 
         Returns:
             _type_: Request
@@ -456,61 +868,417 @@ class Spider(SpiderHook):
             request_config=request_config,
             request_session=request_session,
             close_request_session=close_request_session,
+            priority=priority,
+            dont_filter=dont_filter,
             **aiohttp_kwargs,
         )
 
+    def serialize_request(self, request) -> typing.Optional[bytes]:
+        """
+        Return the compact JSON form of a request,
+        or None if its callback is not a method of this spider or it can not be serialized
+        :param request: Request or CallbackItem
+        :return: bytes
+        """
+        if not isinstance(request, Request):
+            return None
+        callback = request.callback
+        if callback is not None and getattr(callback, "__self__", None) is not self:
+            return None
+        if request.request_session is not self.request_session:
+            return None
+        try:
+            return json.dumps(request.to_dict(), separators=(",", ":")).encode("utf-8")
+        except (TypeError, ValueError):
+            return None
+
+    def deserialize_request(self, data: bytes) -> Request:
+        """
+        Rebuild a request from `serialize_request`, the callback is looked up by its name
+        :param data: bytes
+        :return: Request
+        """
+        request_dict = json.loads(data)
+        callback_name = request_dict["callback"]
+        callback = getattr(self, callback_name) if callback_name else None
+        for key, value in self.request_config.items():
+            if is_config_code(value):
+                request_dict["request_config"].setdefault(key, value)
+        return Request.from_dict(
+            request_dict, callback=callback, request_session=self.request_session
+        )
+
+    async def _enqueue_request(self, request: Request, high_water: int = 0) -> bool:
+        """
+        Put a request into the frontier unless the duplicate filter has seen it,
+        a request of another shard is forwarded to it.
+        Wait while the frontier is full
+        :param request: Request
+        :param high_water: wait while the frontier holds this many items, besides `frontier_maxsize`
+        :return: whether the request was queued
+        """
+        if request.request_session is None:
+            # Requests built without Spider.request share the pool too
+            request.request_session = self.request_session
+        if self.shard is not None:
+            shard = self.shard.get_shard(request)
+            if shard != self.shard.index:
+                data = self.serialize_request(request)
+                if data is not None:
+                    self.shard.forward(shard, data)
+                    return True
+                # Crawled here if it can not be forwarded
+        if self.request_dupefilter is not None and not request.dont_filter:
+            try:
+                seen = self.request_dupefilter.request_seen(request)
+            except ValueError as e:
+                # eg: a malformed port, only this request is dropped
+                self.logger.error(f"<DupeFilter: invalid url {request.url}, {e}>")
+                return False
+            if seen:
+                self.filtered_counts += 1
+                return False
+        await self._wait_for_frontier_space(high_water)
+        if self.frontier_broker:
+            # Checked again by the shared duplicate filter of the broker
+            self.request_queue.put_request(request)
+        else:
+            self._put_request_item(request)
+        if self.resolver is not None and self.dns_prefetch:
+            self.resolver.prefetch(
+                urlparse(request.url).hostname,
+                family=(self.connector_kwargs or {}).get("family", 0),
+            )
+        return True
+
+    def _add_filtered_counts(self, counts: int):
+        self.filtered_counts += counts
+
+    async def _wait_for_frontier_space(self, high_water: int = 0):
+        """
+        Wait until the frontier is below `frontier_maxsize`, the async generator of the callback keeps its place.
+        A worker task lends its worker slot meanwhile, so that workers keep draining the frontier
+        :param high_water: wait while the frontier holds this many items too
+        """
+        if self.frontier_maxsize and high_water:
+            high_water = min(high_water, self.frontier_maxsize)
+        else:
+            high_water = high_water or self.frontier_maxsize
+        if not high_water:
+            return
+        slot = _worker_slot.get()
+        while True:
+            if self.request_queue.qsize() < high_water:
+                if slot is None or slot["held"]:
+                    return
+                # Not released by the worker task if cancelled meanwhile,
+                # check the frontier again once the slot is back
+                await self.worker_sem.acquire()
+                slot["held"] = True
+                continue
+            if slot is not None and slot["held"]:
+                self.worker_sem.release()
+                slot["held"] = False
+            self.frontier_space.clear()
+            await self.frontier_space.wait()
+
+    def _put_request_item(self, request_item: typing.Union[Request, CallbackItem]):
+        self.request_queue.put_nowait(request_item)
+        if self.shard is not None:
+            self.shard.add_pending(1)
+
+    def _request_item_done(self):
+        self.request_queue.task_done()
+        if self.shard is not None:
+            self.shard.add_pending(-1)
+
     async def start_master(self):
         """
-        Actually start crawling
+        Actually start crawling, the workers start at once and the start urls are queued lazily
         """
-        async for request_ins in self.process_start_urls():
-            self.request_queue.put_nowait(self.handle_request(request_ins))
-        workers = [
+        skipped_start_urls = 0
+        if self.resume_state is not None:
+            # Already seen by the duplicate filter
+            for data in self.resume_state["requests"]:
+                self._put_request_item(self.deserialize_request(data))
+            self.logger.info(
+                f"Resumed {len(self.resume_state['requests'])} requests from {self.job_dir}"
+            )
+            start_urls_state = self.resume_state.get("start_urls")
+            if start_urls_state is not None and not start_urls_state["finished"]:
+                skipped_start_urls = start_urls_state["consumed"]
+                self.start_urls_finished = False
+            self.resume_state = None
+        else:
+            self.start_urls_finished = False
+        if self.job_dir:
+            self.background_tasks.append(asyncio.ensure_future(self._checkpoint_loop()))
+        if self.metrics is not None:
+            self.background_tasks.append(asyncio.ensure_future(self._sample_metrics()))
+        if self.shard is not None:
+            self.background_tasks.append(
+                asyncio.ensure_future(self._receive_shard_requests())
+            )
+        self.workers = [
             asyncio.ensure_future(self.start_worker())
             for i in range(self.worker_numbers)
         ]
-        for worker in workers:
+        for worker in self.workers:
             self.logger.info(f"Worker started: {id(worker)}")
-        await self.request_queue.join()
+        try:
+            if not self.start_urls_finished:
+                await self._queue_start_urls(skipped_start_urls)
+            if self.shard is None:
+                await self.request_queue.join()
+            else:
+                # Give back the one held while queueing the start urls
+                self.shard.add_pending(-1)
+                await self.shard.wait_finished()
+            if self.job_dir:
+                self.checkpoint()
+        finally:
+            await self._cancel_worker_tasks()
 
-        if not self.is_async_start:
-            await self.stop(SIGINT)
-        else:
-            if self.cancel_tasks:
-                await self.cancel_all_tasks()
+    async def _queue_start_urls(self, skipped: int = 0):
+        """
+        Queue the requests of `process_start_urls` while the workers crawl,
+        at most `start_urls_lookahead` requests are waiting in the frontier
+        :param skipped: number of start requests queued before the checkpoint resumed from
+        """
+        index = 0
+        async for request_ins in self.process_start_urls():
+            index += 1
+            if index <= skipped:
+                self.start_urls_consumed = index
+                continue
+            # Every shard runs process_start_urls and keeps its own urls
+            if (
+                self.shard is None
+                or self.shard.get_shard(request_ins) == self.shard.index
+            ):
+                await self._enqueue_request(
+                    request_ins, high_water=self.start_urls_lookahead
+                )
+            # Counted once queued, a checkpoint meanwhile keeps it to be queued again
+            self.start_urls_consumed = index
+        self.start_urls_finished = True
 
     async def start_worker(self):
         """
-        Start spider worker
+        Start spider worker, the workers share one bound of `concurrency` queued items in flight
+        and dispatch the next one as soon as any of them finishes
         :return:
         """
         while True:
-            request_item = await self.request_queue.get()
-            self.worker_tasks.append(request_item)
-            if self.request_queue.empty():
-                results = await asyncio.gather(
-                    *self.worker_tasks, return_exceptions=True
+            await self.worker_sem.acquire()
+            try:
+                request_item = await self.request_queue.get()
+            except BaseException:
+                self.worker_sem.release()
+                raise
+            self.inflight_requests.add(request_item)
+            if not self.frontier_space.is_set():
+                # The waiting producers check their own high-water marks
+                self.frontier_space.set()
+            task = asyncio.ensure_future(self._process_worker_task(request_item))
+            self.inflight_tasks.add(task)
+            task.add_done_callback(self.inflight_tasks.discard)
+
+    async def _process_worker_task(
+        self, request_item: typing.Union[Request, CallbackItem]
+    ):
+        """
+        Crawl a queued item and hand its callback result to `_process_async_callback` right away
+        :param request_item: a Request or a CallbackItem
+        :return:
+        """
+        parked = False
+        slot = {"held": True}
+        _worker_slot.set(slot)
+        if self.loop_monitor is not None:
+            # Names the slow steps of this task
+            if isinstance(request_item, Request):
+                set_current_url(request_item.url)
+            elif request_item.response is not None:
+                set_current_url(request_item.response.url)
+        try:
+            if isinstance(request_item, Request):
+                if self.rate_limiter is not None and not self.rate_limiter.try_acquire(
+                    request_item
+                ):
+                    # Deferred until it has its tokens
+                    parked = True
+                    return
+                if (
+                    self.host_limiter is not None
+                    and not await self.host_limiter.try_reserve(request_item)
+                ):
+                    # Never wait for a busy host while holding a worker slot
+                    await self.host_limiter.park(request_item)
+                    parked = True
+                    return
+                if self.rate_limiter is not None:
+                    self.rate_limiter.dispatched(request_item)
+                # The coroutine is only built once a worker takes the request
+                request_item.defer_retries = self.retry_scheduler is not None
+                try:
+                    callback_result, request, response = await self.handle_request(
+                        request_item
+                    )
+                except RetryLater as e:
+                    # Not done yet, put back into the frontier by the retry scheduler
+                    self.retry_scheduler.schedule(e.request, e.delay)
+                    parked = True
+                    return
+                finally:
+                    if self.host_limiter is not None:
+                        self.host_limiter.discard(request_item)
+            else:
+                request = None
+                callback_result, response = await self.handle_callback(
+                    aws_callback=request_item.aws_callback,
+                    response=request_item.response,
                 )
-                for task_result in results:
-                    if not isinstance(task_result, RuntimeError) and task_result:
-                        callback_result = task_result[0]
-                        request: Request = task_result[1]
-                        if isinstance(callback_result, AsyncGeneratorType):
-                            await self._process_async_callback(
-                                callback_result, task_result[2]
-                            )
-                        # Process Request's session
-                        await request.close_request()
+            if isinstance(callback_result, AsyncGeneratorType):
+                await self._process_async_callback(callback_result, response)
+            if request is not None:
+                # Recorded once the callback is done, it reads the body
+                if (
+                    self.metrics is not None
+                    and response is not None
+                    and response.timings is not None
+                ):
+                    self.metrics.observe_timings(request, response.timings)
+                # Process Request's session
+                await request.close_request()
+        except Exception as e:
+            self.logger.error(f"<Worker: {e}>")
+        finally:
+            self.inflight_requests.discard(request_item)
+            if slot["held"]:
+                self.worker_sem.release()
+            if not parked:
+                self._request_item_done()
 
-                self.worker_tasks = []
-            self.request_queue.task_done()
+    async def _cancel_worker_tasks(self):
+        """
+        Cancel the workers and their in-flight tasks, then wait for them
+        """
+        tasks = list(self.workers) + list(self.inflight_tasks)
+        tasks.extend(self.background_tasks)
+        self.background_tasks = []
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.workers = []
+        if self.host_limiter is not None:
+            self.host_limiter.close()
+        if self.rate_limiter is not None:
+            self.rate_limiter.close()
+        if self.retry_scheduler is not None:
+            self.retry_scheduler.close()
+
+    def checkpoint(self):
+        """
+        Save the pending requests, the duplicate filter and the statistics to `job_dir`.
+        The state is collected without awaiting, so it is consistent,
+        in-flight requests are saved as pending and crawled again after resuming.
+        """
+        items = list(self.inflight_requests)
+        if self.host_limiter is not None:
+            items.extend(self.host_limiter.parked_requests())
+        if self.rate_limiter is not None:
+            items.extend(self.rate_limiter.deferred_requests())
+        if self.retry_scheduler is not None:
+            items.extend(self.retry_scheduler.pending_requests())
+        items.extend(self.request_queue.items())
+        requests = []
+        for item in items:
+            data = self.serialize_request(item)
+            if data is not None:
+                requests.append(data)
+        state = {
+            "requests": requests,
+            "start_urls": {
+                "consumed": self.start_urls_consumed,
+                "finished": self.start_urls_finished,
+            },
+            "dupefilter": self.request_dupefilter,
+            "stats": {
+                "success_counts": self.success_counts,
+                "failed_counts": self.failed_counts,
+                "filtered_counts": self.filtered_counts,
+            },
+        }
+        save_checkpoint(self.job_dir, state)
+        if len(requests) < len(items):
+            self.logger.warning(
+                f"<Checkpoint: {len(items) - len(requests)} queued items can not be saved>"
+            )
+
+    async def _checkpoint_loop(self):
+        while True:
+            await asyncio.sleep(self.checkpoint_interval)
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self.logger.error(f"<Checkpoint: {e}>")
+
+    async def _receive_shard_requests(self):
+        """
+        Queue the requests forwarded by the other shards
+        """
+        while True:
+            received = self.shard.receive()
+            for data in received:
+                try:
+                    await self._enqueue_request(self.deserialize_request(data))
+                except Exception as e:
+                    self.logger.error(f"<Shard: invalid request, {e}>")
+                finally:
+                    self.shard.add_pending(-1)
+            if not received:
+                await asyncio.sleep(self.shard.poll_interval)
+
+    def _observe_fetch(self, request: Request, status, latency: float):
+        """
+        Report a fetch attempt to the metrics and the concurrency controller
+        """
+        if self.metrics is not None:
+            self.metrics.observe_fetch(request, status, latency)
+        if self.concurrency_controller is not None:
+            self.concurrency_controller.observe(request, status, latency)
+
+    async def _sample_metrics(self):
+        while True:
+            self.metrics.sample_queue(self.request_queue.qsize())
+            await asyncio.sleep(self.metrics_interval)
+
+    def _requeue_parked_request(self, request: Request):
+        """
+        Put a parked request back into the frontier once its host is free,
+        it was never marked as done, so the frontier is not finished meanwhile
+        """
+        self.request_queue.put_nowait(request)
+        self.request_queue.task_done()
 
     async def stop(self, _signal):
         """
-        Finish all running tasks, cancel remaining tasks.
+        Cancel the workers with their in-flight tasks, then stop crawling.
         :param _signal:
         :return:
         """
         self.logger.info(f"Stopping spider: {self.name}")
-        await self.cancel_all_tasks()
-        # self.loop.stop()
+        self.stopping = True
+        if self.job_dir:
+            # Before the in-flight requests are cancelled
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self.logger.error(f"<Checkpoint: {e}>")
+        await self._cancel_worker_tasks()
+        if (
+            self.master_task is not None
+            and self.master_task is not async_current_task()
+        ):
+            self.master_task.cancel()
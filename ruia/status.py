@@ -0,0 +1,133 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: A status server of a running spider, metrics in the OpenMetrics text format and a JSON status page
+    Changelog: all notable changes to this file will be documented
+"""
+
+import time
+
+from aiohttp import web
+
+from ruia.metrics import OPENMETRICS_CONTENT_TYPE
+
+# Max number of in-flight urls listed by the status page
+MAX_INFLIGHT_URLS = 100
+
+
+class StatusServer:
+    """
+    Serve `/metrics` and `/status` of a spider from its own loop.
+    Nothing is computed between two scrapes, so leaving it on costs nothing while crawling.
+    """
+
+    def __init__(self, spider_ins, host: str = "127.0.0.1", port: int = 0):
+        """
+        :param spider_ins: the running spider
+        :param host: host to listen on
+        :param port: port to listen on, 0 picks a free one
+        """
+        self.spider_ins = spider_ins
+        self.host = host
+        self.port = port
+        self.start_time = time.monotonic()
+        self.runner = None
+        # (time, requests of each host) of the previous status page, for the rates
+        self._last_hosts = (self.start_time, {})
+
+    async def start(self) -> str:
+        """
+        Start listening
+        :return: the address as host:port
+        """
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/status", self.handle_status)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, self.host, self.port)
+        await site.start()
+        self.port = self.runner.addresses[0][1]
+        return f"{self.host}:{self.port}"
+
+    async def close(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+    def _update_gauges(self):
+        metrics = self.spider_ins.metrics
+        metrics.queue_size.set(self.spider_ins.request_queue.qsize())
+        metrics.inflight.set(len(self.spider_ins.inflight_requests))
+
+    async def handle_metrics(self, request):
+        if self.spider_ins.metrics is None:
+            raise web.HTTPNotFound(text="Metrics are disabled, see metrics_enabled")
+        self._update_gauges()
+        return web.Response(
+            body=self.spider_ins.metrics.registry.to_openmetrics().encode("utf-8"),
+            headers={"Content-Type": OPENMETRICS_CONTENT_TYPE},
+        )
+
+    async def handle_status(self, request):
+        return web.json_response(self.get_status())
+
+    def _host_rates(self) -> dict:
+        """
+        Requests and requests per second of each host since the previous status page
+        """
+        now = time.monotonic()
+        requests = dict(self.spider_ins.metrics.requests.values)
+        last_time, last_requests = self._last_hosts
+        self._last_hosts = (now, requests)
+        elapsed = max(now - last_time, 1e-9)
+        return {
+            host: {
+                "requests": counts,
+                "rate": round((counts - last_requests.get((host,), 0)) / elapsed, 3),
+            }
+            for (host,), counts in requests.items()
+        }
+
+    def get_status(self) -> dict:
+        spider_ins = self.spider_ins
+        sem = spider_ins.worker_sem
+        # AdaptiveSemaphore or asyncio.Semaphore
+        limit = getattr(sem, "limit", spider_ins.concurrency)
+        inflight_urls = []
+        for request_item in spider_ins.inflight_requests:
+            url = getattr(request_item, "url", None)
+            if url is not None:
+                inflight_urls.append(url)
+                if len(inflight_urls) >= MAX_INFLIGHT_URLS:
+                    break
+        status = {
+            "name": spider_ins.name,
+            "uptime": round(time.monotonic() - self.start_time, 3),
+            "stopping": spider_ins.stopping,
+            "workers": {
+                "total": len(spider_ins.workers),
+                "running": sum(not worker.done() for worker in spider_ins.workers),
+                "concurrency": limit,
+            },
+            "inflight_requests": len(spider_ins.inflight_requests),
+            "inflight_urls": inflight_urls,
+            "frontier_size": spider_ins.request_queue.qsize(),
+            "start_urls_finished": spider_ins.start_urls_finished,
+            "success_counts": spider_ins.success_counts,
+            "failed_counts": spider_ins.failed_counts,
+            "filtered_counts": spider_ins.filtered_counts,
+        }
+        if spider_ins.host_limiter is not None:
+            status["parked_requests"] = spider_ins.host_limiter.parked_counts()
+        if spider_ins.rate_limiter is not None:
+            status["deferred_requests"] = len(
+                spider_ins.rate_limiter.deferred_requests()
+            )
+        if spider_ins.retry_scheduler is not None:
+            status["retrying_requests"] = len(spider_ins.retry_scheduler)
+        if spider_ins.loop_monitor is not None:
+            status["loop_lag"] = spider_ins.loop_monitor.quantiles()
+            status["slow_steps"] = list(spider_ins.loop_monitor.slow_steps)
+        if spider_ins.metrics is not None:
+            status["hosts"] = self._host_rates()
+        return status
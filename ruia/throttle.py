@@ -0,0 +1,273 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Per-host concurrency and politeness control
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+import socket
+import weakref
+
+from collections import OrderedDict, deque
+from urllib.parse import urlparse
+
+
+class _HostState:
+    """
+    Runtime state of a host or a resolved IP
+    """
+
+    __slots__ = ("active", "next_time", "waiters", "parked", "timer")
+
+    def __init__(self):
+        self.active = 0
+        self.next_time = 0.0
+        # futures of coroutines waiting in `acquire`
+        self.waiters = deque()
+        # requests handed back by the scheduler until the host is free
+        self.parked = deque()
+        self.timer = None
+
+
+class _HostSlot:
+    """
+    Async context manager which holds a host slot and then the global semaphore
+    """
+
+    def __init__(self, limiter, request, sem):
+        self.limiter = limiter
+        self.request = request
+        self.sem = sem
+        self.key = None
+
+    async def __aenter__(self):
+        self.key = self.limiter._reserved.pop(self.request, None)
+        if self.key is None:
+            self.key = await self.limiter.get_key(self.request.url)
+            await self.limiter.acquire(self.key)
+        try:
+            await self.sem.acquire()
+        except BaseException:
+            self.limiter.release(self.key)
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.sem.release()
+        self.limiter.release(self.key)
+
+
+class HostLimiter:
+    """
+    Limit the number of concurrent requests and the interval between requests for each host.
+    The scheduler never waits for a busy host: it parks the request here,
+    and `on_ready` puts it back into the frontier once the host is free.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 0,
+        delay: float = 0,
+        by_ip: bool = False,
+        on_ready=None,
+        max_cached_ips: int = 10000,
+    ):
+        """
+        :param concurrency: max concurrent requests per host, 0 means no limit
+        :param delay: min interval in seconds between two requests of the same host
+        :param by_ip: apply the limits to the resolved IP instead of the host name
+        :param on_ready: called with a parked request once its host is free
+        :param max_cached_ips: max number of resolved hosts kept by `by_ip`
+        """
+        self.concurrency = concurrency
+        self.delay = delay
+        self.by_ip = by_ip
+        self.on_ready = on_ready
+        self.max_cached_ips = max_cached_ips
+        self._states = {}
+        # limits of hosts set by `set_limit`, instead of `concurrency`
+        self._limits = {}
+        self._ips = OrderedDict()
+        self._reserved = weakref.WeakKeyDictionary()
+
+    async def get_key(self, url: str) -> str:
+        """
+        Return the host name, or its resolved IP if `by_ip` is set
+        """
+        host = urlparse(url).hostname or ""
+        if not self.by_ip or not host:
+            return host
+        ip = self._ips.get(host)
+        if ip is None:
+            try:
+                infos = await asyncio.get_event_loop().getaddrinfo(
+                    host, None, type=socket.SOCK_STREAM
+                )
+                ip = infos[0][4][0]
+            except (OSError, IndexError):
+                ip = host
+            self._ips[host] = ip
+            if len(self._ips) > self.max_cached_ips:
+                self._ips.popitem(last=False)
+        else:
+            self._ips.move_to_end(host)
+        return ip
+
+    def cached_key(self, url: str) -> str:
+        """
+        Return the key of a url without resolving it, the host name if its IP is not cached
+        """
+        host = urlparse(url).hostname or ""
+        return self._ips.get(host, host) if self.by_ip else host
+
+    def get_limit(self, key: str) -> int:
+        return self._limits.get(key, self.concurrency)
+
+    def set_limit(self, key: str, limit):
+        """
+        Change the max concurrent requests of a host, None goes back to `concurrency`
+        """
+        if limit is None:
+            self._limits.pop(key, None)
+        else:
+            self._limits[key] = limit
+        self._notify(key)
+
+    def _get_state(self, key: str) -> _HostState:
+        state = self._states.get(key)
+        if state is None:
+            state = self._states[key] = _HostState()
+        return state
+
+    def try_acquire(self, key: str) -> bool:
+        """
+        Take a slot of the host if it is free and its next allowed request time has come
+        """
+        state = self._get_state(key)
+        limit = self.get_limit(key)
+        if limit > 0 and state.active >= limit:
+            return False
+        now = asyncio.get_event_loop().time()
+        if state.next_time > now:
+            return False
+        state.active += 1
+        if self.delay > 0:
+            state.next_time = now + self.delay
+        return True
+
+    async def acquire(self, key: str):
+        """
+        Wait for a slot of the host
+        """
+        state = self._get_state(key)
+        while not self.try_acquire(key):
+            waiter = asyncio.get_event_loop().create_future()
+            state.waiters.append(waiter)
+            self._notify(key)
+            try:
+                await waiter
+            except BaseException:
+                if waiter in state.waiters:
+                    state.waiters.remove(waiter)
+                elif waiter.done() and not waiter.cancelled():
+                    # Hand the wake-up to the next one
+                    self._notify(key)
+                raise
+
+    def release(self, key: str):
+        """
+        Give the slot of the host back
+        """
+        state = self._states.get(key)
+        if state is not None:
+            state.active -= 1
+            self._notify(key)
+
+    async def try_reserve(self, request) -> bool:
+        """
+        Take a slot of the host on behalf of a request without waiting,
+        the slot is used by its next `slot` context or given back by `discard`
+        """
+        key = await self.get_key(request.url)
+        if not self.try_acquire(key):
+            return False
+        self._reserved[request] = key
+        return True
+
+    def discard(self, request):
+        """
+        Give the reserved slot of a request back if it was not used
+        """
+        key = self._reserved.pop(request, None)
+        if key is not None:
+            self.release(key)
+
+    async def park(self, request):
+        """
+        Keep a request of a busy host until the host is free
+        """
+        key = await self.get_key(request.url)
+        self._get_state(key).parked.append(request)
+        self._notify(key)
+
+    def _notify(self, key: str):
+        """
+        Wake one waiter or parked request if the host is free,
+        schedule a timer for its next allowed request time, or drop the state of an idle host
+        """
+        state = self._states.get(key)
+        if state is None:
+            return
+        limit = self.get_limit(key)
+        if limit > 0 and state.active >= limit:
+            # `release` notifies again
+            return
+        loop = asyncio.get_event_loop()
+        delay = state.next_time - loop.time()
+        if delay > 0:
+            if state.timer is None:
+                state.timer = loop.call_later(delay, self._on_timer, key)
+        elif state.waiters:
+            waiter = state.waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+        elif state.parked:
+            request = state.parked.popleft()
+            if self.on_ready is not None:
+                self.on_ready(request)
+        elif state.active == 0:
+            del self._states[key]
+
+    def _on_timer(self, key: str):
+        state = self._states.get(key)
+        if state is not None:
+            state.timer = None
+            self._notify(key)
+
+    def close(self):
+        """
+        Cancel the timers and forget all hosts
+        """
+        for state in self._states.values():
+            if state.timer is not None:
+                state.timer.cancel()
+        self._states.clear()
+
+    @property
+    def parked_counts(self) -> int:
+        """Number of requests waiting for a busy host"""
+        return sum(len(state.parked) for state in self._states.values())
+
+    def parked_requests(self) -> list:
+        """
+        Return the requests waiting for a busy host, used by checkpoints
+        """
+        return [request for state in self._states.values() for request in state.parked]
+
+    def slot(self, request, sem):
+        """
+        Return an async context manager for `Request.fetch_callback`
+        :param request: Request
+        :param sem: the global semaphore acquired after the host slot
+        """
+        return _HostSlot(self, request, sem)
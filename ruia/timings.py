@@ -0,0 +1,184 @@
+"""
+    Created by howie.hu at 2026-10-18.
+    Description: Timing breakdown of each request, recorded by a TraceConfig of aiohttp
+    Changelog: all notable changes to this file will be documented
+"""
+
+import asyncio
+
+import aiohttp
+
+PHASES = ("queued", "dns", "connect", "ttfb", "transfer", "total")
+
+
+class RequestTimings:
+    """
+    Seconds spent in each phase of a request, None if the phase did not happen:
+        queued: waiting for a free connection of the session
+        dns: resolving the host, 0 on a cache hit
+        connect: opening the connection without dns, the TLS handshake included
+        ttfb: from sending the request headers until the response headers arrived
+        transfer: from the response headers until the body was read
+        total: from the start until the body was read, or until the response headers arrived
+    Redirects add up into the same phases
+    """
+
+    __slots__ = (
+        "queued",
+        "dns",
+        "connect",
+        "ttfb",
+        "transfer",
+        "total",
+        "reused",
+        "redirects",
+        "_start",
+        "_queued_start",
+        "_dns_start",
+        "_connect_start",
+        "_connect_dns",
+        "_headers_sent",
+        "_headers_received",
+    )
+
+    def __init__(self):
+        self.queued = None
+        self.dns = None
+        self.connect = None
+        self.ttfb = None
+        self.transfer = None
+        self.total = None
+        # Whether the connection was reused from the pool
+        self.reused = None
+        self.redirects = 0
+        self._start = None
+        self._queued_start = None
+        self._dns_start = None
+        self._connect_start = None
+        # dns before the connection started, resolving is part of opening it
+        self._connect_dns = 0.0
+        self._headers_sent = None
+        self._headers_received = None
+
+    @staticmethod
+    def _now() -> float:
+        return asyncio.get_event_loop().time()
+
+    def _add(self, phase: str, since: float):
+        if since is not None:
+            value = getattr(self, phase) or 0.0
+            setattr(self, phase, value + self._now() - since)
+
+    def as_dict(self) -> dict:
+        result = {phase: getattr(self, phase) for phase in PHASES}
+        result["reused"] = self.reused
+        result["redirects"] = self.redirects
+        return result
+
+    def __repr__(self):
+        phases = ", ".join(
+            f"{phase}={getattr(self, phase):.4f}"
+            for phase in PHASES
+            if getattr(self, phase) is not None
+        )
+        return f"<RequestTimings {phases} reused={self.reused}>"
+
+
+def _get_timings(context):
+    timings = getattr(context, "trace_request_ctx", None)
+    return timings if isinstance(timings, RequestTimings) else None
+
+
+def timing_trace_config() -> aiohttp.TraceConfig:
+    """
+    Return a TraceConfig of aiohttp which fills the RequestTimings passed as `trace_request_ctx`
+    """
+
+    async def on_request_start(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._start = timings._now()
+
+    async def on_queued_start(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._queued_start = timings._now()
+
+    async def on_queued_end(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._add("queued", timings._queued_start)
+
+    async def on_dns_start(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._dns_start = timings._now()
+
+    async def on_dns_end(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._add("dns", timings._dns_start)
+
+    async def on_connection_create_start(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._connect_start = timings._now()
+            timings._connect_dns = timings.dns or 0.0
+
+    async def on_dns_cache_hit(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None and timings.dns is None:
+            timings.dns = 0.0
+
+    async def on_connection_create_end(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._add("connect", timings._connect_start)
+            timings.connect -= (timings.dns or 0.0) - timings._connect_dns
+            timings.reused = False
+
+    async def on_connection_reuseconn(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings.reused = True
+
+    async def on_request_headers_sent(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._headers_sent = timings._now()
+
+    async def on_request_redirect(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._add("ttfb", timings._headers_sent)
+            timings._headers_sent = None
+            timings.redirects += 1
+
+    async def on_request_end(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None:
+            timings._add("ttfb", timings._headers_sent)
+            timings._headers_received = timings._now()
+            timings._add("total", timings._start)
+
+    async def on_response_chunk_received(session, context, params):
+        timings = _get_timings(context)
+        if timings is not None and timings._headers_received is not None:
+            timings.transfer = timings._now() - timings._headers_received
+            timings.total = timings._now() - timings._start
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_connection_queued_start.append(on_queued_start)
+    trace_config.on_connection_queued_end.append(on_queued_end)
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace_config.on_connection_create_start.append(on_connection_create_start)
+    trace_config.on_connection_create_end.append(on_connection_create_end)
+    trace_config.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace_config.on_request_headers_sent.append(on_request_headers_sent)
+    trace_config.on_request_redirect.append(on_request_redirect)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_response_chunk_received.append(on_response_chunk_received)
+    return trace_config
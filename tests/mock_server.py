@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+"""
+    A local aiohttp server for the offline spider tests
+"""
+
+import asyncio
+
+from aiohttp import web
+
+
+async def handle_page(request):
+    delay = float(request.query.get("delay", 0))
+    if delay:
+        await asyncio.sleep(delay)
+    status = int(request.query.get("status", 200))
+    padding = " " * int(request.query.get("size", 0))
+    return web.Response(
+        text=f"<html><head><title>{request.path_qs}</title></head>{padding}</html>",
+        status=status,
+        content_type="text/html",
+    )
+
+
+def make_app():
+    app = web.Application()
+    app.router.add_route("*", "/{tail:.*}", handle_page)
+    return app
+
+
+async def start_server(app=None, host="127.0.0.1"):
+    """
+    Start the mock server on a random port of the running loop
+    :return: (runner, base_url)
+    """
+    runner = web.AppRunner(app or make_app())
+    await runner.setup()
+    site = web.TCPSite(runner, host, 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{port}"
+
+
+def run_spider(spider_cls, app=None, **kwargs):
+    """
+    Run `spider_cls` against the mock server, every start url is joined with the server address
+    :return: An instance of spider_cls
+    """
+
+    kwargs.setdefault("cancel_tasks", False)
+
+    async def _run(loop):
+        runner, base_url = await start_server(app)
+        spider_cls.base_url = base_url
+        spider_cls.start_urls = [f"{base_url}{path}" for path in spider_cls.start_paths]
+        try:
+            return await spider_cls.async_start(loop=loop, **kwargs)
+        finally:
+            await runner.cleanup()
+
+    return run_in_new_loop(_run)
+
+
+def run_in_new_loop(main):
+    """
+    Run `main(loop)` in a new event loop and close it,
+    a spider sets its loop as the current one, a fresh one is set back for the next tests
+    """
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(main(loop))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(asyncio.new_event_loop())
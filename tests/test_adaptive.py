@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+import asyncio
+
+from ruia import Spider
+from ruia.adaptive import AdaptiveSemaphore, AIMDController
+from ruia.throttle import HostLimiter
+from tests.mock_server import run_spider
+
+
+def test_adaptive_semaphore():
+    async def _run():
+        sem = AdaptiveSemaphore(1)
+        await sem.acquire()
+        waiter = asyncio.ensure_future(sem.acquire())
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        # A bigger limit lets the waiter in
+        sem.set_limit(2)
+        await asyncio.sleep(0)
+        assert waiter.done() and sem.active == 2
+
+        # A smaller limit blocks new acquires until the holders are below it
+        sem.set_limit(1)
+        waiter = asyncio.ensure_future(sem.acquire())
+        sem.release()
+        await asyncio.sleep(0)
+        assert not waiter.done()
+        sem.release()
+        await asyncio.sleep(0)
+        assert waiter.done() and sem.active == 1
+
+    asyncio.get_event_loop().run_until_complete(_run())
+
+
+def test_aimd_controller():
+    controller = AIMDController(4, min_limit=1, max_limit=6, window=10)
+    for _ in range(10):
+        controller.observe(200, 0.1)
+    assert controller.limit == 5
+    for _ in range(20):
+        controller.observe(200, 0.1)
+    assert controller.limit == 6
+
+    # Too many 429
+    for status in [429, 429] + [200] * 8:
+        controller.observe(status, 0.1)
+    assert controller.limit == 3
+
+    # The latency went up
+    for _ in range(10):
+        controller.observe(200, 1)
+    assert controller.limit == 1
+
+    # Timeouts never go below min_limit
+    for _ in range(10):
+        controller.observe(None, 10)
+    assert controller.limit == 1
+
+
+def test_host_limiter_set_limit():
+    async def _run():
+        limiter = HostLimiter(concurrency=2)
+        key = limiter.cached_key("http://127.0.0.1/")
+        assert limiter.try_acquire(key)
+        limiter.set_limit(key, 1)
+        assert not limiter.try_acquire(key)
+        limiter.set_limit(key, None)
+        assert limiter.try_acquire(key)
+
+    asyncio.get_event_loop().run_until_complete(_run())
+
+
+def test_adaptive_concurrency_spider():
+    statuses = []
+
+    class AdaptiveSpider(Spider):
+        start_paths = ["/list"]
+        concurrency = 4
+        host_concurrency = 4
+        adaptive_concurrency = True
+        adaptive_concurrency_kwargs = {"window": 5}
+        request_config = {"RETRIES": 0}
+
+        async def parse(self, response):
+            for page in range(20):
+                yield self.request(
+                    f"{self.base_url}/detail?p={page}&status=429",
+                    callback=self.parse_detail,
+                )
+
+        async def parse_detail(self, response):
+            statuses.append(response.status)
+
+    spider_ins = run_spider(AdaptiveSpider)
+    assert len(statuses) == 20
+    assert spider_ins.sem.limit == 1
+    assert spider_ins.worker_sem.limit == 1
+    controller = spider_ins.concurrency_controller
+    assert [host.limit for host in controller.host_limits.values()] == [1]
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+
+import random
+
+import pytest
+
+from benchmarks.crawl import compare, run_benchmarks
+from benchmarks.micro import check_regressions
+from benchmarks.micro import run_benchmarks as run_micro_benchmarks
+from benchmarks.server import BenchSite, parse_latency
+
+
+def test_parse_latency():
+    rnd = random.Random(0)
+    assert parse_latency("fixed:0.5")(rnd) == 0.5
+    assert 0.1 <= parse_latency("uniform:0.1:0.2")(rnd) <= 0.2
+    assert parse_latency("exponential:0.1")(rnd) >= 0
+    assert parse_latency("lognormal:0.1:0.5")(rnd) > 0
+    with pytest.raises(ValueError):
+        parse_latency("normal:1")
+
+
+def test_bench_site():
+    site = BenchSite(pages=100, fanout=3, page_size=1000, error_rate=0.2)
+    html = site.render(1)
+    assert len(html) == 1000
+    assert 'href="/page/4"' in html and 'href="/page/6"' in html
+    errors = sum(site.is_error(n) for n in range(100))
+    assert 5 < errors < 40
+    assert site.expected_pages() < 100
+    assert BenchSite(pages=100, fanout=3).expected_pages() == 100
+
+
+def test_run_benchmarks():
+    site = BenchSite(
+        pages=40, fanout=5, page_size=2000, latency="fixed:0", error_rate=0.1
+    )
+    (result,) = run_benchmarks(site, [(5, 2)])
+    assert result["requests"] == site.expected_pages()
+    assert (
+        result["failed"] == sum(site.is_error(n) for n in range(40))
+        or result["failed"] > 0
+    )
+    assert result["requests_per_second"] > 0
+    assert result["latency_p50"] <= result["latency_p99"]
+    assert result["cpu_per_request_ms"] > 0
+
+    faster = dict(result, requests_per_second=result["requests_per_second"] * 2)
+    (line,) = compare({"results": [result]}, {"results": [faster]})
+    assert line.endswith("(+100.0%)")
+
+
+def test_micro_benchmarks():
+    results = run_micro_benchmarks("middleware", min_time=0.001)
+    assert set(results) == {"middleware.request.0", "middleware.request.10"}
+    assert results["middleware.request.10"] > results["middleware.request.0"]
+
+    regressions = check_regressions(
+        {"a": 1.3, "b": 1.1, "c": 5.0}, {"a": 1.0, "b": 1.0}, threshold=0.25
+    )
+    assert regressions == ["a: 1.000 -> 1.300 us (+30.0%)"]
@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+from aiohttp import web
+
+from ruia import Request, Spider
+from ruia.bodylimit import content_type_allowed
+from tests.mock_server import run_in_new_loop, run_spider, start_server
+
+
+async def handle_stream(request):
+    """
+    A chunked body of `size` bytes, without Content-Length
+    """
+    resp = web.StreamResponse(headers={"Content-Type": "text/html"})
+    resp.enable_chunked_encoding()
+    await resp.prepare(request)
+    sent = 0
+    try:
+        for _ in range(int(request.query["size"]) // 1024):
+            await resp.write(b"x" * 1024)
+            sent += 1024
+    except ConnectionError:
+        pass
+    request.app["sent"].append(sent)
+    return resp
+
+
+def fetch(path: str, request_config: dict):
+    app = web.Application()
+    app["sent"] = []
+    app.router.add_get("/stream", handle_stream)
+
+    async def main(loop):
+        runner, base_url = await start_server(app)
+        request = Request(f"{base_url}{path}", request_config=request_config)
+        try:
+            response = await request.fetch()
+            body = await response.read() if response.ok else None
+            await request.close_request()
+        finally:
+            await runner.cleanup()
+        return response, body
+
+    response, body = run_in_new_loop(main)
+    return response, body, app["sent"]
+
+
+def test_content_type_allowed():
+    assert content_type_allowed("text/html", ["text/html"])
+    assert content_type_allowed("TEXT/HTML; charset=utf-8", ["text/*"])
+    assert content_type_allowed("image/png", ["*/*"])
+    assert not content_type_allowed("image/png", ["text/*", "application/json"])
+    assert not content_type_allowed("", ["text/html"])
+
+
+def test_stream_over_max_body_size():
+    response, body, sent = fetch(
+        "/stream?size=10485760", {"RETRIES": 0, "MAX_BODY_SIZE": 64 * 1024}
+    )
+    assert response.status == -1 and not response.ok
+    # The connection is dropped long before the whole body is sent
+    assert sent[0] < 10485760
+
+    response, body, sent = fetch(
+        "/stream?size=32768", {"RETRIES": 0, "MAX_BODY_SIZE": 64 * 1024}
+    )
+    assert response.status == 200 and body == b"x" * 32768
+
+
+def test_limits_not_retried():
+    calls = []
+
+    async def handle(request):
+        calls.append(request.path)
+        if request.path == "/image":
+            return web.Response(body=b"png", content_type="image/png")
+        return web.Response(text="x" * 2048, content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{name}", handle)
+
+    class LimitSpider(Spider):
+        start_paths = ["/image", "/large", "/page"]
+        request_config = {"RETRIES": 3}
+        max_body_size = 1024
+        allowed_content_types = ["text/*"]
+        bodies = {}
+
+        async def parse(self, response):
+            if response.ok:
+                self.bodies[response.url] = await response.text()
+            else:
+                self.bodies[response.url] = None
+
+        async def process_start_urls(self):
+            for url in self.start_urls[:2]:
+                yield self.request(url=url, callback=self.parse)
+            # Limits of request_config win over the ones of the spider
+            yield self.request(
+                url=self.start_urls[2],
+                callback=self.parse,
+                request_config={"RETRIES": 3, "MAX_BODY_SIZE": 4096},
+            )
+
+    spider_ins = run_spider(LimitSpider, app=app)
+    # Permanent failures, each url is requested once
+    assert sorted(calls) == ["/image", "/large", "/page"]
+    assert spider_ins.failed_counts == 2 and spider_ins.success_counts == 1
+    page = [text for url, text in LimitSpider.bodies.items() if url.endswith("/page")]
+    assert page == ["x" * 2048]
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+import asyncio
+
+from ruia import Spider
+from ruia.broker import FrontierBroker, _Connection
+from tests.mock_server import run_in_new_loop, start_server
+
+PAGES = 20
+
+
+def test_broker_process():
+    broker = FrontierBroker()
+    connection = _Connection()
+    fingerprint = "ab" * 20
+    reply = broker.process(
+        {
+            "put": [[0, fingerprint, "a"], [1, None, "b"], [0, fingerprint, "c"]],
+            "get": 1,
+        },
+        connection,
+    )
+    # The higher priority first, the duplicate is dropped
+    assert reply == {"items": ["b"], "filtered": 1, "unfinished": 2}
+    reply = broker.process({"add": 1, "done": 2, "get": 5}, connection)
+    assert reply == {"items": ["a"], "filtered": 0, "unfinished": 1}
+    assert connection.outstanding == 1
+    assert broker.queued_counts == 0
+
+
+def test_broker_client_left():
+    async def _run(loop):
+        broker = FrontierBroker()
+        address = await broker.start()
+        host, port = address.split(":")
+        reader, writer = await asyncio.open_connection(host, int(port))
+        writer.write(b'{"put": [[0, null, "a"], [0, null, "b"]], "get": 1}\n')
+        await writer.drain()
+        await reader.readline()
+        writer.close()
+        await asyncio.sleep(0.1)
+        await broker.close()
+        return broker
+
+    broker = run_in_new_loop(_run)
+    # The item taken by the client is given up, the queued one is left
+    assert broker.unfinished == 1
+    assert broker.queued_counts == 1
+
+
+def test_spiders_share_broker():
+    crawled = []
+
+    class BrokerSpider(Spider):
+        start_urls = ["http://127.0.0.1/"]
+        dupefilter = None
+
+        async def parse(self, response):
+            crawled.append(response.url)
+            for page in range(PAGES):
+                yield self.request(
+                    f"{self.base_url}/page?p={page}", callback=self.parse
+                )
+
+    async def _run(loop):
+        broker = FrontierBroker()
+        runner, base_url = await start_server()
+        BrokerSpider.base_url = base_url
+        BrokerSpider.start_urls = [f"{base_url}/page?p=0"]
+        BrokerSpider.frontier_broker = await broker.start()
+        try:
+            spiders = await asyncio.gather(
+                BrokerSpider.async_start(loop=loop, cancel_tasks=False),
+                BrokerSpider.async_start(loop=loop, cancel_tasks=False),
+            )
+        finally:
+            await broker.close()
+            await runner.cleanup()
+        return broker, spiders
+
+    broker, spiders = run_in_new_loop(_run)
+
+    # Both spiders queue the start url, the shared duplicate filter keeps one of each page
+    assert len(crawled) == PAGES
+    assert len(set(crawled)) == PAGES
+    assert sum(spider.success_counts for spider in spiders) == PAGES
+    assert sum(spider.filtered_counts for spider in spiders) == broker.filtered_counts
+    assert broker.unfinished == 0
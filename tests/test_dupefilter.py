@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+
+import os
+
+import pytest
+
+from ruia import Request
+from ruia.dupefilter import (
+    BloomDupeFilter,
+    SetDupeFilter,
+    canonicalize_url,
+    get_dupefilter,
+)
+
+
+def test_canonicalize_url():
+    assert (
+        canonicalize_url("HTTPS://HttpBin.org:443/get?b=2&a=1#top")
+        == "https://httpbin.org/get?a=1&b=2"
+    )
+    assert canonicalize_url("http://httpbin.org") == "http://httpbin.org/"
+    assert canonicalize_url("http://[::1]:8080/get#a") == "http://[::1]:8080/get"
+    assert canonicalize_url("http://[::1]:80/get") == "http://[::1]/get"
+    assert (
+        canonicalize_url("http://httpbin.org:8080/get?a=1", params={"b": 2})
+        == "http://httpbin.org:8080/get?a=1&b=2"
+    )
+
+
+def test_request_fingerprint():
+    fingerprint = Request("https://httpbin.org/get?a=1&b=2").fingerprint
+    assert fingerprint == Request("https://HTTPBIN.org/get?b=2&a=1#a").fingerprint
+    assert (
+        fingerprint
+        == Request("https://httpbin.org/get", params={"a": 1, "b": 2}).fingerprint
+    )
+    assert (
+        fingerprint
+        != Request("https://httpbin.org/get?a=1&b=2", method="POST").fingerprint
+    )
+
+    post_a = Request("https://httpbin.org/post", method="POST", data={"a": 1})
+    post_b = Request("https://httpbin.org/post", method="POST", data={"a": 2})
+    assert post_a.fingerprint != post_b.fingerprint
+    json_a = Request("https://httpbin.org/post", method="POST", json={"a": 1, "b": 2})
+    json_b = Request("https://httpbin.org/post", method="POST", json={"b": 2, "a": 1})
+    assert json_a.fingerprint == json_b.fingerprint
+
+
+@pytest.mark.parametrize("name", ["set", "bloom"])
+def test_request_seen(name):
+    dupefilter = get_dupefilter(name)
+    assert not dupefilter.request_seen(Request("https://httpbin.org/get?p=1"))
+    assert dupefilter.request_seen(Request("https://httpbin.org/get?p=1"))
+    assert not dupefilter.request_seen(Request("https://httpbin.org/get?p=2"))
+    assert len(dupefilter) == 2
+
+
+def test_bloom_dupefilter_scales():
+    dupefilter = BloomDupeFilter(initial_capacity=1000, error_rate=0.01)
+    fingerprints = [os.urandom(20) for _ in range(10000)]
+    for fingerprint in fingerprints:
+        dupefilter.fingerprint_seen(fingerprint)
+    assert len(dupefilter.filters) > 1
+    assert all(dupefilter.fingerprint_seen(fp) for fp in fingerprints)
+
+    false_positives = sum(
+        dupefilter.fingerprint_seen(os.urandom(20)) for _ in range(10000)
+    )
+    assert false_positives / 10000 < 0.02
+
+
+def test_invalid_dupefilter():
+    assert isinstance(get_dupefilter(), SetDupeFilter)
+    with pytest.raises(ValueError):
+        get_dupefilter("redis")
+    with pytest.raises(ValueError):
+        BloomDupeFilter(error_rate=2)
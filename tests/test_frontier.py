@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+
+import json
+
+import pytest
+
+from ruia import Request
+from ruia.frontier import (
+    CallbackItem,
+    FifoFrontier,
+    LifoFrontier,
+    PriorityFrontier,
+    get_frontier,
+)
+
+
+def drain(frontier):
+    urls = []
+    while not frontier.empty():
+        urls.append(frontier.get_nowait().url)
+    return urls
+
+
+def make_requests():
+    return [
+        Request("https://httpbin.org/get?p=0"),
+        Request("https://httpbin.org/get?p=1", priority=1),
+        Request("https://httpbin.org/get?p=2"),
+        Request("https://httpbin.org/get?p=3", priority=1),
+    ]
+
+
+def test_frontier_policies():
+    results = {}
+    for policy in ("fifo", "lifo", "priority"):
+        frontier = get_frontier(policy)
+        for request in make_requests():
+            frontier.put_nowait(request)
+        results[policy] = [url[-1] for url in drain(frontier)]
+
+    assert results["fifo"] == ["0", "1", "2", "3"]
+    assert results["lifo"] == ["3", "2", "1", "0"]
+    assert results["priority"] == ["1", "3", "0", "2"]
+
+
+def test_frontier_classes():
+    assert isinstance(get_frontier("fifo"), FifoFrontier)
+    assert isinstance(get_frontier("lifo"), LifoFrontier)
+    assert isinstance(get_frontier(), PriorityFrontier)
+    with pytest.raises(ValueError):
+        get_frontier("random")
+
+
+def test_callback_item():
+    async def parse_next(response):
+        pass
+
+    aws_callback = parse_next(None)
+    frontier = get_frontier("priority")
+    frontier.put_nowait(CallbackItem(aws_callback))
+    frontier.put_nowait(Request("https://httpbin.org/get", priority=1))
+    assert isinstance(frontier.get_nowait(), Request)
+    callback_item = frontier.get_nowait()
+    assert callback_item.aws_callback is aws_callback
+    assert callback_item.response is None
+    aws_callback.close()
+
+
+def serialize(request):
+    return json.dumps(request.to_dict()).encode("utf-8")
+
+
+def deserialize(data):
+    return Request.from_dict(json.loads(data))
+
+
+@pytest.mark.parametrize("policy", ["fifo", "lifo", "priority"])
+def test_disk_frontier(tmp_path, policy):
+    path = str(tmp_path / "frontier.sqlite")
+    disk_frontier = get_frontier(
+        policy,
+        path=path,
+        serialize=serialize,
+        deserialize=deserialize,
+        memory_size=2,
+        batch_size=2,
+    )
+    memory_frontier = get_frontier(policy)
+    for page in range(10):
+        request = Request(f"https://httpbin.org/get?p={page}", priority=page % 3)
+        disk_frontier.put_nowait(request)
+        memory_frontier.put_nowait(request)
+        assert disk_frontier.memory_qsize <= 2
+    assert disk_frontier.qsize() == 10
+    assert [request.url for request in disk_frontier.items()] == [
+        request.url for request in memory_frontier.items()
+    ]
+
+    assert drain(disk_frontier) == drain(memory_frontier)
+    assert disk_frontier.empty()
+    disk_frontier.close()
+
+
+def test_disk_frontier_resume(tmp_path):
+    path = str(tmp_path / "frontier.sqlite")
+    kwargs = dict(path=path, serialize=serialize, deserialize=deserialize)
+    frontier = get_frontier(memory_size=0, **kwargs)
+    for page in range(3):
+        frontier.put_nowait(Request(f"https://httpbin.org/get?p={page}"))
+    frontier.close()
+
+    frontier = get_frontier(resume=True, **kwargs)
+    frontier.put_nowait(Request("https://httpbin.org/get?p=3"))
+    assert [url[-1] for url in drain(frontier)] == ["0", "1", "2", "3"]
+    frontier.close()
+
+    frontier = get_frontier(**kwargs)
+    assert frontier.empty()
+    frontier.close()
+
+
+@pytest.mark.parametrize("policy", ["fifo", "lifo", "priority"])
+def test_frontier_items(policy):
+    frontier = get_frontier(policy)
+    for page in range(6):
+        frontier.put_nowait(
+            Request(f"https://httpbin.org/get?p={page}", priority=page % 2)
+        )
+    restored = get_frontier(policy)
+    for request in frontier.items():
+        restored.put_nowait(request)
+    assert drain(restored) == drain(frontier)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+import pytest
+
+from aiohttp import web
+
+from ruia import Request, Spider
+from ruia.httpcache import CacheEntry, HttpCache, parse_cache_control
+from tests.mock_server import run_in_new_loop, start_server
+
+LAST_MODIFIED = "Mon, 12 Oct 2026 08:00:00 GMT"
+
+
+def make_app(calls: list):
+    """
+    /fresh is fresh for a minute, /etag and /modified are revalidated each time, /secret is not stored
+    """
+
+    async def handle(request):
+        calls.append((request.path, dict(request.headers)))
+        name = request.match_info["name"]
+        headers = {}
+        if name == "fresh":
+            headers["Cache-Control"] = "max-age=60"
+        elif name == "etag":
+            headers["Cache-Control"] = "no-cache"
+            headers["ETag"] = '"v1"'
+            if request.headers.get("If-None-Match") == '"v1"':
+                return web.Response(status=304, headers=headers)
+        elif name == "modified":
+            headers["Last-Modified"] = LAST_MODIFIED
+            if request.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return web.Response(status=304, headers=headers)
+        elif name == "secret":
+            headers["Cache-Control"] = "no-store, max-age=60"
+        return web.Response(
+            text=f"<html><head><title>{name}</title></head></html>",
+            content_type="text/html",
+            headers=headers,
+        )
+
+    app = web.Application()
+    app.router.add_get("/{name}", handle)
+    return app
+
+
+def fetch_twice(path: str, cache_path: str, **kwargs):
+    calls = []
+
+    async def main(loop):
+        runner, base_url = await start_server(make_app(calls))
+        cache = HttpCache(cache_path, **kwargs)
+        responses = []
+        try:
+            for _ in range(2):
+                request = Request(f"{base_url}{path}")
+                request.http_cache = cache
+                response = await request.fetch()
+                responses.append((response, await response.text()))
+                await request.close_request()
+        finally:
+            await runner.cleanup()
+            cache.close()
+        return responses, cache.stats
+
+    responses, stats = run_in_new_loop(main)
+    return responses, stats, calls
+
+
+def test_parse_cache_control():
+    assert parse_cache_control('max-age=60, No-Cache, private="x"') == {
+        "max-age": "60",
+        "no-cache": None,
+        "private": "x",
+    }
+
+
+def test_freshness_lifetime():
+    entry = CacheEntry("f", "u", 200, [("Cache-Control", "max-age=30")], b"", None, 0)
+    assert entry.freshness_lifetime() == 30
+    entry = CacheEntry("f", "u", 200, [("Expires", "0")], b"", None, 0)
+    assert entry.freshness_lifetime() == 0
+    headers = [
+        ("Date", "Mon, 12 Oct 2026 10:00:00 GMT"),
+        ("Last-Modified", "Mon, 12 Oct 2026 09:00:00 GMT"),
+    ]
+    entry = CacheEntry("f", "u", 200, headers, b"", None, 0)
+    assert entry.freshness_lifetime() == 360
+    assert entry.conditional_headers() == {
+        "If-Modified-Since": "Mon, 12 Oct 2026 09:00:00 GMT"
+    }
+
+
+def test_cache_fresh_response(tmp_path):
+    responses, stats, calls = fetch_twice("/fresh", str(tmp_path / "cache.db"))
+    assert len(calls) == 1
+    (first, first_text), (second, second_text) = responses
+    assert not first.from_cache and second.from_cache
+    assert second.status == 200 and second.ok
+    assert second_text == first_text
+    assert second.headers["Cache-Control"] == "max-age=60"
+    assert stats["hit"] == 1 and stats["stored"] == 1
+
+
+def test_cache_revalidation(tmp_path):
+    responses, stats, calls = fetch_twice("/etag", str(tmp_path / "cache.db"))
+    assert len(calls) == 2
+    assert calls[1][1]["If-None-Match"] == '"v1"'
+    response, text = responses[1]
+    assert response.from_cache and response.status == 200
+    assert "<title>etag</title>" in text
+    assert stats["revalidated"] == 1
+
+    responses, stats, calls = fetch_twice(
+        "/modified", str(tmp_path / "modified.db"), policy="ignore_cache_control"
+    )
+    assert calls[1][1]["If-Modified-Since"] == LAST_MODIFIED
+    assert responses[1][0].from_cache
+    assert stats["revalidated"] == 1
+
+
+def test_cache_policies(tmp_path):
+    # rfc does not store no-store responses
+    responses, stats, calls = fetch_twice("/secret", str(tmp_path / "rfc.db"))
+    assert len(calls) == 2 and stats["stored"] == 0
+    # always replays every response, without asking the server again
+    responses, stats, calls = fetch_twice(
+        "/secret", str(tmp_path / "always.db"), policy="always"
+    )
+    assert len(calls) == 1 and responses[1][0].from_cache
+    responses, stats, calls = fetch_twice(
+        "/etag", str(tmp_path / "always-etag.db"), policy="always"
+    )
+    assert len(calls) == 1 and stats["hit"] == 1
+    with pytest.raises(ValueError):
+        HttpCache(str(tmp_path / "invalid.db"), policy="invalid")
+
+
+def test_cache_expiration_and_eviction(tmp_path):
+    cache = HttpCache(str(tmp_path / "cache.db"), policy="always", expiration=60)
+    now = [1000.0]
+    cache._now = lambda: now[0]
+    request = Request("http://example.com/a")
+    cache.store(CacheEntry(request.fingerprint, request.url, 200, [], b"a", None, 1000))
+    assert cache.get(request).body == b"a"
+    now[0] += 61
+    assert cache.get(request) is None
+    assert len(cache) == 0 and cache.size == 0
+    cache.close()
+
+    cache = HttpCache(str(tmp_path / "small.db"), policy="always", max_size=25)
+    requests = [Request(f"http://example.com/{i}") for i in range(3)]
+    for i, request in enumerate(requests):
+        cache._now = lambda i=i: 1000.0 + i
+        cache.store(
+            CacheEntry(request.fingerprint, request.url, 200, [], b"x" * 10, None, 0)
+        )
+    # The least recently used one is evicted
+    assert cache.get(requests[0]) is None
+    assert cache.get(requests[2]) is not None
+    assert cache.size == 20 and cache.stats["evicted"] == 1
+    cache.close()
+
+    # Kept across runs
+    cache = HttpCache(str(tmp_path / "small.db"), policy="always", max_size=25)
+    assert len(cache) == 2 and cache.size == 20
+    cache.close()
+
+
+def test_spider_http_cache(tmp_path):
+    calls = []
+
+    class CacheSpider(Spider):
+        start_paths = ["/fresh", "/etag"]
+        http_cache_path = str(tmp_path / "cache.db")
+        from_cache = []
+
+        async def parse(self, response):
+            await response.text()
+            self.from_cache.append(response.from_cache)
+
+    async def main(loop):
+        runner, base_url = await start_server(make_app(calls))
+        CacheSpider.start_urls = [
+            f"{base_url}{path}" for path in CacheSpider.start_paths
+        ]
+        try:
+            for _ in range(2):
+                spider_ins = await CacheSpider.async_start(
+                    loop=loop, cancel_tasks=False
+                )
+        finally:
+            await runner.cleanup()
+        return spider_ins
+
+    spider_ins = run_in_new_loop(main)
+    # /fresh is replayed and /etag is revalidated by the second run
+    assert [path for path, _ in calls].count("/fresh") == 1
+    assert [path for path, _ in calls].count("/etag") == 2
+    assert sorted(CacheSpider.from_cache) == [False, False, True, True]
+    http_cache = spider_ins.metrics.http_cache
+    assert http_cache.get("hit") == 1 and http_cache.get("revalidated") == 1
@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+
+import time
+
+from ruia import Item, Spider, TextField
+from ruia.loopmonitor import LoopMonitor
+from ruia.metrics import CrawlMetrics
+from tests.mock_server import run_spider
+
+
+class TitleItem(Item):
+    title = TextField(css_select="title")
+
+    async def clean_title(self, value):
+        time.sleep(0.06)
+        return value
+
+
+def test_loop_monitor():
+    metrics = CrawlMetrics()
+    monitor = LoopMonitor(threshold=0.05, metrics=metrics)
+    assert monitor.quantiles() == {}
+    for lag in range(100):
+        monitor.record_lag(lag / 1000)
+    assert monitor.quantiles() == {
+        "0.5": 0.05,
+        "0.95": 0.095,
+        "0.99": 0.099,
+        "max": 0.099,
+    }
+    assert metrics.loop_lag.count() == 100
+    assert metrics.loop_lag_quantiles.get("0.99") == 0.099
+
+    monitor.check("callback", "fast", 0.01)
+    monitor.check("callback", "slow", 0.2)
+    assert list(monitor.slow_steps) == [
+        {"kind": "callback", "name": "slow", "url": None, "seconds": 0.2}
+    ]
+    assert metrics.slow_steps.get("callback", "slow") == 1
+
+
+def test_spider_slow_steps():
+    class SlowSpider(Spider):
+        start_paths = ["/list"]
+        loop_lag_interval = 0.01
+        slow_step_threshold = 0.05
+
+        async def parse(self, response):
+            time.sleep(0.06)
+            yield await TitleItem.get_item(html=await response.text())
+
+    spider_ins = run_spider(SlowSpider)
+    url = SlowSpider.start_urls[0]
+    slow_steps = {
+        (step["kind"], step["name"], step["url"])
+        for step in spider_ins.loop_monitor.slow_steps
+    }
+    assert ("callback", "test_spider_slow_steps.<locals>.SlowSpider.parse", url) in (
+        slow_steps
+    )
+    assert ("clean", "TitleItem.clean_title", url) in slow_steps
+    assert spider_ins.metrics.loop_lag.count() > 0
+    assert max(spider_ins.loop_monitor.lags) >= 0.04
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import pytest
+
+from ruia import Item, Spider, TextField
+from ruia.metrics import Histogram, MetricsRegistry
+from tests.mock_server import run_spider
+
+
+class TitleItem(Item):
+    title = TextField(css_select="title")
+
+
+def test_histogram():
+    histogram = Histogram("latency", buckets=(0.1, 1, 10))
+    for value in [0.05, 0.1, 0.5, 2, 20]:
+        histogram.observe(value)
+    assert histogram.values[()][0] == [2, 1, 1, 1]
+    assert histogram.values[()][1] == pytest.approx(22.65)
+    assert histogram.count() == 5
+    assert histogram.quantile(0.5) == 1
+    assert histogram.quantile(1) == float("inf")
+    assert histogram.quantile(0.5, "unknown") == 0
+
+
+def test_metrics_registry():
+    registry = MetricsRegistry(max_hosts=2)
+    counter = registry.counter("requests", "Requests", ("host",))
+    assert registry.counter("requests") is counter
+    with pytest.raises(ValueError):
+        registry.histogram("requests")
+
+    for host in ["a.com", "b.com", "c.com", "a.com"]:
+        counter.inc(registry.host_label(host))
+    assert counter.values == {("a.com",): 2, ("b.com",): 1, ("other",): 1}
+    assert counter.total() == 4
+
+    registry.sample_queue(3)
+    data = registry.to_dict()
+    assert data["requests"]["type"] == "counter"
+    assert {"labels": {"host": "a.com"}, "value": 2} in data["requests"]["values"]
+    assert data["queue_history"][0][1] == 3
+
+
+def test_spider_metrics():
+    class MetricsSpider(Spider):
+        start_paths = ["/list"]
+        request_config = {"RETRIES": 1}
+
+        async def parse(self, response):
+            yield self.request(
+                f"{self.base_url}/detail?status=503", callback=self.parse_detail
+            )
+            yield await TitleItem.get_item(html=await response.text())
+
+        async def parse_detail(self, response):
+            pass
+
+    spider_ins = run_spider(MetricsSpider)
+    metrics = spider_ins.metrics
+    assert metrics.requests.total() == 3
+    assert metrics.retries.total() == 1
+    assert metrics.responses.get("200") == 1
+    assert metrics.responses.get("503") == 2
+    assert metrics.latency.count("127.0.0.1") == 3
+    assert metrics.bytes.get("127.0.0.1") > 0
+    assert metrics.finished.get("success") == 1
+    assert metrics.finished.get("failed") == 1
+    assert metrics.items.get("TitleItem") == 1
+    assert len(metrics.registry.queue_history) >= 1
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import asyncio
+import time
+
+from ruia import Item, Spider, TextField
+from ruia.profiling import Profiler, get_profiler
+from tests.mock_server import run_in_new_loop, run_spider
+
+
+class TitleItem(Item):
+    title = TextField(css_select="title")
+
+    async def clean_title(self, value):
+        time.sleep(0.01)
+        return value
+
+
+def test_profiler_timed():
+    profiler = Profiler()
+
+    async def busy():
+        time.sleep(0.02)
+        await asyncio.sleep(0.1)
+        return 1
+
+    async def gen():
+        time.sleep(0.01)
+        yield 1
+        await asyncio.sleep(0.05)
+        yield 2
+
+    async def main(loop):
+        result = await profiler.timed(busy(), "callback", "busy")
+        values = [
+            value async for value in profiler.timed_async_gen(gen(), "callback", "gen")
+        ]
+        return result, values
+
+    assert run_in_new_loop(main) == (1, [1, 2])
+    (_, name, calls, total, max_seconds), _ = profiler.top(kind="callback")
+    assert name == "busy"
+    assert calls == 1
+    # The sleeping time is not counted
+    assert 0.02 <= total < 0.08
+    assert total == max_seconds
+    assert profiler.stats[("callback", "gen")][1] < 0.04
+    assert "busy: calls 1" in profiler.report()
+
+
+def test_spider_profiling():
+    class ProfileSpider(Spider):
+        start_paths = ["/list"]
+        profile = True
+
+        async def parse(self, response):
+            yield await TitleItem.get_item(html=await response.text())
+            yield self.parse_more(response)
+
+        async def parse_more(self, response):
+            time.sleep(0.01)
+
+    spider_ins = run_spider(ProfileSpider)
+    stats = spider_ins.profiler.stats
+    prefix = "test_spider_profiling.<locals>.ProfileSpider"
+    assert stats[("callback", f"{prefix}.parse")][1] >= 0.01
+    assert stats[("callback", f"{prefix}.parse_more")][1] >= 0.01
+    assert stats[("field", "TitleItem.title title")][0] == 1
+    assert stats[("clean", "TitleItem.clean_title")][1] >= 0.01
+    assert get_profiler() is None
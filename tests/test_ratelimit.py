@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import asyncio
+import time
+
+from ruia import Request, Spider
+from ruia.ratelimit import RateLimiter, TokenBucket
+from tests.mock_server import run_spider
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, capacity=2, now=0)
+    assert bucket.wait_time(1, 0) == 0
+    bucket.take(2, 0)
+    assert bucket.wait_time(1, 0) == 0.1
+    assert bucket.wait_time(1, 0.1) == 0
+    # Never more than the capacity
+    assert bucket.wait_time(3, 100) == 0.1
+    # Bytes can go into debt
+    bucket.take(12, 100)
+    assert bucket.wait_time(0, 100) == 1
+
+
+def test_rate_limiter_defer():
+    ready = []
+
+    async def _run():
+        limiter = RateLimiter(
+            host_requests_per_second=20, burst=0, on_ready=ready.append
+        )
+        requests = [Request(f"http://127.0.0.1/?p={page}") for page in range(3)]
+        other_host = Request("http://localhost/")
+        assert limiter.try_acquire(requests[0])
+        assert not limiter.try_acquire(requests[1])
+        assert not limiter.try_acquire(requests[2])
+        # Another host has its own bucket
+        assert limiter.try_acquire(other_host)
+        assert limiter.deferred_requests() == requests[1:]
+
+        await asyncio.sleep(0.2)
+        assert ready == requests[1:]
+        # Still admitted when it comes back
+        assert limiter.try_acquire(requests[1])
+        limiter.dispatched(requests[1])
+        limiter.close()
+
+    asyncio.get_event_loop().run_until_complete(_run())
+
+
+def test_rate_limiter_bytes():
+    async def _run():
+        limiter = RateLimiter(bytes_per_second=1000, burst=1)
+        request = Request("http://127.0.0.1/")
+        assert limiter.try_acquire(request)
+        limiter.record_bytes(limiter.get_key(request.url), 1500)
+        assert 0.4 < limiter._wait_time("") <= 0.5
+        assert not limiter.try_acquire(Request("http://127.0.0.1/next"))
+        limiter.close()
+
+    asyncio.get_event_loop().run_until_complete(_run())
+
+
+def test_rate_limit_spider():
+    fetched = []
+
+    class RateLimitSpider(Spider):
+        start_paths = ["/list"]
+        concurrency = 10
+        rate_limit = 20
+        rate_limit_burst = 0
+
+        async def parse(self, response):
+            fetched.append(time.monotonic())
+            for page in range(9):
+                yield self.request(
+                    f"{self.base_url}/detail?p={page}", callback=self.parse_detail
+                )
+
+        async def parse_detail(self, response):
+            fetched.append(time.monotonic())
+
+    spider_ins = run_spider(RateLimitSpider)
+    assert spider_ins.success_counts == 10
+    # 20 requests per second, one at a time
+    assert fetched[-1] - fetched[0] >= 0.4
+
+
+def test_rate_limit_bytes_spider():
+    fetched = []
+
+    class BytesLimitSpider(Spider):
+        start_paths = ["/list?size=1000"]
+        concurrency = 10
+        rate_limit_bytes = 5000
+        rate_limit_burst = 0
+
+        async def parse(self, response):
+            fetched.append(time.monotonic())
+            await response.text()
+            for page in range(2):
+                yield self.request(
+                    f"{self.base_url}/detail?p={page}", callback=self.parse_detail
+                )
+
+        async def parse_detail(self, response):
+            fetched.append(time.monotonic())
+            await response.text()
+
+    run_spider(BytesLimitSpider)
+    # The 1000 bytes of the first page are paid off before the next pages are sent
+    assert len(fetched) == 3
+    assert fetched[-1] - fetched[0] >= 0.2
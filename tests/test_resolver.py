@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+
+import asyncio
+import socket
+import struct
+
+import pytest
+
+from ruia import Spider
+from ruia.exceptions import DNSLookupError
+from ruia.resolver import (
+    QTYPE_A,
+    QTYPE_AAAA,
+    CachingResolver,
+    build_query,
+    parse_nameserver,
+    parse_response,
+)
+from tests.mock_server import run_in_new_loop, start_server
+
+
+class StubDNSServer(asyncio.DatagramProtocol):
+    """
+    Answer A and AAAA queries from `records`, NXDOMAIN for the other names
+    """
+
+    def __init__(self, records: dict, delay: float = 0):
+        # name -> [(qtype, address, ttl)]
+        self.records = records
+        self.delay = delay
+        self.queries = []
+        self.running = 0
+        self.max_running = 0
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        asyncio.ensure_future(self.answer(data, addr))
+
+    async def answer(self, data, addr):
+        qid = struct.unpack_from("!H", data)[0]
+        offset, labels = 12, []
+        while data[offset]:
+            labels.append(data[offset + 1 : offset + 1 + data[offset]].decode())
+            offset += data[offset] + 1
+        question = data[12 : offset + 5]
+        qtype = struct.unpack_from("!H", data, offset + 1)[0]
+        name = ".".join(labels)
+        self.queries.append((name, qtype))
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        await asyncio.sleep(self.delay)
+        self.running -= 1
+        if name not in self.records:
+            header = struct.pack("!HHHHHH", qid, 0x8183, 1, 0, 0, 0)
+            self.transport.sendto(header + question, addr)
+            return
+        answers = [r for r in self.records[name] if r[0] == qtype]
+        body = b""
+        for rtype, address, ttl in answers:
+            family = socket.AF_INET if rtype == QTYPE_A else socket.AF_INET6
+            rdata = socket.inet_pton(family, address)
+            # The name is a pointer to the question
+            body += struct.pack("!HHHIH", 0xC00C, rtype, 1, ttl, len(rdata)) + rdata
+        header = struct.pack("!HHHHHH", qid, 0x8180, 1, len(answers), 0, 0)
+        self.transport.sendto(header + question + body, addr)
+
+
+async def start_dns_server(records: dict, delay: float = 0):
+    loop = asyncio.get_event_loop()
+    transport, server = await loop.create_datagram_endpoint(
+        lambda: StubDNSServer(dict(records), delay), local_addr=("127.0.0.1", 0)
+    )
+    return transport, server, "127.0.0.1:%d" % transport.get_extra_info("sockname")[1]
+
+
+RECORDS = {
+    "site.test": [(QTYPE_A, "127.0.0.1", 60), (QTYPE_AAAA, "::1", 120)],
+}
+
+
+def run_with_dns(main, records=RECORDS, delay=0):
+    async def _run(loop):
+        transport, server, nameserver = await start_dns_server(records, delay)
+        try:
+            return await main(server, nameserver)
+        finally:
+            transport.close()
+
+    return run_in_new_loop(_run)
+
+
+def test_dns_messages():
+    query = build_query(0x1234, "site.test", QTYPE_A)
+    assert query[:2] == b"\x12\x34"
+    assert query[12:] == b"\x04site\x04test\x00\x00\x01\x00\x01"
+    with pytest.raises(DNSLookupError):
+        parse_response(b"\x00")
+    assert parse_nameserver("127.0.0.1:5353") == ("127.0.0.1", 5353)
+    assert parse_nameserver("[::1]:53") == ("::1", 53)
+    assert parse_nameserver("1.1.1.1") == ("1.1.1.1", 53)
+
+
+def test_resolver_cache():
+    async def main(server, nameserver):
+        resolver = CachingResolver(nameservers=[nameserver], min_ttl=0)
+        now = [1000.0]
+        resolver._now = lambda: now[0]
+        infos = await resolver.resolve("site.test", 80, family=socket.AF_INET)
+        assert [(info["host"], info["port"]) for info in infos] == [("127.0.0.1", 80)]
+        await resolver.resolve("SITE.test", 80, family=socket.AF_INET)
+        assert server.queries == [("site.test", QTYPE_A)]
+        # Both families, cached for the lowest TTL
+        infos = await resolver.resolve("site.test", 80, family=socket.AF_UNSPEC)
+        assert {info["host"] for info in infos} == {"127.0.0.1", "::1"}
+        assert len(server.queries) == 3
+        now[0] += 59
+        await resolver.resolve("site.test", 80, family=socket.AF_UNSPEC)
+        assert len(server.queries) == 3
+        now[0] += 2
+        await resolver.resolve("site.test", 80, family=socket.AF_UNSPEC)
+        assert len(server.queries) == 5
+        # Addresses are not looked up
+        infos = await resolver.resolve("10.1.2.3", 80)
+        assert infos[0]["host"] == "10.1.2.3"
+        assert len(server.queries) == 5
+        await resolver.close()
+
+    run_with_dns(main)
+
+
+def test_resolver_negative_cache():
+    async def main(server, nameserver):
+        resolver = CachingResolver(nameservers=[nameserver], negative_ttl=30)
+        now = [1000.0]
+        resolver._now = lambda: now[0]
+        for _ in range(2):
+            with pytest.raises(DNSLookupError):
+                await resolver.resolve("missing.test", 80)
+        assert server.queries == [("missing.test", QTYPE_A)]
+        now[0] += 31
+        with pytest.raises(OSError):
+            await resolver.resolve("missing.test", 80)
+        assert len(server.queries) == 2
+
+    run_with_dns(main)
+
+
+def test_resolver_timeout():
+    async def main(server, nameserver):
+        resolver = CachingResolver(nameservers=[nameserver], timeout=0.05, attempts=2)
+        with pytest.raises(DNSLookupError):
+            await resolver.resolve("site.test", 80)
+        assert len(server.queries) == 2
+        await resolver.close()
+
+    run_with_dns(main, delay=0.2)
+
+
+def test_resolver_concurrency():
+    async def main(server, nameserver):
+        resolver = CachingResolver(nameservers=[nameserver], max_concurrency=2)
+        hosts = [f"host{i}.test" for i in range(6)]
+        records = {host: [(QTYPE_A, "127.0.0.1", 60)] for host in hosts}
+        server.records.update(records)
+        # The lookups of a host are shared
+        results = await asyncio.gather(
+            *[resolver.resolve(host, 80) for host in hosts for _ in range(3)]
+        )
+        assert all(infos[0]["host"] == "127.0.0.1" for infos in results)
+        assert sorted(name for name, _ in server.queries) == hosts
+        assert server.max_running == 2
+        await resolver.close()
+
+    run_with_dns(main, delay=0.02)
+
+
+def test_resolver_prefetch_and_persistence(tmp_path):
+    path = str(tmp_path / "dns_cache.json")
+
+    async def main(server, nameserver):
+        resolver = CachingResolver(nameservers=[nameserver])
+        assert resolver.prefetch("site.test", family=socket.AF_INET)
+        assert not resolver.prefetch("site.test", family=socket.AF_INET)
+        assert not resolver.prefetch("127.0.0.1")
+        resolver.prefetch("missing.test", family=socket.AF_INET)
+        await asyncio.sleep(0.1)
+        assert len(server.queries) == 2
+        infos = await resolver.resolve("site.test", 80, family=socket.AF_INET)
+        assert infos[0]["host"] == "127.0.0.1"
+        assert len(server.queries) == 2
+        assert resolver.save(path) == 2
+        await resolver.close()
+
+        resolver = CachingResolver(nameservers=[nameserver])
+        assert resolver.load(path) == 2
+        await resolver.resolve("site.test", 80, family=socket.AF_INET)
+        with pytest.raises(DNSLookupError):
+            await resolver.resolve("missing.test", 80, family=socket.AF_INET)
+        assert len(server.queries) == 2
+        assert resolver.load(str(tmp_path / "none.json")) == 0
+
+    run_with_dns(main)
+
+
+def test_spider_resolver(tmp_path):
+    class ResolverSpider(Spider):
+        start_urls = ["http://site.test/"]
+        dns_resolver = True
+        dns_cache_path = str(tmp_path / "dns.json")
+        connector_kwargs = {"family": socket.AF_INET}
+        titles = []
+
+        async def parse(self, response):
+            self.titles.append(await response.text())
+            if len(self.titles) == 1:
+                yield self.request(f"{self.base_url}/second", callback=self.parse)
+
+    async def main(server, nameserver):
+        runner, base_url = await start_server()
+        port = base_url.rsplit(":", 1)[1]
+        ResolverSpider.base_url = f"http://site.test:{port}"
+        ResolverSpider.start_urls = [f"http://site.test:{port}/first"]
+        ResolverSpider.dns_kwargs = {"nameservers": [nameserver]}
+        try:
+            spider_ins = await ResolverSpider.async_start(
+                loop=asyncio.get_event_loop(), cancel_tasks=False
+            )
+        finally:
+            await runner.cleanup()
+        return spider_ins, server
+
+    spider_ins, server = run_with_dns(main)
+    assert len(ResolverSpider.titles) == 2
+    assert server.queries == [("site.test", QTYPE_A)]
+    dns_lookups = spider_ins.metrics.dns_lookups
+    assert dns_lookups.get("prefetch") == 1
+    # The second request reuses the connection of the first one
+    assert dns_lookups.get("hit") + dns_lookups.get("shared") == 1
+    resolver = CachingResolver(nameservers=[])
+    assert resolver.load(ResolverSpider.dns_cache_path) == 1
@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+
+import asyncio
+import time
+
+from email.utils import formatdate
+
+from aiohttp import web
+
+from ruia import Spider
+from ruia.response import Response
+from ruia.retry import (
+    RetryBudget,
+    RetryScheduler,
+    is_retryable,
+    parse_retry_after,
+    retry_delay,
+)
+from tests.mock_server import run_in_new_loop, run_spider
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("120") == 120
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("soon") is None
+    now = time.time()
+    assert 29 <= parse_retry_after(formatdate(now + 30, usegmt=True), now=now) <= 30
+    assert parse_retry_after(formatdate(now - 30, usegmt=True), now=now) == 0
+
+
+def test_retry_delay():
+    config = {"RETRY_DELAY": 1, "RETRY_JITTER": 0, "RETRY_MAX_DELAY": 5}
+    assert [retry_delay(config, attempt) for attempt in (1, 2, 3, 4)] == [1, 2, 4, 5]
+    assert retry_delay(dict(config, RETRY_BACKOFF=1), 3) == 1
+    # Retry-After is honored, up to RETRY_MAX_DELAY
+    assert retry_delay(config, 1, retry_after=3) == 3
+    assert retry_delay(config, 1, retry_after=30) == 5
+    assert retry_delay({}, 1) == 0
+    delays = [
+        retry_delay({"RETRY_DELAY": 1, "RETRY_JITTER": 0.5}, 2) for _ in range(50)
+    ]
+    assert all(2 <= delay <= 3 for delay in delays)
+    assert len(set(delays)) > 1
+
+
+def test_retry_scheduler():
+    async def main(loop):
+        ready = []
+        scheduler = RetryScheduler(on_ready=lambda request: ready.append(request))
+        scheduler.schedule("b", 0.06)
+        scheduler.schedule("a", 0.02)
+        scheduler.schedule("c", 0.1)
+        assert scheduler.pending_requests() == ["a", "b", "c"]
+        assert 0 < scheduler.next_due() <= 0.02
+        await asyncio.sleep(0.08)
+        assert ready == ["a", "b"]
+        assert len(scheduler) == 1
+        scheduler.close()
+        await asyncio.sleep(0.05)
+        assert ready == ["a", "b"] and len(scheduler) == 0
+
+    run_in_new_loop(main)
+
+
+def test_spider_scheduled_retries():
+    hits = []
+
+    async def handle(request):
+        hits.append((request.path, time.monotonic()))
+        if request.path == "/fail":
+            return web.Response(status=503, headers={"Retry-After": "1"})
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{name}", handle)
+
+    class RetrySpider(Spider):
+        start_paths = ["/fail", "/ok"]
+        concurrency = 1
+        frontier_policy = "fifo"
+        request_config = {"RETRIES": 1, "TIMEOUT": 10}
+        statuses = []
+
+        async def parse(self, response):
+            self.statuses.append(response.status)
+
+    spider_ins = run_spider(RetrySpider, app=app)
+    # /ok is crawled while the retry of /fail waits, without its concurrency slot
+    assert [path for path, _ in hits] == ["/fail", "/ok", "/fail"]
+    assert hits[2][1] - hits[0][1] >= 0.9
+    # Once out of retries the callback gets a failed response, as with retries in place
+    assert sorted(RetrySpider.statuses) == [-1, 200]
+    assert spider_ins.failed_counts == 1 and spider_ins.success_counts == 1
+    assert len(spider_ins.retry_scheduler) == 0
+
+
+def test_retry_policy():
+    def response(status):
+        return Response(
+            "http://a.com",
+            "GET",
+            metadata={},
+            cookies={},
+            history=(),
+            headers={},
+            status=status,
+        )
+
+    assert is_retryable({}, response(503))
+    assert not is_retryable({}, response(404))
+    # Marked as failed by VALID
+    assert is_retryable({}, response(200))
+    assert is_retryable({"RETRY_STATUSES": [404]}, response(404))
+    assert is_retryable({}, error=asyncio.TimeoutError())
+    assert is_retryable({}, error=ConnectionResetError())
+    assert not is_retryable({}, error=ValueError())
+    assert is_retryable({"RETRY_EXCEPTIONS": (ValueError,)}, error=ValueError())
+
+
+def test_retry_budget():
+    budget = RetryBudget(min_retries=2)
+    assert budget.try_retry("a.com", 0.1)
+    assert budget.try_retry("a.com", 0.1)
+    assert not budget.try_retry("a.com", 0.1)
+    for _ in range(10):
+        budget.record_request("a.com")
+    assert budget.try_retry("a.com", 0.1)
+    assert not budget.try_retry("a.com", 0.1)
+    assert budget.try_retry("b.com", 0.1)
+    assert budget.counts("a.com") == (10, 3)
+    assert budget.denied == 2
+
+
+def test_spider_retry_policy():
+    class PolicySpider(Spider):
+        start_paths = ["/dead?status=404", "/gone?status=410", "/busy?status=503"]
+        request_config = {"RETRIES": 3, "RETRY_BUDGET": 0}
+        retry_budget_min = 1
+        statuses = []
+
+        async def parse(self, response):
+            self.statuses.append(response.status)
+
+    spider_ins = run_spider(PolicySpider)
+    metrics = spider_ins.metrics
+    # Permanent failures are not retried and keep their status
+    assert metrics.responses.get("404") == 1
+    assert metrics.responses.get("410") == 1
+    # The budget allows a single retry of the host
+    assert metrics.responses.get("503") == 2
+    assert spider_ins.retry_budget.denied == 1
+    assert sorted(PolicySpider.statuses) == [404, 410, 503]
+    assert spider_ins.failed_counts == 3
@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+
+import gzip
+
+import pytest
+
+from ruia.seeds import CsvSeeds, TextSeeds
+
+
+def test_text_seeds(tmp_path):
+    lines = "https://a.com\n\n# comment\n  https://b.com  \n"
+    path = tmp_path / "urls.txt"
+    path.write_text(lines)
+    gz_path = tmp_path / "urls.txt.gz"
+    with gzip.open(gz_path, "wt") as f:
+        f.write(lines)
+
+    for seeds in [TextSeeds(str(path)), TextSeeds(str(gz_path))]:
+        assert list(seeds) == ["https://a.com", "https://b.com"]
+        # Read again on each iteration
+        assert list(seeds) == ["https://a.com", "https://b.com"]
+
+
+def test_csv_seeds(tmp_path):
+    path = tmp_path / "sites.csv.gz"
+    with gzip.open(path, "wt", newline="") as f:
+        f.write('name,url\na,https://a.com\n"b, inc",https://b.com\nc,\n')
+
+    assert list(CsvSeeds(str(path), column="url")) == [
+        "https://a.com",
+        "https://b.com",
+    ]
+    assert list(CsvSeeds(str(path), column=0)) == ["name", "a", "b, inc", "c"]
+    with pytest.raises(ValueError):
+        list(CsvSeeds(str(path), column="link"))
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ruia import Request, Spider
+from ruia.sharding import ConsistentHashRing, ShardContext
+
+PAGES = 20
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = f"<html><head><title>{self.path}</title></head></html>".encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class ShardSpider(Spider):
+    base_url = None
+    start_urls = ["http://127.0.0.1/"]
+    dupefilter = "set"
+
+    async def parse(self, response):
+        # Every page links to all pages, most of them belong to the other shard
+        for page in range(PAGES):
+            yield self.request(f"{self.base_url}/page?p={page}", callback=self.parse)
+
+
+def test_consistent_hash_ring():
+    keys = [f"host-{i}.com" for i in range(2000)]
+    ring = ConsistentHashRing(4)
+    shards = [ring.get_shard(key) for key in keys]
+    assert shards == [ConsistentHashRing(4).get_shard(key) for key in keys]
+    for shard in range(4):
+        assert 300 < shards.count(shard) < 700
+
+    # Adding a shard only moves the keys taken by the new one
+    bigger_ring = ConsistentHashRing(5)
+    moved = [
+        key for key, shard in zip(keys, shards) if bigger_ring.get_shard(key) != shard
+    ]
+    assert all(bigger_ring.get_shard(key) == 4 for key in moved)
+    assert len(moved) < len(keys) / 3
+
+
+def test_shard_context():
+    context = ShardContext(0, [None, None], None, shard_by="host")
+    requests = [Request(f"https://httpbin.org/get?p={page}") for page in range(10)]
+    assert len({context.get_shard(request) for request in requests}) == 1
+    with pytest.raises(ValueError):
+        ShardContext(0, [None], None, shard_by="path")
+
+
+def test_start_sharded():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    ShardSpider.base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    ShardSpider.start_urls = [f"{ShardSpider.base_url}/page?p=0"]
+    try:
+        stats = ShardSpider.start_sharded(processes=2, shard_by="fingerprint")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Each page is crawled once, by the shard its fingerprint maps to
+    assert stats["success_counts"] == PAGES
+    assert stats["failed_counts"] == 0
+    assert len(stats["shards"]) == 2
+    assert all(shard["success_counts"] > 0 for shard in stats["shards"])
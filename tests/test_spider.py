@@ -2,9 +2,13 @@
 
 import asyncio
 import os
+import time
+
+from aiohttp import web
 
 from ruia import Item, Middleware, Request, Response, Spider, TextField
 from ruia.exceptions import SpiderHookError
+from tests.mock_server import run_in_new_loop, run_spider, start_server
 
 html_path = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), "data", "for_spider_testing.html"
@@ -297,3 +301,410 @@ def test_multiple_spider():
     loop = asyncio.new_event_loop()
     spider_ins = loop.run_until_complete(multiple_spider(loop=loop))
     assert spider_ins.count == 2
+
+
+def test_stream_worker():
+    finished = []
+
+    class StreamSpider(Spider):
+        start_paths = ["/slow?delay=1", "/fast?p=0"]
+        worker_numbers = 1
+        concurrency = 3
+
+        async def parse(self, response):
+            finished.append(response.url)
+            if response.url.endswith("/fast?p=0"):
+                for page in range(1, 3):
+                    yield self.request(
+                        url=f"{self.base_url}/fast?p={page}", callback=self.parse
+                    )
+
+    run_spider(StreamSpider)
+    # Children of the fast page do not wait for the slow page
+    assert len(finished) == 4
+    assert finished[-1].endswith("/slow?delay=1")
+
+
+def test_priority_frontier():
+    crawled = []
+
+    class PrioritySpider(Spider):
+        start_paths = ["/list?p=0"]
+        worker_numbers = 1
+        concurrency = 1
+
+        async def parse(self, response):
+            crawled.append(response.url.split("/")[-1])
+            if "list?p=0" in response.url:
+                yield self.request(f"{self.base_url}/list?p=1", callback=self.parse)
+                for page in range(2):
+                    yield self.request(
+                        f"{self.base_url}/detail?p={page}",
+                        callback=self.parse,
+                        priority=1,
+                    )
+
+    run_spider(PrioritySpider)
+    assert crawled == ["list?p=0", "detail?p=0", "detail?p=1", "list?p=1"]
+
+
+def test_host_concurrency():
+    finished = []
+
+    class HostSpider(Spider):
+        start_paths = [f"/slow?delay=0.3&p={i}" for i in range(3)]
+        worker_numbers = 1
+        concurrency = 2
+        host_concurrency = 1
+
+        async def parse(self, response):
+            finished.append(response.url)
+            if response.url.endswith("delay=0.3&p=0"):
+                other_host = self.base_url.replace("127.0.0.1", "localhost")
+                for page in range(3):
+                    yield self.request(
+                        f"{other_host}/fast?p={page}", callback=self.parse
+                    )
+
+    spider_ins = run_spider(HostSpider)
+    assert spider_ins.success_counts == 6
+    # The busy host does not block the other one
+    assert [url.split("/")[-1] for url in finished[1:4]] == [
+        "fast?p=0",
+        "fast?p=1",
+        "fast?p=2",
+    ]
+
+
+def test_dupefilter():
+    crawled = []
+
+    class DupeFilterSpider(Spider):
+        start_paths = ["/list", "/list#top"]
+        dupefilter = "set"
+
+        async def parse(self, response):
+            crawled.append(response.url.split("/")[-1])
+            for path in ["/detail?a=1&b=2", "/detail?b=2&a=1", "/list"]:
+                yield self.request(f"{self.base_url}{path}", callback=self.parse)
+            yield self.request("http://127.0.0.1:port/detail", callback=self.parse)
+            if response.url.endswith("/list"):
+                yield self.request(
+                    f"{self.base_url}/detail?a=1&b=2",
+                    callback=self.parse,
+                    dont_filter=True,
+                )
+
+    spider_ins = run_spider(DupeFilterSpider)
+    assert sorted(crawled) == ["detail?a=1&b=2", "detail?a=1&b=2", "list"]
+    assert spider_ins.filtered_counts > 0
+
+
+def test_inflight_bound():
+    running = {"now": 0, "peak": 0}
+
+    async def handle_page(request):
+        running["now"] += 1
+        running["peak"] = max(running["peak"], running["now"])
+        await asyncio.sleep(0.05)
+        running["now"] -= 1
+        return web.Response(text="<html></html>", content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", handle_page)
+
+    class InflightSpider(Spider):
+        start_paths = [f"/page?p={i}" for i in range(8)]
+        worker_numbers = 3
+        concurrency = 2
+
+        async def parse(self, response):
+            pass
+
+    spider_ins = run_spider(InflightSpider, app=app)
+    assert spider_ins.success_counts == 8
+    assert running["peak"] == 2
+    assert not spider_ins.inflight_tasks
+    assert not spider_ins.workers
+
+
+def test_async_start_cancel_tasks():
+    class CancelTasksSpider(Spider):
+        start_paths = ["/page?p=0", "/page?p=1"]
+
+        async def parse(self, response):
+            pass
+
+    spider_ins = run_spider(CancelTasksSpider, cancel_tasks=True)
+    assert spider_ins.success_counts == 2
+
+
+def test_coroutine_callback_item():
+    result = []
+
+    class CoroutineSpider(Spider):
+        start_paths = ["/page?p=0"]
+
+        async def parse(self, response):
+            yield self.parse_next(response=response, page=1)
+
+        async def parse_next(self, response, page):
+            result.append((response.url.split("/")[-1], page))
+
+    spider_ins = run_spider(CoroutineSpider)
+    assert result == [("page?p=0", 1)]
+    assert spider_ins.request_queue.empty()
+
+
+def test_host_concurrency_single_host():
+    class SingleHostSpider(Spider):
+        start_paths = [f"/page?p={i}" for i in range(12)]
+        worker_numbers = 2
+        concurrency = 3
+        host_concurrency = 1
+
+        async def parse(self, response):
+            pass
+
+    spider_ins = run_spider(SingleHostSpider)
+    assert spider_ins.success_counts == 12
+    assert spider_ins.host_limiter.parked_counts == 0
+
+
+def test_host_delay_single_slot():
+    class HostDelaySpider(Spider):
+        start_paths = ["/a", "/b", "/c"]
+        worker_numbers = 1
+        concurrency = 1
+        host_delay = 0.2
+
+        async def parse(self, response):
+            pass
+
+    start_time = time.time()
+    spider_ins = run_spider(HostDelaySpider)
+    assert spider_ins.success_counts == 3
+    assert time.time() - start_time >= 0.4
+
+
+def test_disk_frontier_spider(tmp_path):
+    crawled = []
+
+    class DiskFrontierSpider(Spider):
+        start_paths = ["/list"]
+        frontier_path = str(tmp_path / "frontier.sqlite")
+        frontier_memory_size = 1
+        worker_numbers = 1
+        concurrency = 1
+
+        async def parse(self, response):
+            for page in range(5):
+                yield self.request(
+                    f"{self.base_url}/detail?p={page}",
+                    callback=self.parse_detail,
+                    metadata={"page": page},
+                )
+
+        async def parse_detail(self, response):
+            crawled.append(response.metadata["page"])
+
+    spider_ins = run_spider(DiskFrontierSpider)
+    assert crawled == [0, 1, 2, 3, 4]
+    assert spider_ins.serialize_request(Request("https://httpbin.org/get")) is None
+
+
+def test_checkpoint_resume(tmp_path):
+    job_dir = str(tmp_path / "job")
+    crawled = []
+
+    class CheckpointSpider(Spider):
+        start_urls = ["http://127.0.0.1/"]
+        dupefilter = "set"
+        worker_numbers = 1
+        concurrency = 1
+        stop_at = None
+
+        async def parse(self, response):
+            for page in range(5):
+                yield self.request(
+                    f"{self.base_url}/detail?p={page}",
+                    callback=self.parse_detail,
+                    metadata={"page": page},
+                )
+
+        async def parse_detail(self, response):
+            crawled.append(response.metadata["page"])
+            if response.metadata["page"] == self.stop_at:
+                # The same as SIGTERM
+                asyncio.ensure_future(self.stop(None))
+                await asyncio.sleep(1)
+
+    async def _run(loop):
+        runner, base_url = await start_server()
+        CheckpointSpider.base_url = base_url
+        CheckpointSpider.start_urls = [f"{base_url}/list"]
+        try:
+            CheckpointSpider.stop_at = 1
+            first = await CheckpointSpider.async_start(
+                loop=loop, cancel_tasks=False, job_dir=job_dir
+            )
+            CheckpointSpider.stop_at = None
+            second = await CheckpointSpider.async_start(
+                loop=loop, cancel_tasks=False, job_dir=job_dir
+            )
+            third = await CheckpointSpider.async_start(
+                loop=loop, cancel_tasks=False, job_dir=job_dir
+            )
+            return first, second, third
+        finally:
+            await runner.cleanup()
+
+    first, second, third = run_in_new_loop(_run)
+
+    # The request in flight when stopping is crawled again, the start url is not
+    assert crawled == [0, 1, 1, 2, 3, 4]
+    assert first.success_counts == 2
+    assert second.success_counts == 6
+    # A finished job has nothing left to crawl
+    assert third.success_counts == 6
+    assert os.path.exists(os.path.join(job_dir, "checkpoint.pickle"))
+
+
+def test_frontier_backpressure():
+    sizes = []
+    crawled = []
+
+    class BackpressureSpider(Spider):
+        start_paths = ["/list"]
+        frontier_maxsize = 5
+        concurrency = 1
+        dupefilter = "set"
+
+        async def parse(self, response):
+            # Every page links to all pages, the callbacks wait for the frontier to drain
+            for page in range(30):
+                sizes.append(self.request_queue.qsize())
+                yield self.request(
+                    f"{self.base_url}/detail?p={page}", callback=self.parse
+                )
+            crawled.append(response.url)
+
+    spider_ins = run_spider(BackpressureSpider)
+    assert len(crawled) == 31
+    assert max(sizes) <= 5
+    assert spider_ins.worker_sem._value == 1
+
+
+def test_streaming_start_urls():
+    events = []
+    sizes = []
+
+    class AsyncUrls:
+        def __init__(self, base_url):
+            self.base_url = base_url
+
+        async def __aiter__(self):
+            for page in range(10):
+                yield f"{self.base_url}/page?p={page}"
+
+    class StreamingSpider(Spider):
+        start_urls = ["http://127.0.0.1/"]
+        start_urls_lookahead = 2
+        concurrency = 1
+
+        async def process_start_urls(self):
+            async for request_ins in super().process_start_urls():
+                sizes.append(self.request_queue.qsize())
+                events.append("seed")
+                yield request_ins
+
+        async def parse(self, response):
+            events.append("crawl")
+
+    async def _run(loop):
+        runner, base_url = await start_server()
+        StreamingSpider.start_urls = AsyncUrls(base_url)
+        try:
+            return await StreamingSpider.async_start(loop=loop, cancel_tasks=False)
+        finally:
+            await runner.cleanup()
+
+    spider_ins = run_in_new_loop(_run)
+    assert spider_ins.success_counts == 10
+    assert spider_ins.start_urls_consumed == 10
+    # The workers crawl while the start urls are read, at most 2 of them are waiting
+    assert events.index("crawl") < len(events) - 1 - events[::-1].index("seed")
+    assert max(sizes) <= 2
+
+
+def test_checkpoint_resume_start_urls(tmp_path):
+    job_dir = str(tmp_path / "job")
+    crawled = []
+
+    class SeedCheckpointSpider(Spider):
+        start_urls = ["http://127.0.0.1/"]
+        start_urls_lookahead = 1
+        worker_numbers = 1
+        concurrency = 1
+        stop_at = None
+
+        async def parse(self, response):
+            page = response.url.split("=")[-1]
+            crawled.append(page)
+            if page == self.stop_at:
+                asyncio.ensure_future(self.stop(None))
+                await asyncio.sleep(1)
+
+    async def _run(loop):
+        runner, base_url = await start_server()
+        SeedCheckpointSpider.start_urls = [f"{base_url}/page?p={p}" for p in range(6)]
+        try:
+            SeedCheckpointSpider.stop_at = "2"
+            await SeedCheckpointSpider.async_start(
+                loop=loop, cancel_tasks=False, job_dir=job_dir
+            )
+            SeedCheckpointSpider.stop_at = None
+            return await SeedCheckpointSpider.async_start(
+                loop=loop, cancel_tasks=False, job_dir=job_dir
+            )
+        finally:
+            await runner.cleanup()
+
+    spider_ins = run_in_new_loop(_run)
+    # The start urls go on from where the first run stopped
+    assert crawled[:3] == ["0", "1", "2"]
+    assert sorted(set(crawled)) == ["0", "1", "2", "3", "4", "5"]
+    assert len(crawled) <= 7
+    assert spider_ins.start_urls_consumed == 6
+
+
+def test_connection_pool():
+    class PoolSpider(Spider):
+        start_paths = ["/first"]
+        concurrency = 200
+        connector_limit_per_host = 4
+        connector_keepalive_timeout = 30
+        connector_dns_cache_ttl = 60
+        timings = []
+
+        async def parse(self, response):
+            await response.text()
+            self.timings.append(response.timings)
+            if len(self.timings) == 1:
+                # Not built with self.request, it still uses the pool of the spider
+                yield Request(f"{self.base_url}/second", callback=self.parse)
+
+    spider_ins = run_spider(PoolSpider)
+    connector = spider_ins.request_session.connector
+    assert connector is None or connector.closed
+    assert [timings.reused for timings in PoolSpider.timings] == [False, True]
+
+    async def get_connector(loop):
+        spider_ins = PoolSpider(loop=loop)
+        await spider_ins.request_session.close()
+        return spider_ins._make_connector()
+
+    connector = run_in_new_loop(get_connector)
+    assert connector.limit == 200
+    assert connector.limit_per_host == 4
+    assert not connector.force_close
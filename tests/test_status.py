@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+from aiohttp import ClientSession
+
+from ruia import Spider
+from ruia.metrics import MetricsRegistry
+from tests.mock_server import run_spider
+
+
+def test_to_openmetrics():
+    registry = MetricsRegistry()
+    registry.counter("ruia_requests_total", "Requests", ("host",)).inc('a"b.com')
+    registry.gauge("ruia_frontier_size").set(2)
+    histogram = registry.histogram("latency", "Latency", ("host",), buckets=(1, 5))
+    histogram.observe(0.5, "a.com")
+    histogram.observe(2, "a.com")
+
+    text = registry.to_openmetrics()
+    lines = text.splitlines()
+    assert "# TYPE ruia_requests counter" in lines
+    assert "# HELP ruia_requests Requests" in lines
+    assert 'ruia_requests_total{host="a\\"b.com"} 1' in lines
+    assert "ruia_frontier_size 2" in lines
+    assert 'latency_bucket{host="a.com",le="1"} 1' in lines
+    assert 'latency_bucket{host="a.com",le="+Inf"} 2' in lines
+    assert 'latency_count{host="a.com"} 2' in lines
+    assert 'latency_sum{host="a.com"} 2.5' in lines
+    assert text.endswith("# EOF\n")
+
+
+def test_status_server():
+    class StatusSpider(Spider):
+        start_paths = ["/list"]
+        status_port = 0
+        pages = {}
+
+        async def parse(self, response):
+            address = f"http://127.0.0.1:{self.status_server.port}"
+            async with ClientSession() as session:
+                async with session.get(f"{address}/metrics") as resp:
+                    self.pages["content_type"] = resp.headers["Content-Type"]
+                    self.pages["metrics"] = await resp.text()
+                async with session.get(f"{address}/status") as resp:
+                    self.pages["status"] = await resp.json()
+
+    spider_ins = run_spider(StatusSpider)
+    assert spider_ins.pages["content_type"].startswith("application/openmetrics-text")
+    metrics = spider_ins.pages["metrics"]
+    assert 'ruia_requests_total{host="127.0.0.1"} 1' in metrics
+    assert "ruia_inflight_requests 1" in metrics
+
+    status = spider_ins.pages["status"]
+    assert status["name"] == "Ruia"
+    assert status["inflight_requests"] == 1
+    assert status["inflight_urls"] == [f"{StatusSpider.base_url}/list"]
+    assert status["workers"] == {"total": 2, "running": 2, "concurrency": 3}
+    assert status["hosts"]["127.0.0.1"]["requests"] == 1
+    assert spider_ins.status_server.runner is None
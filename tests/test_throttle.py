@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+
+import asyncio
+
+from ruia import Request
+from ruia.throttle import HostLimiter
+
+
+def test_host_limiter_concurrency():
+    limiter = HostLimiter(concurrency=2)
+    running = {"a": 0, "b": 0}
+    peak = {"a": 0, "b": 0}
+
+    async def fetch(host):
+        request = Request(f"http://{host}/")
+        async with limiter.slot(request, asyncio.Semaphore(10)):
+            running[host] += 1
+            peak[host] = max(peak[host], running[host])
+            await asyncio.sleep(0.01)
+            running[host] -= 1
+
+    async def main():
+        await asyncio.gather(*[fetch(host) for host in "ab" * 5])
+
+    asyncio.new_event_loop().run_until_complete(main())
+    assert peak == {"a": 2, "b": 2}
+
+
+def test_host_limiter_delay():
+    limiter = HostLimiter(delay=0.1)
+    started = []
+
+    async def fetch(url):
+        key = await limiter.get_key(url)
+        await limiter.acquire(key)
+        started.append((key, loop.time()))
+        limiter.release(key)
+
+    async def main():
+        await asyncio.gather(*[fetch(f"http://{host}/") for host in "aab"])
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(main())
+    times = dict((key, [t for k, t in started if k == key]) for key in "ab")
+    assert times["a"][1] - times["a"][0] >= 0.09
+    assert times["b"][0] - times["a"][0] < 0.05
+
+
+def test_host_limiter_park():
+    ready = []
+    limiter = HostLimiter(concurrency=1, delay=0.05, on_ready=ready.append)
+
+    async def main():
+        first, second = Request("http://a/1"), Request("http://a/2")
+        assert await limiter.try_reserve(first)
+        assert not await limiter.try_reserve(second)
+        await limiter.park(second)
+        assert limiter.parked_counts == 1
+
+        # The reserved slot is used by the first request
+        async with limiter.slot(first, asyncio.Semaphore(1)):
+            assert not ready
+        # Free again once the delay has passed
+        await asyncio.sleep(0.1)
+        assert ready == [second]
+        assert await limiter.try_reserve(second)
+        limiter.discard(second)
+
+        # The state of an idle host is dropped
+        await asyncio.sleep(0.1)
+        assert not limiter._states
+
+    asyncio.new_event_loop().run_until_complete(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+from ruia import Request, Spider
+from ruia.timings import RequestTimings
+from tests.mock_server import run_in_new_loop, run_spider, start_server
+
+
+def test_request_timings():
+    async def main(loop):
+        runner, base_url = await start_server()
+        request = Request(f"{base_url}/page?delay=0.05")
+        try:
+            response = await request.fetch()
+            await response.text()
+        finally:
+            await request.close_request()
+            await runner.cleanup()
+        return response
+
+    timings = run_in_new_loop(main).timings
+    assert isinstance(timings, RequestTimings)
+    assert timings.reused is False
+    assert timings.connect is not None
+    assert timings.ttfb >= 0.05
+    assert timings.transfer is not None
+    assert timings.total >= timings.ttfb + timings.transfer
+    assert timings.as_dict()["redirects"] == 0
+
+
+def test_spider_timings():
+    class TimingSpider(Spider):
+        start_paths = ["/first"]
+        concurrency = 1
+        timings = []
+
+        async def parse(self, response):
+            await response.text()
+            self.timings.append(response.timings)
+            if len(self.timings) == 1:
+                yield self.request(f"{self.base_url}/second", callback=self.parse)
+
+    spider_ins = run_spider(TimingSpider)
+    first, second = spider_ins.timings
+    assert first.reused is False
+    assert second.reused is True
+    assert second.connect is None
+
+    metrics = spider_ins.metrics
+    assert metrics.phases.count("127.0.0.1", "ttfb") == 2
+    assert metrics.phases.count("127.0.0.1", "transfer") == 2
+    assert metrics.phases.count("127.0.0.1", "connect") == 1
+    assert metrics.connections.get("127.0.0.1", "true") == 1
+    assert metrics.connections.get("127.0.0.1", "false") == 1